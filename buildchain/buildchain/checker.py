@@ -0,0 +1,117 @@
+# coding: utf-8
+
+
+"""File dependency checker for doit, based on the files metadata.
+
+A file is considered unchanged as long as its modification time, size and
+inode are the same: no file content is read on a no-op build.
+
+When the metadata did change, the content digest of the file is (optionally)
+compared with the recorded one, so that a file rewritten with the same content
+doesn't trigger a rebuild. Digests are computed at most once per file version:
+they are kept in a persistent cache, shared by all the tasks depending on the
+file.
+"""
+
+
+import atexit
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from doit.dependency import FileChangedChecker  # type: ignore
+
+from buildchain import config
+from buildchain import coreutils
+
+
+# State of a file: modification time (ns), size, inode and digest (if any).
+State = List[Any]
+_Stamp = Tuple[int, int, int]
+
+
+class _DigestCache:
+    """Persistent cache of file digests, indexed by path and metadata."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._entries : Optional[Dict[str, List[Any]]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def digest(self, file_path: str, stamp: _Stamp) -> str:
+        """Return the digest of a file, computed once per version of it."""
+        with self._lock:
+            entry = self._load().get(file_path)
+        if entry is not None and entry[:3] == list(stamp):
+            return str(entry[3])
+        digest = coreutils.sha256_file(Path(file_path))
+        with self._lock:
+            self._load()[file_path] = [*stamp, digest]
+            if not self._dirty:
+                self._dirty = True
+                atexit.register(self.save)
+        return digest
+
+    def save(self) -> None:
+        """Write the cache on disk, forgetting about removed files."""
+        with self._lock:
+            if self._entries is not None:
+                self._entries = {
+                    file_path: entry
+                    for file_path, entry in self._entries.items()
+                    if os.path.exists(file_path)
+                }
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._path.with_name('.{}.tmp'.format(self._path.name))
+            with tmp.open('w', encoding='utf-8') as fp:
+                json.dump(self._entries, fp)
+            tmp.replace(self._path)
+            self._dirty = False
+
+    def _load(self) -> Dict[str, List[Any]]:
+        if self._entries is None:
+            try:
+                with self._path.open('r', encoding='utf-8') as fp:
+                    self._entries = json.load(fp)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+
+DIGESTS : _DigestCache = _DigestCache(config.BUILD_ROOT/'.file-digests.json')
+
+
+class StatChecker(FileChangedChecker):  # type: ignore
+    """Check file dependencies from their metadata, then from their content."""
+
+    def check_modified(
+        self, file_path: str, file_stat: os.stat_result, state: Any
+    ) -> bool:
+        """Check if the file in `file_path` is modified since `state`."""
+        stamp = _stamp(file_stat)
+        if list(stamp) == state[:3]:
+            return False
+        if stamp[1] != state[1] or state[3] is None:
+            return True
+        return bool(state[3] != DIGESTS.digest(file_path, stamp))
+
+    def get_state(
+        self, dep: str, current_state: Optional[State]
+    ) -> Optional[State]:
+        """Compute the state of a file dependency.
+
+        Return None if the state is unchanged.
+        """
+        stamp = _stamp(os.stat(dep))
+        if current_state and list(stamp) == current_state[:3]:
+            return None
+        digest = DIGESTS.digest(dep, stamp) if config.CHECK_FILE_CONTENT \
+            else None
+        return [*stamp, digest]
+
+
+def _stamp(file_stat: os.stat_result) -> _Stamp:
+    return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino
@@ -44,6 +44,29 @@ VAGRANT_UP_ARGS : Tuple[str, ...] = tuple(shlex.split(
     os.getenv('VAGRANT_UP_ARGS', _DEFAULT_VAGRANT_UP_ARGS)
 ))
 
+# Number of threads used to checksum files.
+COREUTILS_JOBS : int = int(
+    os.getenv('COREUTILS_JOBS', str(os.cpu_count() or 1))
+)
+
+# Whether to compare the content of the file dependencies whose metadata
+# changed (instead of considering them as modified).
+CHECK_FILE_CONTENT : bool = os.getenv('CHECK_FILE_CONTENT', '1') == '1'
+
+# Container images download.
+IMAGE_PULL_JOBS : int = int(os.getenv('IMAGE_PULL_JOBS', '4'))
+IMAGE_PULL_JOBS_PER_REGISTRY : int = int(
+    os.getenv('IMAGE_PULL_JOBS_PER_REGISTRY', '2')
+)
+
+# Path to the cache of image layers, shared by all the builds.
+_DEFAULT_CACHE_ROOT : Path = Path(
+    os.getenv('XDG_CACHE_HOME', str(Path.home()/'.cache'))
+)
+IMAGE_CACHE_ROOT : Path = Path(os.getenv(
+    'IMAGE_CACHE_ROOT', str(_DEFAULT_CACHE_ROOT/'metalk8s'/'blobs')
+))
+
 # External commands {{{
 
 # Name of the external commands (if in the PATH) or path to the binary.
@@ -53,7 +76,6 @@ class ExtCommand(enum.Enum):
     """External commands used by the build chain."""
 
     GIT          = os.getenv('GIT_BIN',          'git')
-    HARDLINK     = os.getenv('HARDLINK_BIN',     'hardlink')
     MKISOFS      = os.getenv('MKISOFS_BIN',      'mkisofs')
     SKOPEO       = os.getenv('SKOPEO_BIN',       'skopeo')
     VAGRANT      = os.getenv('VAGRANT_BIN',      'vagrant')
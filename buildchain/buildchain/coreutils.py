@@ -4,6 +4,7 @@
 """Pure Python implementation of some core utilities."""
 
 
+from concurrent.futures import ThreadPoolExecutor
 import gzip as gzip_module
 import functools
 import hashlib
@@ -17,7 +18,9 @@ from typing import Iterator, Sequence
 BUFSIZE : int = 8 * (1024 * 1024)
 
 
-def sha256sum(input_files: Sequence[Path], output_file: Path) -> None:
+def sha256sum(
+    input_files: Sequence[Path], output_file: Path, workers: int=1
+) -> None:
     """Compute the SHA256 digest of files.
 
     The digests are written into an output file, respecting the sha256sum format
@@ -27,19 +30,32 @@ def sha256sum(input_files: Sequence[Path], output_file: Path) -> None:
     Arguments:
         input_files: path to the files to hash
         output_file: path to the file that will contain the checksums
+        workers:     number of files hashed concurrently
     """
-    digests = []
-    for filepath in input_files:
-        hasher = hashlib.sha256()
-        with filepath.open('rb', buffering=BUFSIZE) as fp_in:
-            for chunk in iter(functools.partial(fp_in.read, BUFSIZE), b''):
-                hasher.update(chunk)
-        digests.append(hasher.hexdigest())
+    # `hashlib` releases the GIL while hashing, threads are enough.
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        digests = list(executor.map(sha256_file, input_files))
     with output_file.open('w', encoding='utf-8') as fp_out:
         for filepath, digest in zip(input_files, digests):
             fp_out.write('{}  {}\n'.format(digest, filepath.name))
 
 
+def sha256_file(filepath: Path) -> str:
+    """Compute the SHA256 digest of a file.
+
+    Arguments:
+        filepath: path to the file to hash
+
+    Returns:
+        the hexadecimal digest of the file
+    """
+    hasher = hashlib.sha256()
+    with filepath.open('rb', buffering=BUFSIZE) as fp_in:
+        for chunk in iter(functools.partial(fp_in.read, BUFSIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 def gzip(input_file: Path, keep_input: bool=False, level: int=6) -> None:
     """Compress the input file using LZ77 coding.
 
@@ -1,4 +1,4 @@
-"""Dependency checker for skopeo, vagrant, git, mkisofs and hard-link."""
+"""Dependency checker for skopeo, vagrant, git and mkisofs."""
 
 
 from pathlib import Path
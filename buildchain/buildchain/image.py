@@ -7,23 +7,22 @@ This module provides two services:
 - downloading a prebuilt image from a registry
 
 In either cases, those images are saved in a specific directory under the
-ISO's root.
+ISO's root, with their layers in a content-addressed blob store shared by all
+the images (so that each layer is stored only once).
 
 Overview:
 
-                                  ┌───────────┐
-                            ╱────>│pull:image1│───────     ┌─────────┐
-                 ┌────────┐╱      └───────────┘       ╲    │         │
-                 │        │       ┌───────────┐        ╲   │  dedup  │
-             ───>│  pull  │──────>│pull:image2│───────────>│  layers │
-            ╱    │        │       └───────────┘        ╱   │         │
-┌─────────┐╱     └────────┘╲      ┌───────────┐       ╱    └─────────┘
-│         │                 ╲────>│pull:image3│───────      ╱
-│  mkdir  │                       └───────────┘            ╱
-│         │                                               ╱
-└─────────┘╲     ┌────────┐                              ╱
-            ╲    │        │       ┌────────────┐        ╱
-             ───>│  build │──────>│build:image3│───────╱
+                 ┌────────┐
+                 │        │
+             ───>│  pull  │ (pull all the images, with a bounded pool of
+            ╱    │        │  workers and a shared blob cache)
+┌─────────┐╱     └────────┘
+│         │
+│  mkdir  │
+│         │
+└─────────┘╲     ┌────────┐
+            ╲    │        │       ┌────────────┐
+             ───>│  build │──────>│build:image3│
                  │        │       └────────────┘
                  └────────┘
 """
@@ -50,7 +49,6 @@ def task_images() -> types.TaskDict:
             '_image_mkdir_root',
             '_image_pull',
             '_image_build',
-            '_image_dedup_layers',
         ],
     }
 
@@ -62,10 +60,13 @@ def task__image_mkdir_root() -> types.TaskDict:
     ).task
 
 
-def task__image_pull() -> Iterator[types.TaskDict]:
+def task__image_pull() -> types.TaskDict:
     """Download the container images."""
-    for image in TO_PULL:
-        yield image.task
+    return targets.ImagePuller(
+        images=TO_PULL,
+        jobs=config.IMAGE_PULL_JOBS,
+        jobs_per_registry=config.IMAGE_PULL_JOBS_PER_REGISTRY,
+    ).task
 
 
 def task__image_build() -> Iterator[types.TaskDict]:
@@ -74,23 +75,6 @@ def task__image_build() -> Iterator[types.TaskDict]:
         yield image.task
 
 
-def task__image_dedup_layers() -> types.TaskDict:
-    """De-duplicate the images' layers with hard links."""
-    def show() -> str:
-        return '{cmd: <{width}} {path}'.format(
-            cmd='HARDLINK', width=constants.CMD_WIDTH,
-            path=utils.build_relpath(constants.ISO_IMAGE_ROOT)
-        )
-
-    task = targets.Target(
-        task_dep=['check_for:hardlink', '_image_pull', '_image_build']
-    ).basic_task
-    task['title']   = lambda _: show()
-    task['actions'] = [
-        [config.ExtCommand.HARDLINK.value, '-c', constants.ISO_IMAGE_ROOT]
-    ]
-    return task
-
 # Helpers {{{
 def _get_image_info(name: str) -> versions.Image:
     """Retrieve an `Image` information by name from the versions listing."""
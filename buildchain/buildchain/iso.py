@@ -6,7 +6,8 @@
 This module handles the creation of the final ISO, which involves:
 - creating the ISO's root
 - populating the ISO's tree
-- creating the ISO
+- computing the layout manifest of the ISO's tree
+- creating the ISO (only when its layout changed)
 - computing the ISO's checksum
 
 Overview:
@@ -36,11 +37,8 @@ import subprocess
 from pathlib import Path
 from typing import Iterator, List, Tuple, Union
 
-import doit  # type: ignore
-
 from buildchain import config
 from buildchain import constants
-from buildchain import coreutils
 from buildchain import targets as helper
 from buildchain import types
 from buildchain import utils
@@ -48,6 +46,8 @@ from buildchain import versions
 
 
 ISO_FILE : Path = config.BUILD_ROOT/'{}.iso'.format(config.PROJECT_NAME.lower())
+# Layout of ISO_ROOT (outside of it, to not be part of the ISO).
+ISO_LAYOUT_FILE : Path = config.BUILD_ROOT/'iso-layout.json'
 FILE_TREES : Tuple[helper.FileTree, ...] = (
     helper.FileTree(
         basename='_iso_add_tree',
@@ -147,6 +147,7 @@ def task_iso() -> types.TaskDict:
         'task_dep': [
             '_iso_mkdir_root',
             'populate_iso',
+            '_iso_layout',
             '_iso_build',
             '_iso_digest',
         ],
@@ -186,7 +187,18 @@ def task__iso_add_tree() -> Iterator[types.TaskDict]:
         yield from file_tree.execution_plan
 
 
-@doit.create_after(executed='populate_iso')  # type: ignore
+def task__iso_layout() -> types.TaskDict:
+    """Compute the layout manifest of the ISO_ROOT."""
+    return helper.LayoutManifest(
+        root=constants.ISO_ROOT,
+        destination=ISO_LAYOUT_FILE,
+        # Regenerated by every build, only the build timestamp and host change
+        # from one build to another for a given commit.
+        volatile={'product.txt': ['BUILD_TIMESTAMP=', 'BUILD_HOST=']},
+        task_dep=['populate_iso'],
+    ).task
+
+
 def task__iso_build() -> types.TaskDict:
     """Create the ISO from the files in ISO_ROOT."""
     def mkisofs() -> None:
@@ -215,9 +227,9 @@ def task__iso_build() -> types.TaskDict:
     doc = 'Create the ISO from the files in {}.'.format(
         utils.build_relpath(constants.ISO_ROOT)
     )
-    # Every file used for the ISO is a dependency.
-    depends = list(coreutils.ls_files_rec(constants.ISO_ROOT))
-    depends.append(versions.VERSION_FILE)
+    # The layout manifest only changes when a file used for the ISO does,
+    # which is way cheaper to check than every file in the ISO_ROOT.
+    depends = [ISO_LAYOUT_FILE, versions.VERSION_FILE]
     return {
         'title': utils.title_with_target1('MKISOFS'),
         'doc': doc,
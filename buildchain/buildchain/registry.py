@@ -0,0 +1,310 @@
+# coding: utf-8
+
+
+"""Minimal client for the Docker Registry HTTP API V2.
+
+It only supports what is needed to pull public images:
+- anonymous Bearer token authentication;
+- Docker Image Manifest V2, Schema 2 (possibly behind a manifest list).
+
+Blobs are downloaded into a local content-addressed cache (shared across
+images and builds): downloads are verified against their digest and resumed
+(with HTTP range requests) after an interruption.
+
+Anything else raises an `UnsupportedImage` error, so that the caller can fall
+back on a more complete tool (e.g. `skopeo`).
+"""
+
+
+import fcntl
+import hashlib
+import json
+import logging
+import operator
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_V2 = 'application/vnd.docker.distribution.manifest.v2+json'
+MANIFEST_LIST = 'application/vnd.docker.distribution.manifest.list.v2+json'
+
+# Registries whose API is not served on the registry name itself.
+API_HOSTS : Dict[str, str] = {
+    'docker.io': 'registry-1.docker.io',
+}
+
+CHUNK_SIZE : int = 1024 * 1024
+TIMEOUT : int = 60
+RETRIES : int = 3
+
+_CHALLENGE_PARAM = re.compile(r'(\w+)="([^"]*)"')
+
+
+class RegistryError(Exception):
+    """Error while pulling from a registry."""
+
+
+class UnsupportedImage(RegistryError):
+    """The image cannot be pulled by this client."""
+
+
+class BlobCache:
+    """Content-addressed cache of blobs, stored as `<root>/sha256/<hex>`."""
+
+    def __init__(self, root: Path):
+        self._root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        """Return the path of a blob in the cache."""
+        algorithm, hexdigest = _split_digest(digest)
+        return self._root/algorithm/hexdigest
+
+    def fetch(
+        self, client: 'RegistryClient', name: str, digest: str,
+        size: Optional[int]=None
+    ) -> Path:
+        """Return the path of a blob, downloading it if needed.
+
+        Partial downloads are kept (as `<hex>.partial`), and resumed by the
+        next attempt, be it in this build or in the next one.
+        A partial download reaching the blob `size` (if known) but not its
+        digest is corrupted, and started over.
+        """
+        path = self.path(digest)
+        if path.is_file():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name('{}.partial'.format(path.name))
+        with partial.open('ab') as lock:
+            # Only one download of a blob at a time (across threads and
+            # processes): the others wait for it, then reuse its result.
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            if path.is_file():
+                return path
+            # The download may have completed before being interrupted.
+            complete = partial.stat().st_size > 0 and \
+                _file_digest(partial) == digest
+            if not complete and size is not None and \
+                    partial.stat().st_size >= size:
+                partial.open('wb').close()
+            attempt = 0
+            while not complete:
+                attempt += 1
+                try:
+                    client.download_blob(name, digest, partial)
+                except (RegistryError, OSError) as exc:
+                    error = str(exc)
+                else:
+                    complete = _file_digest(partial) == digest
+                    if complete:
+                        break
+                    # Start over (truncate, as we hold a lock on this file).
+                    partial.open('wb').close()
+                    error = 'digest mismatch'
+                if attempt == RETRIES:
+                    raise RegistryError(
+                        'cannot download {}/{}: {}'.format(name, digest, error)
+                    )
+                LOGGER.warning('Download of %s failed (%s), retrying',
+                               digest, error)
+                time.sleep(attempt)
+            os.replace(str(partial), str(path))
+        return path
+
+    def link(self, digest: str, destination: Path) -> None:
+        """Hard link (or copy) a cached blob to `destination`."""
+        if destination.exists():
+            return
+        source = self.path(digest)
+        tmp = destination.with_name('.{}.{}-{}.tmp'.format(
+            destination.name, os.getpid(), threading.get_ident()
+        ))
+        try:
+            os.link(str(source), str(tmp))
+        except OSError:  # e.g. not on the same filesystem
+            shutil.copyfile(str(source), str(tmp))
+        os.replace(str(tmp), str(destination))
+
+
+class RegistryClient:
+    """Anonymous client for a Docker registry."""
+
+    def __init__(self, registry: str):
+        self._registry = registry
+        self._host = API_HOSTS.get(registry, registry)
+        self._tokens : Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    registry = property(operator.attrgetter('_registry'))
+
+    def get_manifest(
+        self, name: str, reference: str,
+        os_name: str='linux', architecture: str='amd64'
+    ) -> Tuple[bytes, Dict[str, Any], Set[str]]:
+        """Return the raw and decoded V2S2 manifest of an image.
+
+        Manifest lists are resolved for the given platform.
+        The digests of the manifest (and of the manifest list, if any) are
+        returned as well.
+        """
+        raw, media_type = self._get_manifest(name, reference)
+        digests = {content_digest(raw)}
+        if media_type == MANIFEST_LIST:
+            for entry in json.loads(raw.decode('utf-8'))['manifests']:
+                platform = entry.get('platform', {})
+                if platform.get('os') == os_name and \
+                        platform.get('architecture') == architecture:
+                    raw, media_type = self._get_manifest(
+                        name, entry['digest']
+                    )
+                    digests.add(content_digest(raw))
+                    break
+            else:
+                raise UnsupportedImage('no {}/{} image for {}:{}'.format(
+                    os_name, architecture, name, reference
+                ))
+        if media_type != MANIFEST_V2:
+            raise UnsupportedImage('unsupported manifest type {} for {}:{}'
+                                   .format(media_type, name, reference))
+        return raw, json.loads(raw.decode('utf-8')), digests
+
+    def download_blob(self, name: str, digest: str, destination: Path) -> None:
+        """Download a blob into `destination`, resuming from its size.
+
+        `destination` is truncated if it cannot be resumed (the registry
+        rejecting its range), for the next attempt to start over.
+        """
+        offset = destination.stat().st_size if destination.exists() else 0
+        headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+        try:
+            response = self._open(
+                name, '/v2/{}/blobs/{}'.format(name, digest), headers
+            )
+        except RegistryError as exc:
+            cause = exc.__cause__
+            if offset and isinstance(cause, urllib.error.HTTPError) and \
+                    cause.code == 416:
+                # Range Not Satisfiable: `destination` is already as large as
+                # the blob, but corrupted.
+                destination.open('wb').close()
+            raise
+        with response:
+            if response.status != 206:  # Range not honored: start over.
+                offset = 0
+            expected = response.headers.get('Content-Length')
+            received = 0
+            with destination.open('ab' if offset else 'wb') as fp:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                    fp.write(chunk)
+                    received += len(chunk)
+            # A connection closed early is not an error for `read`.
+            if expected is not None and received < int(expected):
+                raise RegistryError(
+                    'incomplete download of {}: {} bytes out of {}'.format(
+                        digest, received, expected
+                    )
+                )
+
+    def _get_manifest(self, name: str, reference: str) -> Tuple[bytes, str]:
+        headers = {'Accept': ', '.join((MANIFEST_V2, MANIFEST_LIST))}
+        with self._open(
+            name, '/v2/{}/manifests/{}'.format(name, reference), headers
+        ) as response:
+            media_type = response.headers.get_content_type()
+            return response.read(), media_type
+
+    def _open(self, name: str, path: str, headers: Dict[str, str]) -> Any:
+        url = 'https://{}{}'.format(self._host, path)
+        for authenticate in (False, True):
+            request = urllib.request.Request(url, headers=headers)
+            token = self._tokens.get(name)
+            if token:
+                # Not forwarded to the storage backends blobs redirect to.
+                request.add_unredirected_header(
+                    'Authorization', 'Bearer {}'.format(token)
+                )
+            try:
+                return urllib.request.urlopen(request, timeout=TIMEOUT)
+            except urllib.error.HTTPError as exc:
+                if exc.code != 401 or authenticate:
+                    raise RegistryError('GET {}: {}'.format(url, exc)) from exc
+                self._authenticate(
+                    name, exc.headers.get('WWW-Authenticate', '')
+                )
+        raise AssertionError('unreachable')
+
+    def _authenticate(self, name: str, challenge: str) -> None:
+        scheme, _, params = challenge.partition(' ')
+        if scheme.lower() != 'bearer':
+            raise UnsupportedImage(
+                'unsupported authentication for {}/{}: {}'.format(
+                    self._registry, name, scheme or 'none'
+                )
+            )
+        params_dict = dict(_CHALLENGE_PARAM.findall(params))
+        query = {
+            key: params_dict[key]
+            for key in ('service', 'scope') if key in params_dict
+        }
+        query.setdefault('scope', 'repository:{}:pull'.format(name))
+        url = '{}?{}'.format(
+            params_dict.get('realm', ''), urllib.parse.urlencode(query)
+        )
+        try:
+            with urllib.request.urlopen(url, timeout=TIMEOUT) as response:
+                answer = json.load(response)
+        except (urllib.error.URLError, ValueError) as exc:
+            raise UnsupportedImage(
+                'cannot get a token for {}/{}: {}'.format(
+                    self._registry, name, exc
+                )
+            ) from exc
+        token = answer.get('token') or answer.get('access_token')
+        if not token:
+            raise UnsupportedImage('no token for {}/{} in {}'.format(
+                self._registry, name, url
+            ))
+        with self._lock:
+            self._tokens[name] = token
+
+
+def split_repository(repository: str) -> Tuple[str, str]:
+    """Split a repository into a registry and a namespace.
+
+    >>> split_repository('docker.io/calico')
+    ('docker.io', 'calico')
+    >>> split_repository('k8s.gcr.io')
+    ('k8s.gcr.io', '')
+    """
+    registry, _, namespace = repository.partition('/')
+    return registry, namespace
+
+
+def _split_digest(digest: str) -> Tuple[str, str]:
+    algorithm, _, hexdigest = digest.partition(':')
+    if algorithm != 'sha256' or not re.match(r'^[a-f0-9]{64}$', hexdigest):
+        raise RegistryError('invalid digest: {}'.format(digest))
+    return algorithm, hexdigest
+
+
+def content_digest(data: bytes) -> str:
+    """Return the digest of some content."""
+    return 'sha256:{}'.format(hashlib.sha256(data).hexdigest())
+
+
+def _file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open('rb') as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return 'sha256:{}'.format(hasher.hexdigest())
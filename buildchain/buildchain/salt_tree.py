@@ -145,12 +145,21 @@ class StaticContainerRegistry(_StaticContainerRegistryBase):
 
     def _get_parts(self) -> Iterator[str]:
         """Yield all parts that should go in the generated configuration file.
+
+        Validity and digests of the image manifests are kept in an index
+        across builds, so unchanged manifests are not read again.
         """
-        parts : Iterator[str] = container_registry.create_config(
-            self._img_root, self._srv_root, self._name_pfx,
-            with_constants=False,
+        index = container_registry.DigestIndex(
+            str(config.BUILD_ROOT/'.{}.digests.json'.format(
+                Path(self.targets[0]).name
+            ))
         )
-        return parts
+        parts = list(container_registry.create_config(
+            self._img_root, self._srv_root, self._name_pfx,
+            with_constants=False, index=index,
+        ))
+        index.save()
+        return iter(parts)
 
 
 PILLAR_FILES : Tuple[Union[Path, targets.AtomicTarget], ...] = (
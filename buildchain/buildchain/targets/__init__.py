@@ -8,11 +8,12 @@ from buildchain.targets.base import Target, AtomicTarget, CompositeTarget
 from buildchain.targets.checksum import Sha256Sum
 from buildchain.targets.directory import Mkdir
 from buildchain.targets.file_tree import FileTree
+from buildchain.targets.layout import LayoutManifest
 from buildchain.targets.local_image import LocalImage
 from buildchain.targets.operator_image import OperatorImage
 from buildchain.targets.package import Package, RPMPackage, DEBPackage
 from buildchain.targets.remote_image import (
-    ImageSaveFormat, RemoteImage, SaveAsLayers, SaveAsTar
+    ImagePuller, ImageSaveFormat, RemoteImage, SaveAsLayers, SaveAsTar
 )
 from buildchain.targets.repository import (
     Repository, RPMRepository, DEBRepository
@@ -28,10 +29,12 @@ __all__ = [
     'Sha256Sum',
     'Mkdir',
     'FileTree',
+    'LayoutManifest',
     'LocalImage',
     'OperatorImage',
     'Package', 'RPMPackage', 'DEBPackage',
-    'ImageSaveFormat', 'RemoteImage', 'SaveAsLayers', 'SaveAsTar',
+    'ImagePuller', 'ImageSaveFormat', 'RemoteImage', 'SaveAsLayers',
+    'SaveAsTar',
     'Repository', 'RPMRepository', 'DEBRepository',
     'Renderer', 'SerializedData', 'SaltState', 'YAMLDocument',
     'TemplateFile',
@@ -7,6 +7,7 @@
 from pathlib import Path
 from typing import Any, Sequence, Set
 
+from buildchain import config
 from buildchain import constants
 from buildchain import coreutils
 from buildchain import types
@@ -55,4 +56,6 @@ class Sha256Sum(base.AtomicTarget):
     @staticmethod
     def _run(dependencies: Set[str], targets: Sequence[str]) -> None:
         input_files = [Path(path) for path in dependencies]
-        coreutils.sha256sum(input_files, Path(targets[0]))
+        coreutils.sha256sum(
+            input_files, Path(targets[0]), workers=config.COREUTILS_JOBS
+        )
@@ -4,6 +4,7 @@
 """Base class for container images."""
 
 
+import json
 import operator
 from typing import Any
 from pathlib import Path
@@ -51,6 +52,15 @@ class ContainerImage(base.AtomicTarget):
         """Directory where to store the image on disk."""
         return self.dest_dir.joinpath(self.name, self.version)
 
+    @property
+    def blob_store(self) -> Path:
+        """Content-addressed directory of the image blobs.
+
+        It is shared by all the images saved in the same destination, so that
+        each blob is stored only once.
+        """
+        return self.dest_dir/'blobs'/'sha256'
+
     @property
     def tag(self) -> str:
         """Image tag."""
@@ -66,6 +76,26 @@ class ContainerImage(base.AtomicTarget):
         """Create the image directory."""
         self.dirname.mkdir(parents=True, exist_ok=True)
 
+    def store_blobs(self) -> None:
+        """Move the image blobs into the content-addressed blob store.
+
+        Only the manifest (and metadata) are kept in the image directory.
+        """
+        manifest_path = self.dirname/'manifest.json'
+        with manifest_path.open('r', encoding='utf-8') as fp:
+            manifest = json.load(fp)
+        self.blob_store.mkdir(parents=True, exist_ok=True)
+        for blob in [manifest['config']] + manifest['layers']:
+            digest = blob['digest'].split(':', 1)[1]
+            source = self.dirname/digest
+            if not source.exists():
+                continue
+            destination = self.blob_store/digest
+            if destination.exists():
+                source.unlink()
+            else:
+                source.replace(destination)
+
     def clean(self) -> None:
         """Delete the image directory and its contents."""
         coreutils.rm_rf(self.dest_dir/self.name)
@@ -0,0 +1,188 @@
+# coding: utf-8
+
+
+"""Provides a manifest of the layout of a file tree.
+
+The manifest lists every entry of the tree (directories, files and symbolic
+links) with its permissions and, for the files, the SHA256 digest of their
+content.
+
+It is only rewritten when the layout actually changes, which makes it a cheap
+and accurate `file_dep` for the tasks consuming the whole tree (e.g. the ISO
+creation): doit only has to check one file instead of the whole tree, and
+touching a file without changing it doesn't trigger anything.
+
+To avoid re-hashing the whole tree every time, the digests are cached along
+with the size and modification time of the files they were computed from.
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from buildchain import config
+from buildchain import coreutils
+from buildchain import types
+from buildchain import utils
+
+from . import base
+
+
+class LayoutManifest(base.AtomicTarget):
+    """Compute the layout manifest of a file tree."""
+
+    def __init__(
+        self,
+        root: Path,
+        destination: Path,
+        volatile: Optional[Mapping[str, Iterable[str]]]=None,
+        **kwargs: Any
+    ):
+        """Configure the manifest computation.
+
+        Arguments:
+            root:        path to the root of the file tree
+            destination: path to the manifest
+            volatile:    prefixes of the lines not tracked, per path (relative
+                         to `root`) of file (e.g. build metadata regenerated
+                         by every build)
+
+        Keyword Arguments:
+            They are passed to `Target` init method.
+        """
+        kwargs['targets'] = [destination]
+        # The tree has to be scanned every time.
+        kwargs['uptodate'] = [False]
+        super().__init__(**kwargs)
+        self._root = root
+        self._volatile : Dict[str, Tuple[str, ...]] = {
+            relpath: tuple(prefixes)
+            for relpath, prefixes in (volatile or {}).items()
+        }
+
+    @property
+    def destination(self) -> Path:
+        """Path to the manifest."""
+        return Path(self.targets[0])
+
+    @property
+    def cache(self) -> Path:
+        """Path to the cache of digests."""
+        return self.destination.with_name(
+            '.{}.cache'.format(self.destination.name)
+        )
+
+    @property
+    def task(self) -> types.TaskDict:
+        task = self.basic_task
+        task.update({
+            'title': utils.title_with_target1('LAYOUT'),
+            'doc': 'Compute the layout manifest of {}.'.format(
+                utils.build_relpath(self._root)
+            ),
+            'actions': [self._run],
+            'clean': [self._clean],
+        })
+        return task
+
+    def _run(self) -> None:
+        """Compute the manifest, and write it if it changed."""
+        entries, stamps = self._scan(self._load_cache())
+        self._hash(entries, [
+            relpath for relpath in stamps if 'sha256' not in entries[relpath]
+        ])
+        for relpath, stamp in stamps.items():
+            stamp.append(entries[relpath]['sha256'])
+
+        self._write_if_changed(
+            self.cache, json.dumps(stamps, sort_keys=True)
+        )
+        self._write_if_changed(
+            self.destination, json.dumps(entries, indent=2, sort_keys=True)
+        )
+
+    def _scan(
+        self, cache: Dict[str, List[Any]]
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[Any]]]:
+        """Walk the tree, reusing the cached digests of unchanged files.
+
+        Returns the manifest entries (without the digests to compute) and the
+        size and modification time of every tracked file.
+        """
+        entries : Dict[str, Dict[str, Any]] = {}
+        stamps : Dict[str, List[Any]] = {}
+
+        for dirpath, dirnames, filenames in os.walk(str(self._root)):
+            dirnames.sort()
+            for name in sorted(dirnames + filenames):
+                path = os.path.join(dirpath, name)
+                relpath = os.path.relpath(path, str(self._root))
+                stat = os.lstat(path)
+                entry : Dict[str, Any] = {'mode': oct(stat.st_mode)}
+                if os.path.islink(path):
+                    entry['target'] = os.readlink(path)
+                elif os.path.isfile(path) and relpath in self._volatile:
+                    entry['sha256'] = self._volatile_digest(
+                        Path(path), self._volatile[relpath]
+                    )
+                elif os.path.isfile(path):
+                    stamps[relpath] = [stat.st_size, stat.st_mtime_ns]
+                    cached = cache.get(relpath)
+                    if cached is not None and cached[:2] == stamps[relpath]:
+                        entry['sha256'] = cached[2]
+                entries[relpath] = entry
+
+        return entries, stamps
+
+    def _hash(
+        self, entries: Dict[str, Dict[str, Any]], to_hash: List[str]
+    ) -> None:
+        """Compute the digests of the files `to_hash`, concurrently."""
+        with ThreadPoolExecutor(
+            max_workers=max(config.COREUTILS_JOBS, 1)
+        ) as executor:
+            digests = executor.map(
+                lambda relpath: coreutils.sha256_file(self._root/relpath),
+                to_hash
+            )
+            for relpath, digest in zip(to_hash, digests):
+                entries[relpath]['sha256'] = digest
+
+    @staticmethod
+    def _volatile_digest(path: Path, prefixes: Tuple[str, ...]) -> str:
+        """Compute the digest of a file, ignoring the volatile lines."""
+        hasher = hashlib.sha256()
+        with path.open('r', encoding='utf-8') as fp:
+            for line in fp:
+                if not line.startswith(prefixes):
+                    hasher.update(line.encode('utf-8'))
+        return hasher.hexdigest()
+
+    def _load_cache(self) -> Dict[str, List[Any]]:
+        try:
+            with self.cache.open('r', encoding='utf-8') as fp:
+                cache : Dict[str, List[Any]] = json.load(fp)
+            return cache
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_if_changed(path: Path, content: str) -> None:
+        """Write `content` into `path`, unless it's already there."""
+        try:
+            if path.read_text(encoding='utf-8') == content:
+                return
+        except OSError:
+            pass
+        tmp = path.with_name('.{}.tmp'.format(path.name))
+        tmp.write_text(content, encoding='utf-8')
+        tmp.replace(path)
+
+    def _clean(self) -> None:
+        """Delete the manifest and its cache."""
+        for path in (self.destination, self.cache):
+            utils.unlink_if_exist(path)
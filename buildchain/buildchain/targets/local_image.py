@@ -211,4 +211,4 @@ class LocalImage(image.ContainerImage):
             ])
         cmd.append('docker-daemon:{}'.format(self.tag))
         cmd.append('dir:{}'.format(str(self.dirname)))
-        return [self.mkdirs, cmd]
+        return [self.mkdirs, cmd, self.store_blobs]
@@ -6,23 +6,54 @@
 The images are downloaded from a repository.
 Then, they are tagged, saved on the disk and optionally compressed.
 
-All of these actions are done by a single task.
+All of these actions are done by a single task, either per image or for a set
+of images (see `ImagePuller`).
 """
 
 
 import abc
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import itertools
+import json
+import logging
 import operator
 from pathlib import Path
-from typing import Any, Optional, List, Sequence
+import subprocess
+import threading
+from typing import Any, Dict, Optional, List, Sequence
+
+from doit.exceptions import TaskError  # type: ignore
 
 from buildchain import docker_command
 from buildchain import config
+from buildchain import constants
+from buildchain import registry
 from buildchain import types
 
+from . import base
 from . import image
 
 
+LOGGER = logging.getLogger(__name__)
+
+# Cache of the blobs downloaded from the registries, shared by all the builds.
+BLOB_CACHE : registry.BlobCache = registry.BlobCache(config.IMAGE_CACHE_ROOT)
+
+# Content of the `version` file of the `dir:` transport of `skopeo`.
+DIR_TRANSPORT_VERSION : str = 'Directory Transport Version: 1.1\n'
+
+_CLIENTS : Dict[str, registry.RegistryClient] = {}
+_CLIENTS_LOCK : threading.Lock = threading.Lock()
+
+
+def _registry_client(name: str) -> registry.RegistryClient:
+    """Return the (shared) client of a registry."""
+    with _CLIENTS_LOCK:
+        if name not in _CLIENTS:
+            _CLIENTS[name] = registry.RegistryClient(name)
+        return _CLIENTS[name]
+
+
 class RemoteImage(image.ContainerImage):
     """A remote container image to download."""
 
@@ -66,6 +97,7 @@ class RemoteImage(image.ContainerImage):
     repository  = property(operator.attrgetter('_repository'))
     digest      = property(operator.attrgetter('_digest'))
     remote_name = property(operator.attrgetter('_remote_name'))
+    save_as     = property(operator.attrgetter('_save_as'))
 
     @property
     def remote_fullname(self) -> str:
@@ -74,6 +106,20 @@ class RemoteImage(image.ContainerImage):
             "{img.repository}/{img._remote_name}:{img.version}"
         ).format(img=self)
 
+    @property
+    def registry(self) -> str:
+        """Registry hosting the image."""
+        return registry.split_repository(self.repository)[0]
+
+    @property
+    def remote_path(self) -> str:
+        """Image name in its registry (i.e. without the registry name)."""
+        namespace = registry.split_repository(self.repository)[1]
+        if namespace:
+            return '{}/{}'.format(namespace, self._remote_name)
+        remote_name : str = self._remote_name
+        return remote_name
+
     @property
     def fullname(self) -> str:
         """Complete image name to use as a tag before saving with Docker."""
@@ -98,6 +144,140 @@ class RemoteImage(image.ContainerImage):
         })
         return task
 
+    @property
+    def is_saved(self) -> bool:
+        """Whether the image has already been saved in all its formats."""
+        return all(path.exists() for path in self.filepaths)
+
+    def pull(self) -> Optional[TaskError]:
+        """Download and save the image (i.e. run the actions of its task)."""
+        for fmt in self._save_as:
+            for action in fmt.save(self):
+                if isinstance(action, tuple):
+                    func, args, kwargs = action
+                    result = func(*args, **kwargs)
+                elif callable(action):
+                    result = action()
+                else:
+                    result = subprocess.run(action, check=True)
+                if isinstance(result, TaskError):
+                    return result
+        return None
+
+    def check_digest(self, digests: Sequence[str]) -> None:
+        """Check that the expected digest is one of the image `digests`.
+
+        Depending on how it was pinned, the expected digest is either the
+        digest of the image configuration (i.e. the image ID), of its
+        manifest or of its manifest list.
+        """
+        if self.digest not in digests:
+            raise ValueError(
+                "Image {name}:{version} pulled from {repository} "
+                "doesn't match expected digest: "
+                "expected {digest}, got {observed_digests}".format(
+                    name=self.remote_name, version=self.version,
+                    repository=self.repository, digest=self.digest,
+                    observed_digests=', '.join(sorted(digests))
+                )
+            )
+
+
+class ImagePuller(base.AtomicTarget):
+    """Download a set of remote images, with a bounded concurrency.
+
+    At most `jobs` images are downloaded at once, and at most
+    `jobs_per_registry` from the same registry.
+    """
+
+    def __init__(
+        self,
+        images: Sequence[RemoteImage],
+        jobs: int,
+        jobs_per_registry: int,
+        **kwargs: Any
+    ):
+        """Initialize the set of images to pull.
+
+        Arguments:
+            images:            the images to pull
+            jobs:              maximum number of concurrent downloads
+            jobs_per_registry: maximum number of concurrent downloads from a
+                               given registry
+
+        Keyword Arguments:
+            They are passed to `Target` init method.
+        """
+        self._images = list(images)
+        self._jobs = max(jobs, 1)
+        self._jobs_per_registry = max(jobs_per_registry, 1)
+        kwargs['targets'] = [
+            path for img in self._images for path in img.filepaths
+        ]
+        task_dep = kwargs.setdefault('task_dep', [])
+        for img in self._images:
+            task_dep.extend(dep for dep in img.task_dep if dep not in task_dep)
+        super().__init__(**kwargs)
+
+    images = property(operator.attrgetter('_images'))
+
+    @property
+    def task(self) -> types.TaskDict:
+        task = self.basic_task
+        task.update({
+            'title': lambda _: '{cmd: <{width}} {count} images'.format(
+                cmd='PULL IMG', width=constants.CMD_WIDTH,
+                count=len(self._images)
+            ),
+            'doc': 'Download the container images.',
+            'uptodate': [True],
+            'actions': [self.pull],
+            'clean': [
+                fmt.clean(img) for img in self._images for fmt in img.save_as
+            ],
+        })
+        return task
+
+    def pull(self) -> Optional[TaskError]:
+        """Download the images not saved yet."""
+        to_pull = [img for img in self._images if not img.is_saved]
+        # Interleave the registries, so that the workers are not all waiting
+        # for the same one.
+        ranks : Dict[str, int] = {}
+        def rank(img: RemoteImage) -> int:
+            ranks[img.registry] = ranks.get(img.registry, -1) + 1
+            return ranks[img.registry]
+        to_pull = [img for _, img in sorted(
+            ((rank(img), idx), img) for idx, img in enumerate(to_pull)
+        )]
+        slots = {
+            img.registry: threading.BoundedSemaphore(self._jobs_per_registry)
+            for img in to_pull
+        }
+
+        def pull(img: RemoteImage) -> Optional[TaskError]:
+            with slots[img.registry]:
+                LOGGER.info('Pulling %s', img.remote_fullname)
+                return img.pull()
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            futures = {executor.submit(pull, img): img for img in to_pull}
+            for future in as_completed(futures):
+                img = futures[future]
+                try:
+                    error = future.result()
+                except Exception as exc:
+                    errors.append('{}: {}'.format(img.remote_fullname, exc))
+                else:
+                    if error is not None:
+                        errors.append('{}: {}'.format(
+                            img.remote_fullname, error.get_msg()
+                        ))
+        if errors:
+            return TaskError(msg='\n'.join(sorted(errors)))
+        return None
+
 
 class ImageSaveFormat(abc.ABC):
     """Interface for an image save format."""
@@ -121,6 +301,42 @@ class SaveAsLayers(ImageSaveFormat):
         return img.dirname/'manifest.json'
 
     def save(self, img: RemoteImage) -> List[types.Action]:
+        return [img.mkdirs, (self._copy, [img], {}), img.store_blobs]
+
+    @staticmethod
+    def _copy(img: RemoteImage) -> None:
+        """Copy the image layers, through the local blob cache."""
+        client = _registry_client(img.registry)
+        try:
+            raw, manifest, digests = client.get_manifest(
+                img.remote_path, img.version
+            )
+        except registry.UnsupportedImage as exc:
+            LOGGER.info('Falling back on skopeo for %s: %s',
+                        img.remote_fullname, exc)
+            SaveAsLayers._skopeo_copy(img)
+            return
+        img.check_digest(list(digests) + [manifest['config']['digest']])
+
+        img.blob_store.mkdir(parents=True, exist_ok=True)
+        for blob in [manifest['config']] + manifest['layers']:
+            BLOB_CACHE.fetch(
+                client, img.remote_path, blob['digest'], blob.get('size')
+            )
+            BLOB_CACHE.link(
+                blob['digest'],
+                img.blob_store/blob['digest'].split(':', 1)[1]
+            )
+        # Same layout as `skopeo copy` (the manifest, being the target of the
+        # task, is written last).
+        (img.dirname/'version').write_text(DIR_TRANSPORT_VERSION)
+        tmp = img.dirname/'.manifest.json.tmp'
+        tmp.write_bytes(raw)
+        tmp.replace(img.dirname/'manifest.json')
+
+    @staticmethod
+    def _skopeo_copy(img: RemoteImage) -> None:
+        """Copy the image layers using Skopeo."""
         # Use Skopeo to directly copy the remote image into a directory
         # of image layers
         skopeo_copy = [
@@ -129,7 +345,19 @@ class SaveAsLayers(ImageSaveFormat):
         ]
         skopeo_copy.append('docker://{}'.format(img.remote_fullname))
         skopeo_copy.append('dir:{}'.format(img.dirname))
-        return [img.mkdirs, skopeo_copy]
+        subprocess.run(skopeo_copy, check=True)
+
+        with (img.dirname/'manifest.json').open('rb') as fp:
+            raw = fp.read()
+        manifest = json.loads(raw.decode('utf-8'))
+        digests = [registry.content_digest(raw), manifest['config']['digest']]
+        if img.digest not in digests:
+            # The image may have been pinned by its manifest list digest,
+            # which is not known here.
+            LOGGER.warning(
+                'Cannot verify %s: expected digest %s, got %s',
+                img.remote_fullname, img.digest, ', '.join(digests)
+            )
 
     def clean(self, img: RemoteImage) -> types.Action:
         """Return the action to delete the image."""
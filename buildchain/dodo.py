@@ -10,6 +10,7 @@ import sys
 
 import doit  # type: ignore
 
+from buildchain import checker
 from buildchain import constants
 from buildchain.build import *
 from buildchain.builder import *
@@ -115,6 +116,7 @@ DOIT_CONFIG = {
     'reporter': CustomReporter,
     'cleandep': True,
     'cleanforget': True,
+    'check_file_uptodate': checker.StatChecker,
 }
 
 # Because some code (in `doit` or even below) seems to be using a dangerous mix
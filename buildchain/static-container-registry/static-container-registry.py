@@ -37,16 +37,102 @@ location @404_tag {{
 
 
 MANIFEST_JSON = 'manifest.json'
+# Optional content-addressed store of blobs shared by all images, under `root`
+BLOB_STORE_ROOT = 'blobs'
+BLOB_STORE = os.path.join(BLOB_STORE_ROOT, 'sha256')
 
 
-def find_images(root):
+class DigestIndex(object):
+    """On-disk index of image manifests, keyed on their path, size and mtime.
+
+    For each manifest, the index records whether it is valid and its SHA256
+    digest, so unchanged manifests are neither parsed nor hashed again.
+    Only manifests looked up during a run are kept when saving the index.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._used = {}
+
+        if path is not None and os.path.isfile(path):
+            LOGGER.info('Loading digest index from %s', path)
+            try:
+                with open(path, 'r') as fd:
+                    self._entries = json.load(fd)
+            except (IOError, ValueError):
+                LOGGER.info('Ignoring invalid digest index %s', path)
+
+    def get(self, manifest):
+        if manifest in self._used:
+            return self._used[manifest]
+
+        stat = os.stat(manifest)
+        key = [stat.st_size, stat.st_mtime_ns]
+        entry = self._entries.get(manifest)
+        if entry is None or entry.get('stat') != key:
+            entry = {'stat': key}
+        self._used[manifest] = entry
+        return entry
+
+    def save(self):
+        if self.path is None:
+            return
+
+        LOGGER.info('Saving digest index to %s', self.path)
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as fd:
+            json.dump(self._used, fd, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def is_valid_manifest(manifest):
+    with open(manifest, 'r') as fd:
+        LOGGER.info('Attempting to load JSON data from %s', manifest)
+        try:
+            data = json.load(fd)
+        except json.JSONDecodeError:
+            LOGGER.info('Failed to decode JSON from %s', manifest)
+            data = None
+
+    if not data:
+        return False
+
+    if data.get('schemaVersion') != 2:
+        LOGGER.info('Invalid schemaVersion in %s', manifest)
+        return False
+
+    if data.get('mediaType') != \
+            'application/vnd.docker.distribution.manifest.v2+json':
+        LOGGER.info('Invalid mediaType in %s', manifest)
+        return False
+
+    return True
+
+
+def manifest_digest(manifest, index=None):
+    entry = index.get(manifest) if index is not None else {}
+
+    if 'digest' not in entry:
+        digest = hashlib.sha256()
+
+        with open(manifest, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(65536), b''):
+                digest.update(chunk)
+
+        entry['digest'] = digest.hexdigest()
+
+    return entry['digest']
+
+
+def find_images(root, index=None):
     LOGGER.info('Finding images in %s', root)
 
     for name in os.listdir(root):
         curr = os.path.join(root, name)
         LOGGER.info('Looking into %s for tags of %s', curr, name)
 
-        if not os.path.isdir(curr):
+        if not os.path.isdir(curr) or name == BLOB_STORE_ROOT:
             continue
 
         for tag in os.listdir(curr):
@@ -64,24 +150,11 @@ def find_images(root):
                 LOGGER.info('No manifest file at %s', manifest)
                 continue
 
-            with open(manifest, 'r') as fd:
-                LOGGER.info('Attempting to load JSON data from %s', manifest)
-                try:
-                    data = json.load(fd)
-                except json.JSONDecodeError:
-                    LOGGER.info('Failed to decode JSON from %s', manifest)
-                    data = None
+            entry = index.get(manifest) if index is not None else {}
+            if 'valid' not in entry:
+                entry['valid'] = is_valid_manifest(manifest)
 
-            if not data:
-                continue
-
-            if data.get('schemaVersion') != 2:
-                LOGGER.info('Invalid schemaVersion in %s', manifest)
-                continue
-
-            if data.get('mediaType') != \
-                    'application/vnd.docker.distribution.manifest.v2+json':
-                LOGGER.info('Invalid mediaType in %s', manifest)
+            if not entry['valid']:
                 continue
 
             LOGGER.info('Found image %s:%s in %s', name, tag, curr)
@@ -89,15 +162,17 @@ def find_images(root):
 
 
 def create_config(root, server_root, name_prefix, with_constants=True,
-                  only_constants=False):
+                  only_constants=False, index=None):
     if with_constants:
         yield CONSTANTS
 
     if only_constants:
         return
 
+    blob_store = os.path.isdir(os.path.join(root, BLOB_STORE))
+
     images = {}
-    for (name, tag) in find_images(root):
+    for (name, tag) in find_images(root, index=index):
         images.setdefault(name, set()).add(tag)
 
     for (name, tags) in sorted(images.items()):
@@ -122,13 +197,7 @@ location = /v2/{name_prefix:s}{name:s}/tags/list {{
         for tag in sorted(tags):
             manifest_file = os.path.join(root, name, tag, MANIFEST_JSON)
 
-            digest = hashlib.sha256()
-
-            with open(manifest_file, 'rb') as fd:
-                for chunk in iter(lambda: fd.read(4096), b''):
-                    digest.update(chunk)
-
-            hexdigest = digest.hexdigest()
+            hexdigest = manifest_digest(manifest_file, index=index)
 
             yield '''
 location = "/v2/{name_prefix:s}{name:s}/manifests/{tag:s}" {{
@@ -172,16 +241,29 @@ location = "/v2/{name_prefix:s}{name:s}/manifests/sha256:{digest:s}" {{
 
             seen_digests.add(hexdigest)
 
+        paths = ' '.join(
+            '{name:s}/{tag:s}/$1'.format(name=name, tag=tag)
+            if blob_store else '{tag:s}/$1'.format(tag=tag)
+            for tag in sorted(tags)
+        )
+        if blob_store:
+            # Blobs are looked up in the shared store first, so that a
+            # request is served after a single lookup
+            paths = '{store:s}/$1 {paths:s}'.format(
+                store=BLOB_STORE, paths=paths,
+            )
+
         yield '''
 location ~ "/v2/{name_prefix:s}{name:s}/blobs/sha256:([a-f0-9]{{64}})" {{
-    alias {server_root:s}/{name:s}/;
+    alias {server_root:s}/{location:s};
     try_files {paths:s} =404;
 }}
 '''.format(
         name_prefix=name_prefix.lstrip('/'),
         server_root=server_root,
         name=name,
-        paths=' '.join('{tag:s}/$1'.format(tag=tag) for tag in sorted(tags)),
+        location='' if blob_store else '{name:s}/'.format(name=name),
+        paths=paths,
     )
 
 
@@ -218,6 +300,12 @@ def main():
         help='root directory from where exported image files are served' \
                 ' (default: ROOT)'
     )
+    parser.add_argument(
+        '--digest-index',
+        metavar='PATH',
+        help='file used to record manifests validity and digests across runs,'
+                ' so unchanged manifests are not read again',
+    )
     parser.add_argument(
         'root',
         metavar='ROOT',
@@ -239,12 +327,18 @@ def main():
     logging.debug('Server root: %s', server_root)
     logging.debug('Root: %s', root)
 
+    index = DigestIndex(args.digest_index) if args.digest_index else None
+
     config_gen = create_config(
-        root, server_root, name_prefix, with_constants, only_constants
+        root, server_root, name_prefix, with_constants, only_constants,
+        index=index,
     )
     for part in config_gen:
         sys.stdout.write(part)
 
+    if index is not None:
+        index.save()
+
 
 if __name__ == '__main__':
     main()
@@ -24,11 +24,26 @@ It performs the following tasks:
       "{{ build_image_name("<imgname>", False) }}"
     - "__full_image__(<imgname>)", to replace with
       "{{ build_image_name("<imgname>") }}"
+
+Several charts can be rendered at once, concurrently, using `--specs` with a
+YAML file listing the command-line arguments of each chart and the path to
+write its result to (see `charts/render-specs.yaml` for all the addons):
+
+    - args: [fluent-bit, --namespace, metalk8s-logging,
+             charts/fluent-bit.yaml, charts/fluent-bit/]
+      output: salt/metalk8s/addons/logging/fluent-bit/deployed/chart.sls
+
+Charts whose inputs (arguments, values, chart directory, Prometheus rules to
+drop and this script) did not change since their last rendering are skipped.
 '''
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import copy
+import hashlib
 import io
+import json
+import os
 import re
 import sys
 import subprocess
@@ -37,9 +52,14 @@ import yaml
 from yaml.dumper import SafeDumper
 from yaml.representer import SafeRepresenter
 
+# Use libyaml to parse the (large) rendered charts when available.
+# Dumping still uses the pure Python implementation: libyaml wraps long quoted
+# strings differently, which would change all the generated files.
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 START_BLOCK = """
-#!jinja | metalk8s_kubernetes
+#!jinja | metalk8s_kubernetes{renderer_args}
 
 {{%- from "metalk8s/repo/macro.sls" import build_image_name with context %}}
 {csc_defaults}
@@ -87,7 +107,7 @@ def fixup_dict(doc):
 class multiline_str(str): pass
 
 def representer_multiline_str(dumper, data):
-    scalar = SafeRepresenter.represent_str(dumper, data)
+    scalar = SafeRepresenter.represent_str(dumper, str(data))
     scalar.style = '|'
     return scalar
 
@@ -137,41 +157,43 @@ def keep_doc(doc):
     return True
 
 
-def replace_magic_strings(rendered_yaml):
+# Magic strings are replaced one after the other, in this order, as their
+# patterns may overlap (e.g. `__escape__` captures the rest of its line)
+MAGIC_STRINGS = [
     # Handle __var__
-    result = re.sub(
-        r'__var__\((?P<varname>[\w\-_]+(?:\.[\w\-_()]+)*)\)',
+    (
+        re.compile(r'__var__\((?P<varname>[\w\-_]+(?:\.[\w\-_()]+)*)\)'),
         r'{% endraw -%}{{ \g<varname> }}{%- raw %}',
-        rendered_yaml,
-    )
-
+    ),
     # Handle __var_tojson__
-    result = re.sub(
-        r'__var_tojson__\((?P<varname>[\w\-_]+(?:\.[\w\-_()|]+)*)\)',
+    (
+        re.compile(
+            r'__var_tojson__\((?P<varname>[\w\-_]+(?:\.[\w\-_()|]+)*)\)'
+        ),
         r'  {% endraw -%}{{ \g<varname> | tojson }}{%- raw %}',
-        result,
-    )
-
+    ),
     # Handle __escape__
-    result = re.sub(
-        r'__escape__\((?P<varname>.*)\)',
+    (
+        re.compile(r'__escape__\((?P<varname>.*)\)'),
         r'"{% endraw -%}\g<varname>{%- raw %}"',
-        result,
-    )
-
+    ),
     # Handle __image__
-    result = re.sub(
-        r'__image__\((?P<imgname>[\w\-]+)\)',
+    (
+        re.compile(r'__image__\((?P<imgname>[\w\-]+)\)'),
         r'{% endraw -%}{{ build_image_name("\g<imgname>", False) }}{%- raw %}',
-        result,
-    )
-
+    ),
     # Handle __full_image__ (include version tag in the rendered name)
-    result = re.sub(
-        r'__full_image__\((?P<imgname>[\w\-]+)\)',
+    (
+        re.compile(r'__full_image__\((?P<imgname>[\w\-]+)\)'),
         r'{% endraw -%}{{ build_image_name("\g<imgname>") }}{%- raw %}',
-        result,
-    )
+    ),
+]
+
+
+def replace_magic_strings(rendered_yaml):
+    result = rendered_yaml
+    for regex, replacement in MAGIC_STRINGS:
+        result = regex.sub(replacement, result)
 
     return result
 
@@ -200,7 +222,7 @@ def remove_prometheus_rules(template, drop_rules):
     return updated_template
 
 
-def main():
+def build_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument('name', help="Denotes the name of the chart")
     parser.add_argument(
@@ -275,9 +297,50 @@ def main():
         help="Remove a given manifest from the resulting chart",
     )
 
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help="Apply all the resulting objects from a single batched state "
+             "(see `batch` option of the `metalk8s_kubernetes` renderer)",
+    )
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        help="Keep the resulting objects out of the rendered states "
+             "(see `lazy` option of the `metalk8s_kubernetes` renderer)",
+    )
+
     parser.add_argument('path', help="Path to the chart directory")
-    args = parser.parse_args()
 
+    return parser
+
+
+def build_specs_parser():
+    parser = argparse.ArgumentParser(
+        description="Render several charts concurrently"
+    )
+    parser.add_argument(
+        '--specs',
+        required=True,
+        help="YAML formatted file listing the charts to render (see above)",
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help="Number of charts to render concurrently",
+    )
+    parser.add_argument(
+        '--cache',
+        help="Path to the cache of the rendered charts inputs (defaults to "
+             ".render-cache.json next to the specs file)",
+    )
+
+    return parser
+
+
+def render(args):
     template = subprocess.check_output([
         'helm', 'template', args.name,
         '--namespace', args.namespace,
@@ -319,15 +382,23 @@ def main():
             )
         )
 
-    sys.stdout.write(START_BLOCK.format(
+    renderer_args = [
+        '{}=true'.format(option)
+        for option in ('batch', 'lazy') if getattr(args, option)
+    ]
+
+    output = io.StringIO()
+    output.write(START_BLOCK.format(
+            renderer_args=' {}'.format('&'.join(renderer_args))
+            if renderer_args else '',
             csc_defaults='\n'.join(import_csc_yaml),
             configlines='\n'.join(config)
         ).lstrip()
     )
-    sys.stdout.write('\n')
+    output.write('\n')
 
     manifests = []
-    for doc in yaml.safe_load_all(template):
+    for doc in yaml.load_all(template, Loader=SafeLoader):
         if keep_doc(doc):
             doc = fixup(doc)
         if doc and not remove_doc(doc, args.remove_manifests):
@@ -341,9 +412,104 @@ def main():
     )
     stream.seek(0)
 
-    sys.stdout.write(replace_magic_strings(stream.read()))
+    output.write(replace_magic_strings(stream.read()))
+
+    output.write(END_BLOCK)
+
+    return output.getvalue()
+
+
+def _hash_file(hasher, path):
+    hasher.update(os.fsencode(path))
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(1024 * 1024), b''):
+            hasher.update(chunk)
+
+
+def inputs_digest(args, argv):
+    """Compute a digest of everything the rendering of a chart depends on."""
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(argv).encode('utf-8'))
+    _hash_file(hasher, os.path.abspath(__file__))
+    _hash_file(hasher, args.values)
+    if args.drop_prometheus_rules:
+        _hash_file(hasher, args.drop_prometheus_rules)
+    for dirpath, dirnames, filenames in os.walk(args.path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            _hash_file(hasher, os.path.join(dirpath, filename))
+    return hasher.hexdigest()
+
+
+def render_spec(spec):
+    """Render a chart from its spec, and write the result."""
+    args = build_parser().parse_args(spec['args'])
+    content = render(args)
+    tmp = '{}.tmp'.format(spec['output'])
+    with open(tmp, 'w') as fd:
+        fd.write(content)
+    os.replace(tmp, spec['output'])
+    return spec['output']
+
+
+def render_specs(specs_path, jobs, cache_path=None):
+    with open(specs_path, 'r') as fd:
+        specs = yaml.safe_load(fd) or []
+
+    if cache_path is None:
+        cache_path = os.path.join(
+            os.path.dirname(specs_path), '.render-cache.json'
+        )
+    try:
+        with open(cache_path, 'r') as fd:
+            cache = json.load(fd)
+    except (OSError, ValueError):
+        cache = {}
+
+    digests = {}
+    todo = []
+    for spec in specs:
+        digest = inputs_digest(
+            build_parser().parse_args(spec['args']), spec['args']
+        )
+        if os.path.exists(spec['output']) and \
+                cache.get(spec['output']) == digest:
+            sys.stderr.write('Skipping {} (up to date)\n'.format(
+                spec['output']
+            ))
+            continue
+        digests[spec['output']] = digest
+        todo.append(spec)
+
+    failed = False
+    with ProcessPoolExecutor(max_workers=max(jobs or 1, 1)) as executor:
+        futures = [executor.submit(render_spec, spec) for spec in todo]
+        for spec, future in zip(todo, futures):
+            try:
+                future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                sys.stderr.write('Failed to render {}: {}\n'.format(
+                    spec['output'], exc
+                ))
+                cache.pop(spec['output'], None)
+                failed = True
+            else:
+                sys.stderr.write('Rendered {}\n'.format(spec['output']))
+                cache[spec['output']] = digests[spec['output']]
+
+    with open(cache_path, 'w') as fd:
+        json.dump(cache, fd, indent=2, sort_keys=True)
+
+    return 1 if failed else 0
+
+
+def main():
+    if any(arg.split('=', 1)[0] == '--specs' for arg in sys.argv[1:]):
+        args = build_specs_parser().parse_args()
+        sys.exit(render_specs(args.specs, args.jobs, args.cache))
 
-    sys.stdout.write(END_BLOCK)
+    args = build_parser().parse_args()
+    sys.stdout.write(render(args))
 
 
 if __name__ == '__main__':
@@ -1,6 +1,11 @@
 import base64
+import collections
 from functools import wraps
+import hashlib
 import logging
+import os
+import threading
+import time
 
 MISSING_DEPS = []
 
@@ -64,42 +69,131 @@ def _check_auth_args(f):
     return wrapped
 
 
-def _patch_kubeconfig(kubeconfig, username, token):
-    kubeconfig.api_key = {
-        'authorization': token,
-    }
-    kubeconfig.api_key_prefix = {
-        'authorization': 'Bearer',
-    }
-    kubeconfig.username = username
-    kubeconfig.cert_file = None
-    kubeconfig.key_file = None
+class _ReviewCache(object):
+    """Bounded cache of successful token reviews, expiring after a TTL.
+
+    Entries are keyed on a hash of the username and token, so that raw
+    tokens are never stored, and hold the groups of the user once reviewed.
+    The least recently used entries are dropped when the cache is full.
+    """
+    TTL = 60
+    MAX_SIZE = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Mapping key -> [expiration time, groups (None if not reviewed)]
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def key(username, token):
+        return hashlib.sha256(
+            '{}\0{}'.format(username, token).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key):
+        """Return the entry for `key`, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def add(self, key, ttl=TTL, max_size=MAX_SIZE):
+        with self._lock:
+            self._entries[key] = [time.monotonic() + ttl, None]
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(max_size, 1):
+                self._entries.popitem(last=False)
+
+    def set_groups(self, key, groups):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = list(groups)
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+_REVIEW_CACHE = _ReviewCache()
+
+
+class _ClientPool(object):
+    """API clients shared by all the requests, per kubeconfig.
+
+    Two clients are built from the kubeconfig: one with its credentials, to
+    review tokens, and one without any, to send requests on behalf of users
+    (with their token). They are rebuilt when the kubeconfig changes on disk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._clients = None
+
+    def get(self, config_file, context=None):
+        """Return the `(admin, user)` API clients for a kubeconfig."""
+        try:
+            mtime = os.stat(config_file).st_mtime
+        except OSError:
+            mtime = None
+        key = (config_file, mtime, context)
+
+        with self._lock:
+            if self._key != key:
+                self._clients = (
+                    kubernetes.client.ApiClient(configuration=_load_kubeconfig(
+                        config_file, context
+                    )),
+                    kubernetes.client.ApiClient(configuration=_load_kubeconfig(
+                        config_file, context, with_credentials=False
+                    )),
+                )
+                self._key = key
+            return self._clients
 
 
-def _review_access(kubeconfig, resource, verb):
-    client = kubernetes.client.ApiClient(configuration=kubeconfig)
-    authz_api = kubernetes.client.AuthorizationV1Api(api_client=client)
+_CLIENT_POOL = _ClientPool()
 
+
+def _review_access(client, token, resource, verb):
     # NOTE: any authenticated user can use this API.
     # This comes from the fact that an authenticated user will always belong to
     # the `system:authenticated` group, and this group is bound to the
     # `system:basic-user` ClusterRole, which enables creating
     # SelfSubjectAccessReviews and SelfSubjectRulesReviews.
-    return authz_api.create_self_subject_access_review(
-        body=kubernetes.client.V1SelfSubjectAccessReview(
-            spec=kubernetes.client.V1SelfSubjectAccessReviewSpec(
-                resource_attributes=kubernetes.client.V1ResourceAttributes(
-                    resource=resource,
-                    verb=verb,
-                ),
+    body = kubernetes.client.V1SelfSubjectAccessReview(
+        spec=kubernetes.client.V1SelfSubjectAccessReviewSpec(
+            resource_attributes=kubernetes.client.V1ResourceAttributes(
+                resource=resource,
+                verb=verb,
             ),
         ),
     )
 
+    # The client is shared by all users, so the token is passed per request
+    # rather than stored in its configuration
+    return client.call_api(
+        '/apis/authorization.k8s.io/v1/selfsubjectaccessreviews', 'POST',
+        header_params={
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'Authorization': 'Bearer {}'.format(token),
+        },
+        body=body,
+        response_type='V1SelfSubjectAccessReview',
+        auth_settings=[],
+        _return_http_data_only=True,
+    )
+
 
-def _review_token(kubeconfig, username, token):
+def _review_token(client, username, token):
     """Check the provided bearer token using the TokenReview API."""
-    client = kubernetes.client.ApiClient(configuration=kubeconfig)
     authn_api = kubernetes.client.AuthenticationV1Api(api_client=client)
 
     token_review = authn_api.create_token_review(
@@ -128,8 +222,8 @@ def _review_token(kubeconfig, username, token):
         return False
 
 
-def _check_node_admin(kubeconfig):
-    return _review_access(kubeconfig, 'nodes', '*').status.allowed
+def _check_node_admin(client, token):
+    return _review_access(client, token, 'nodes', '*').status.allowed
 
 
 AVAILABLES_GROUPS = {
@@ -137,58 +231,92 @@ AVAILABLES_GROUPS = {
 }
 
 
-def _get_groups(kubeconfig, username, token):
-    _patch_kubeconfig(kubeconfig, username, token)
-
+def _get_groups(client, token):
     groups = set()
 
     for group, func in AVAILABLES_GROUPS.items():
-        if func(kubeconfig):
+        if func(client, token):
             groups.add(group)
 
     return list(groups)
 
 
-@_log_exceptions
-def _load_kubeconfig(opts):
+def _load_config(opts):
     config = {
         'kubeconfig': None,
         'context': None,
+        'cache_ttl': _ReviewCache.TTL,
+        'cache_size': _ReviewCache.MAX_SIZE,
     }
 
     for opt in opts['external_auth'][__virtualname__]:
         if opt.startswith('^'):
             config[opt[1:]] = opts['external_auth'][__virtualname__][opt]
 
-    if config['kubeconfig'] is None:
-        log.error('Missing configuration: kubeconfig')
-        return None
+    return config
+
 
+def _load_kubeconfig(config_file, context=None, with_credentials=True):
     kubeconfig = kubernetes.client.Configuration()
     kubernetes.config.load_kube_config(
-        config_file=config['kubeconfig'],
-        context=config['context'],
+        config_file=config_file,
+        context=context,
         client_configuration=kubeconfig,
         persist_config=False,
     )
 
+    if not with_credentials:
+        kubeconfig.api_key = {}
+        kubeconfig.api_key_prefix = {}
+        kubeconfig.username = None
+        kubeconfig.password = None
+        kubeconfig.cert_file = None
+        kubeconfig.key_file = None
+
     return kubeconfig
 
 
+@_log_exceptions
+def _get_clients(config):
+    if config['kubeconfig'] is None:
+        log.error('Missing configuration: kubeconfig')
+        return None
+
+    return _CLIENT_POOL.get(config['kubeconfig'], config['context'])
+
+
 @_check_auth_args
 def auth(username, token=None, **kwargs):
     log.info('Authentication request for "%s"', username)
 
-    kubeconfig = _load_kubeconfig(__opts__)
-    if kubeconfig is None:
+    config = _load_config(__opts__)
+    key = _ReviewCache.key(username, token)
+    if _REVIEW_CACHE.get(key) is not None:
+        log.info('Authentication request for "%s" succeeded (cached)',
+                 username)
+        return True
+
+    clients = _get_clients(config)
+    if clients is None:
         log.info('Failed to load Kubernetes API client configuration')
         return False
 
-    result = _review_token(kubeconfig, username, token)
+    try:
+        result = _review_token(clients[0], username, token)
+    except Exception:
+        _REVIEW_CACHE.evict(key)
+        raise
+
     if result:
         log.info('Authentication request for "%s" succeeded', username)
+        _REVIEW_CACHE.add(
+            key,
+            ttl=float(config['cache_ttl']),
+            max_size=int(config['cache_size']),
+        )
     else:
         log.warning('Authentication request for "%s" failed', username)
+        _REVIEW_CACHE.evict(key)
 
     return result
 
@@ -197,11 +325,26 @@ def auth(username, token=None, **kwargs):
 def groups(username, password=None, token=None, **kwargs):
     log.info('Groups request for "%s"', username)
 
-    kubeconfig = _load_kubeconfig(__opts__)
-    if kubeconfig is None:
+    config = _load_config(__opts__)
+    key = _ReviewCache.key(username, token)
+    entry = _REVIEW_CACHE.get(key)
+    if entry is not None and entry[1] is not None:
+        log.debug('Groups for "%s" (cached): %s',
+                  username, ', '.join(entry[1]))
+        return list(entry[1])
+
+    clients = _get_clients(config)
+    if clients is None:
         log.info('Failed to load Kubernetes API client configuration')
         return []
 
-    result = _get_groups(kubeconfig, username, token)
+    try:
+        result = _get_groups(clients[1], token)
+    except Exception:
+        _REVIEW_CACHE.evict(key)
+        raise
+
+    # Only kept for tokens already authenticated (see `auth`)
+    _REVIEW_CACHE.set_groups(key, result)
     log.debug('Groups for "%s": %s', username, ', '.join(result))
     return result
@@ -3,17 +3,41 @@ Various functions to interact with :program:`containerd` using :command:`ctr`.
 '''
 
 import logging
+import re
+import threading
 
 log = logging.getLogger(__name__)
 
 
 __virtualname__ = 'containerd'
 
+# Same key as in the `cri` module
+CRI_IMAGE_INDEX_KEY = 'cri.image_index'
+
+_UNPACKING_RE = re.compile(
+    r'^unpacking (?P<name>\S+) \((?P<digest>sha256:[a-fA-F0-9]{64})\)',
+    re.MULTILINE
+)
+
+# The image index may be updated by concurrent imports (e.g. from threads)
+_IMAGE_INDEX_LOCK = threading.Lock()
+
 
 def __virtual__():
     return __virtualname__
 
 
+def _image_names(name, digest):
+    '''Return the tag and digest names of an imported image.'''
+    names = {name}
+    if '@' not in name:
+        repository = name
+        if ':' in name.rsplit('/', 1)[-1]:
+            repository = name.rsplit(':', 1)[0]
+        names.add('{}@{}'.format(repository, digest))
+    return names
+
+
 def load_cri_image(path):
     '''
     Load a Docker image archive into the :program:`containerd` CRI image cache.
@@ -26,6 +50,21 @@ def load_cri_image(path):
         Path of the Docker image archive to load
     '''
     log.info('Importing image from "%s" into CRI cache', path)
-    return __salt__['cmd.run_all'](
+    ret = __salt__['cmd.run_all'](
         'ctr --debug -n k8s.io image import "{0}"'.format(path)
     )
+
+    if ret['retcode'] == 0:
+        # Keep the image list of the `cri` module up to date, without
+        # listing all the images again
+        imported = _UNPACKING_RE.findall(ret['stdout'])
+        with _IMAGE_INDEX_LOCK:
+            if imported and CRI_IMAGE_INDEX_KEY in __context__:
+                for name, digest in imported:
+                    __context__[CRI_IMAGE_INDEX_KEY].update(
+                        _image_names(name, digest)
+                    )
+            elif not imported:
+                __context__.pop(CRI_IMAGE_INDEX_KEY, None)
+
+    return ret
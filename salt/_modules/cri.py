@@ -37,26 +37,46 @@ def list_images():
     return salt.utils.json.loads(out['stdout'])['images']
 
 
+# Names (tags and digests) of the images in the CRI image cache, shared by all
+# the calls of a same job (also updated by `containerd.load_cri_image`).
+IMAGE_INDEX_KEY = 'cri.image_index'
+
+
+def _get_image_index():
+    '''
+    Get the names of the images in the CRI image cache, listed once per job.
+
+    Return None if the images cannot be listed.
+    '''
+    index = __context__.get(IMAGE_INDEX_KEY)
+    if index is None:
+        images = list_images()
+        if images is None:
+            return None
+        index = __context__[IMAGE_INDEX_KEY] = set()
+        for image in images:
+            index.update(image.get('repoTags') or [])
+            index.update(image.get('repoDigests') or [])
+    return index
+
+
 def available(name):
     '''
     Check if given image exists in the containerd namespace image list
 
+    .. note::
+
+       The image list is only retrieved once per job, then kept up to date
+       with the images pulled or loaded by this job.
+
     name
         Name of the container image
     '''
-    images = list_images()
-    available = False
-    if not images:
+    index = _get_image_index()
+    if not index:
         return False
 
-    for image in images:
-        if name in image.get('repoTags', []):
-            available = True
-            break
-        if name in image.get('repoDigests', []):
-            available = True
-            break
-    return available
+    return name in index
 
 
 _PULL_RES = {
@@ -85,6 +105,8 @@ def pull_image(image):
         return None
 
     log.info('CRI image "%s" pulled', image)
+    if IMAGE_INDEX_KEY in __context__:
+        __context__[IMAGE_INDEX_KEY].add(image)
     stdout = out['stdout']
 
     ret = {
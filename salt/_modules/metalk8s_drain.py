@@ -8,6 +8,7 @@ This module's functions are merged into the `metalk8s_kubernetes`
 module when called by salt by virtue of its `__virtualname__` attribute.
 '''
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 import operator
@@ -106,6 +107,52 @@ def _get_controller_of(pod):
     return None
 
 
+def _selector_matches(selector, labels):
+    '''Check if a label selector matches a set of labels.
+
+    Note that, as for `policy/v1beta1` PodDisruptionBudgets, an empty or
+    missing selector matches nothing.
+
+    Args:
+      - selector: kubernetes label selector object
+      - labels: dict of labels to match
+    Returns: True if the selector matches the labels, False if not
+    '''
+    if not selector:
+        return False
+
+    match_labels = selector.get('match_labels') or {}
+    match_expressions = selector.get('match_expressions') or []
+    if not match_labels and not match_expressions:
+        return False
+
+    for key, value in match_labels.items():
+        if labels.get(key) != value:
+            return False
+
+    for expression in match_expressions:
+        key = expression['key']
+        operator_ = expression['operator']
+        values = expression.get('values') or []
+        if operator_ == 'In' and labels.get(key) not in values:
+            return False
+        if operator_ == 'NotIn' and key in labels and labels[key] in values:
+            return False
+        if operator_ == 'Exists' and key not in labels:
+            return False
+        if operator_ == 'DoesNotExist' and key in labels:
+            return False
+
+    return True
+
+
+def _pod_key(pod):
+    '''Identify a pod instance (a pod recreated with the same name, e.g. for
+    a StatefulSet, is a different instance).'''
+    meta = pod['metadata']
+    return (meta['namespace'], meta['name'], meta['uid'])
+
+
 def _message_from_pods_dict(errors_dict):
     '''Form a message string from a 'pod kind': [pod name...] dict.
 
@@ -135,6 +182,9 @@ class Drain(object):
 
     # According to `kubectl` code, this value should be 1 second by default
     KUBECTL_INTERVAL = 1
+    # kubectl waits 5 seconds before retrying a rejected eviction
+    EVICTION_RETRY_INTERVAL = 5
+    DEFAULT_PARALLELISM = 10
     WARNING_MSG = {
         "daemonset": "Ignoring DaemonSet-managed pods",
         "localStorage": "Deleting pods with local storage",
@@ -158,6 +208,7 @@ class Drain(object):
                  ignore_daemonset=False,
                  timeout=0,
                  delete_local_data=False,
+                 parallelism=DEFAULT_PARALLELISM,
                  **kwargs):
         self._node_name = node_name
         self._force = force
@@ -165,6 +216,7 @@ class Drain(object):
         self._ignore_daemonset = ignore_daemonset
         self._timeout = timeout or (2 ** 64 - 1)
         self._delete_local_data = delete_local_data
+        self._parallelism = max(1, int(parallelism))
         self._kwargs = kwargs
 
     node_name = property(operator.attrgetter('_node_name'))
@@ -173,6 +225,7 @@ class Drain(object):
     ignore_daemonset = property(operator.attrgetter('_ignore_daemonset'))
     timeout = property(operator.attrgetter('_timeout'))
     delete_local_data = property(operator.attrgetter('_delete_local_data'))
+    parallelism = property(operator.attrgetter('_parallelism'))
 
     def localstorage_filter(self, pod):
         '''Compute eviction status for the pod according to local storage.
@@ -399,9 +452,48 @@ class Drain(object):
             )
         return "Eviction complete."
 
+    def get_disruption_budgets(self):
+        '''List all PodDisruptionBudgets from the cluster.'''
+        return __salt__['metalk8s_kubernetes.list_objects'](
+            kind='PodDisruptionBudget',
+            apiVersion='policy/v1beta1',
+            all_namespaces=True,
+            **self._kwargs
+        )
+
+    @staticmethod
+    def get_backoff_key(pod, budgets):
+        '''Compute the key used to group eviction retries of a pod.
+
+        Evictions are rejected because of a disruption budget, so all pods
+        covered by the same PodDisruptionBudget share their backoff. Pods not
+        covered by any budget are retried independently.
+        '''
+        meta = pod['metadata']
+        labels = meta.get('labels') or {}
+        for budget in budgets:
+            if budget['metadata']['namespace'] == meta['namespace'] and \
+                    _selector_matches(budget['spec']['selector'], labels):
+                return ('budget', meta['namespace'],
+                        budget['metadata']['name'])
+        return ('pod', meta['namespace'], meta['name'])
+
+    def _evict(self, pod):
+        return evict_pod(
+            name=pod['metadata']['name'],
+            namespace=pod['metadata']['namespace'],
+            grace_period=self.grace_period,
+            **self._kwargs
+        )
+
     def evict_pods(self, pods):
         '''Trigger the eviction process for all pods passed.
 
+        Evictions are created concurrently (at most `parallelism` at once).
+        When an eviction is rejected (429 Too Many Requests), all pods covered
+        by the same disruption budget wait for `EVICTION_RETRY_INTERVAL`
+        before being retried.
+
         Args:
           - pods: list of Kubernetes API pods to evict
         Returns: None
@@ -409,23 +501,53 @@ class Drain(object):
                 after the specified timeout value
         '''
         self.start_timer()
-        for pod in pods:
-            while self.check_timer():
-                evicted = evict_pod(
-                    name=pod['metadata']['name'],
-                    namespace=pod['metadata']['namespace'],
-                    grace_period=self.grace_period,
-                    **self._kwargs
-                )
-                if evicted:
-                    break
-                time.sleep(5)  # kubectl waits 5 seconds
+        budgets = self.get_disruption_budgets() if pods else []
+        backoff_keys = {
+            _pod_key(pod): self.get_backoff_key(pod, budgets) for pod in pods
+        }
+        retry_at = {}
+        pending = list(pods)
+        total = len(pods)
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            while pending and self.check_timer():
+                now = time.time()
+                ready = [
+                    pod for pod in pending
+                    if retry_at.get(backoff_keys[_pod_key(pod)], 0) <= now
+                ]
+                if not ready:
+                    # Only consider backoffs of pods still to evict
+                    time.sleep(max(0, min(
+                        retry_at[backoff_keys[_pod_key(pod)]]
+                        for pod in pending
+                    ) - now))
+                    continue
+
+                results = list(executor.map(self._evict, ready))
+                # Start backoffs once all rejections were received
+                now = time.time()
+                for pod, evicted in zip(ready, results):
+                    if evicted:
+                        pending.remove(pod)
+                        log.info(
+                            "Eviction of Pod %s created (%d/%d)",
+                            pod['metadata']['name'],
+                            total - len(pending),
+                            total,
+                        )
+                    else:
+                        retry_at[backoff_keys[_pod_key(pod)]] = \
+                            now + self.EVICTION_RETRY_INTERVAL
 
         self.wait_for_eviction(pods)
 
     def wait_for_eviction(self, pods):
         '''Wait for pods deletion.
 
+        Pods on the node are tracked using a single watch (through a
+        `metalk8s_kubernetes` informer), rather than querying each pod.
+
         Args:
           - pods: the list of pods on which eviction was triggered, for which
                   we wait until they are no longer present in API queries.
@@ -433,32 +555,41 @@ class Drain(object):
         Raises: DrainTimeoutException if the eviction process is not complete
                 after the specified timeout value
         '''
-        while self.check_timer():
-            self.tick(self.KUBECTL_INTERVAL)
-            pending = []
-            for pod in pods:
-                response = __salt__['metalk8s_kubernetes.get_object'](
-                    kind='Pod',
-                    apiVersion='v1',
-                    name=pod['metadata']['name'],
-                    namespace=pod['metadata']['namespace'],
-                    **self._kwargs
-                )
-                if not response or \
-                        response['metadata']['uid'] != pod['metadata']['uid']:
-                    log.info("%s evicted", pod['metadata']['name'])
-                else:
-                    log.debug(
-                        "Waiting for eviction of Pod %s (current status: %s)",
-                        pod['metadata']['name'],
-                        pod.get('status', {}).get('phase'),
-                    )
-                    pending.append(pod)
-
-            if not pending:
-                break
-
-            pods = pending
+        if not pods:
+            return
+
+        kubeconfig, context = __salt__[
+            'metalk8s_kubernetes.get_kubeconfig'
+        ](**self._kwargs)
+        informer = __utils__['metalk8s_kubernetes.get_informer'](
+            kind='Pod',
+            apiVersion='v1',
+            kubeconfig=kubeconfig,
+            context=context,
+            field_selector='spec.nodeName={0}'.format(self.node_name),
+        )
+
+        try:
+            while pods and self.check_timer():
+                self.tick(self.KUBECTL_INTERVAL)
+                current = set(_pod_key(pod) for pod in informer.list())
+                pending = []
+                for pod in pods:
+                    if _pod_key(pod) not in current:
+                        log.info("%s evicted", pod['metadata']['name'])
+                    else:
+                        log.debug(
+                            "Waiting for eviction of Pod %s "
+                            "(current status: %s)",
+                            pod['metadata']['name'],
+                            pod.get('status', {}).get('phase'),
+                        )
+                        pending.append(pod)
+
+                pods = pending
+        finally:
+            # This informer is only useful during the drain, stop its watch
+            __utils__['metalk8s_kubernetes.release_informer'](informer)
 
     def start_timer(self):
         self._start = time.time()
@@ -560,6 +691,7 @@ def node_drain(node_name,
                timeout=0,
                delete_local_data=False,
                dry_run=False,
+               parallelism=Drain.DEFAULT_PARALLELISM,
                **kwargs):
     '''Trigger the drain process for a node.
 
@@ -570,6 +702,7 @@ def node_drain(node_name,
       - timeout           : drain process timeout value
       - delete_local_data : force deletion for pods with local storage
       - dry_run           : only run pod selection process, not eviction
+      - parallelism       : maximum number of evictions created at once
 
     Keyword args: connection parameters, passed through to connection utility
                   module.
@@ -584,6 +717,7 @@ def node_drain(node_name,
         ignore_daemonset=ignore_daemonset,
         timeout=timeout,
         delete_local_data=delete_local_data,
+        parallelism=parallelism,
         **kwargs
     )
     __salt__['metalk8s_kubernetes.cordon_node'](node_name, **kwargs)
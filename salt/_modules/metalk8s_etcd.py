@@ -2,7 +2,10 @@
 '''
 Module for handling etcd client specific calls.
 '''
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import time
+
 from six.moves.urllib.parse import urlparse
 
 from salt.exceptions import CommandExecutionError
@@ -10,12 +13,19 @@ from salt.exceptions import CommandExecutionError
 PYTHON_ETCD_PRESENT = False
 try:
     import etcd3
+    import grpc
     PYTHON_ETCD_PRESENT = True
 except ImportError:
     pass
 
 # Timeout when connection to etcd server
 TIMEOUT = 30
+# Timeout when connecting to etcd members to probe them, so that a dead member
+# does not stall the whole run (the probe itself then uses `TIMEOUT`)
+PROBE_TIMEOUT = 5
+# Duration (in seconds) for which an answering endpoint is reused without
+# probing the cluster again
+ENDPOINT_TTL = 30
 
 
 log = logging.getLogger(__name__)
@@ -30,8 +40,102 @@ def __virtual__():
         return False, "python-etcd3 not available"
 
 
+def _client(host, ca_cert, cert_key, cert_cert, port=None):
+    """Get a client for an etcd server, shared by all calls of an operation.
+
+    Clients are kept open (along with their gRPC channel) in `__context__`,
+    until closed by `_close_clients`.
+    """
+    clients = __context__.setdefault('metalk8s_etcd.clients', {})
+    key = (host, port, ca_cert, cert_key, cert_cert)
+    if key not in clients:
+        kwargs = {'port': port} if port else {}
+        clients[key] = etcd3.client(host=host,
+                                    ca_cert=ca_cert,
+                                    cert_key=cert_key,
+                                    cert_cert=cert_cert,
+                                    timeout=TIMEOUT,
+                                    **kwargs)
+    return clients[key]
+
+
+def _close(client):
+    try:
+        client.close()
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+
+def _forget_client(host, ca_cert, cert_key, cert_cert, port=None):
+    """Close and discard a shared client, e.g. after a failure."""
+    clients = __context__.get('metalk8s_etcd.clients', {})
+    client = clients.pop((host, port, ca_cert, cert_key, cert_cert), None)
+    if client is not None:
+        _close(client)
+
+
+def _close_clients():
+    """Close and discard all the shared clients, at the end of an operation."""
+    clients = __context__.pop('metalk8s_etcd.clients', {})
+    for client in clients.values():
+        _close(client)
+
+
+def _probe(hosts, ca_cert, cert_key, cert_cert):
+    """Check the status of all `hosts` concurrently.
+
+    Connecting to a member times out after `PROBE_TIMEOUT` seconds, while
+    retrieving its status is bound by the usual `TIMEOUT`.
+
+    Arguments:
+        hosts (list): (host, port) tuples, port can be None for the default
+
+    Returns the list of exceptions raised by each probe (None if healthy).
+    """
+    clients = [
+        _client(host, ca_cert, cert_key, cert_cert, port=port)
+        for host, port in hosts
+    ]
+
+    def _status(client):
+        try:
+            grpc.channel_ready_future(client.channel).result(
+                timeout=PROBE_TIMEOUT
+            )
+        except grpc.FutureTimeoutError:
+            return etcd3.exceptions.ConnectionTimeoutError(
+                'Unable to connect within {} seconds'.format(PROBE_TIMEOUT)
+            )
+        try:
+            client.status()
+        except Exception as exc:  # pylint: disable=broad-except
+            return exc
+        return None
+
+    if not clients:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        errors = list(executor.map(_status, clients))
+
+    for (host, port), error in zip(hosts, errors):
+        if error is not None:
+            _forget_client(host, ca_cert, cert_key, cert_cert, port=port)
+
+    return errors
+
+
 def _get_endpoint_up(ca_cert, cert_key, cert_cert, nodes=None):
-    """Pick an answering etcd endpoint among all etcd servers."""
+    """Pick an answering etcd endpoint among all etcd servers.
+
+    The endpoint is cached for `ENDPOINT_TTL` seconds in the current job.
+    """
+    cache = __context__.setdefault('metalk8s_etcd.endpoints', {})
+    cache_key = (tuple(nodes or ()), ca_cert, cert_key, cert_cert)
+    cached = cache.get(cache_key)
+    if cached is not None and time.time() - cached[1] < ENDPOINT_TTL:
+        return cached[0]
+
     etcd_hosts = __salt__['metalk8s.minions_by_role']('etcd', nodes=nodes)
 
     # Get host ip from etcd_hosts
@@ -46,18 +150,17 @@ def _get_endpoint_up(ca_cert, cert_key, cert_cert, nodes=None):
         if host in cp_ips
     ]
 
-    for endpoint in endpoints:
-        try:
-            with etcd3.client(host=endpoint,
-                              ca_cert=ca_cert,
-                              cert_key=cert_key,
-                              cert_cert=cert_cert,
-                              timeout=TIMEOUT) as etcd:
-                etcd.status()
-        except etcd3.exceptions.ConnectionFailedError:
-            pass
-        else:
+    errors = _probe(
+        [(endpoint, None) for endpoint in endpoints],
+        ca_cert, cert_key, cert_cert
+    )
+    for endpoint, error in zip(endpoints, errors):
+        if error is None:
+            cache[cache_key] = (endpoint, time.time())
             return endpoint
+        if not isinstance(error, (etcd3.exceptions.ConnectionFailedError,
+                                  etcd3.exceptions.ConnectionTimeoutError)):
+            raise error
 
     raise Exception('Unable to find an available etcd member in the cluster')
 
@@ -77,22 +180,21 @@ def add_etcd_node(
         endpoint (str): host server in the etcd cluster
                         IP is expected, not URL
     '''
-    if not endpoint:
-        # If we have no endpoint get it from mine
-        endpoint = _get_endpoint_up(
-            ca_cert=ca_cert,
-            cert_key=cert_key,
-            cert_cert=cert_cert
-        )
+    try:
+        if not endpoint:
+            # If we have no endpoint get it from mine
+            endpoint = _get_endpoint_up(
+                ca_cert=ca_cert,
+                cert_key=cert_key,
+                cert_cert=cert_cert
+            )
 
-    with etcd3.client(host=endpoint,
-                      ca_cert=ca_cert,
-                      cert_key=cert_key,
-                      cert_cert=cert_cert,
-                      timeout=TIMEOUT) as etcd:
+        etcd = _client(endpoint, ca_cert, cert_key, cert_cert)
         node = etcd.add_member(peer_urls)
 
-    return node
+        return node
+    finally:
+        _close_clients()
 
 
 def urls_exist_in_cluster(
@@ -102,24 +204,23 @@ def urls_exist_in_cluster(
         cert_key='/etc/kubernetes/pki/etcd/salt-master-etcd-client.key',
         cert_cert='/etc/kubernetes/pki/etcd/salt-master-etcd-client.crt'):
     '''Verify if peer_urls exists in cluster.'''
-    if not endpoint:
-        # If we have no endpoint get it from mine
-        endpoint = _get_endpoint_up(
-            ca_cert=ca_cert,
-            cert_key=cert_key,
-            cert_cert=cert_cert
-        )
+    try:
+        if not endpoint:
+            # If we have no endpoint get it from mine
+            endpoint = _get_endpoint_up(
+                ca_cert=ca_cert,
+                cert_key=cert_key,
+                cert_cert=cert_cert
+            )
 
-    with etcd3.client(host=endpoint,
-                      ca_cert=ca_cert,
-                      cert_key=cert_key,
-                      cert_cert=cert_cert,
-                      timeout=TIMEOUT) as etcd:
+        etcd = _client(endpoint, ca_cert, cert_key, cert_cert)
         all_urls = []
         for member in etcd.members:
             all_urls.extend(member.peer_urls)
 
-    return set(peer_urls).issubset(all_urls)
+        return set(peer_urls).issubset(all_urls)
+    finally:
+        _close_clients()
 
 
 def check_etcd_health(
@@ -134,49 +235,49 @@ def check_etcd_health(
     Arguments:
         minion_id (str): minion id of an etcd node
     '''
-    # Get host ip from the minion id
-    if minion_id:
-        endpoint = __salt__['saltutil.runner'](
-            'mine.get', tgt=minion_id, fun='control_plane_ip'
-        )[minion_id]
-    else:
-        endpoint = _get_endpoint_up(
-            ca_cert=ca_cert,
-            cert_key=cert_key,
-            cert_cert=cert_cert
-        )
-    # Get all members
-    with etcd3.client(host=endpoint,
-                      ca_cert=ca_cert,
-                      cert_key=cert_key,
-                      cert_cert=cert_cert,
-                      timeout=TIMEOUT) as etcd:
+    try:
+        # Get host ip from the minion id
+        if minion_id:
+            endpoint = __salt__['saltutil.runner'](
+                'mine.get', tgt=minion_id, fun='control_plane_ip'
+            )[minion_id]
+        else:
+            endpoint = _get_endpoint_up(
+                ca_cert=ca_cert,
+                cert_key=cert_key,
+                cert_cert=cert_cert
+            )
+        # Get all members
+        etcd = _client(endpoint, ca_cert, cert_key, cert_cert)
         etcd_members = list(etcd.members)
 
-    unhealthy_member = 0
-    for member in etcd_members:
-        etcd_url = urlparse(member.client_urls[0])
-        try:
-            with etcd3.client(host=etcd_url.hostname,
-                              port=etcd_url.port,
-                              ca_cert=ca_cert,
-                              cert_key=cert_key,
-                              cert_cert=cert_cert,
-                              timeout=TIMEOUT) as etcd:
-                etcd.status()
-        except Exception:  # pylint: disable=broad-except
-            log.debug(
-                "failed to check the health of member %s", member.name
-            )
-            unhealthy_member += 1
+        # Probe all members concurrently
+        member_urls = [
+            urlparse(member.client_urls[0]) for member in etcd_members
+        ]
+        errors = _probe(
+            [(url.hostname, url.port) for url in member_urls],
+            ca_cert, cert_key, cert_cert
+        )
 
-    # Raise on error as this function will be called by module.run in sls file
-    if unhealthy_member == len(etcd_members):
-        raise CommandExecutionError("cluster is unavailable")
-    elif unhealthy_member > 0:
-        raise CommandExecutionError("cluster is degraded")
-    else:
-        return "cluster is healthy"
+        unhealthy_member = 0
+        for member, error in zip(etcd_members, errors):
+            if error is not None:
+                log.debug(
+                    "failed to check the health of member %s: %s",
+                    member.name, error
+                )
+                unhealthy_member += 1
+
+        # Raise on error as this function will be called by module.run in sls file
+        if unhealthy_member == len(etcd_members):
+            raise CommandExecutionError("cluster is unavailable")
+        elif unhealthy_member > 0:
+            raise CommandExecutionError("cluster is degraded")
+        else:
+            return "cluster is healthy"
+    finally:
+        _close_clients()
 
 
 def get_etcd_member_list(
@@ -186,23 +287,20 @@ def get_etcd_member_list(
         cert_key='/etc/kubernetes/pki/etcd/salt-master-etcd-client.key',
         cert_cert='/etc/kubernetes/pki/etcd/salt-master-etcd-client.crt'):
     '''Get the list of etcd members using the python etcd3 client.'''
-    if not endpoint:
-        # If we have no endpoint get it from mine
-        try:
-            endpoint = _get_endpoint_up(
-                nodes=nodes,
-                ca_cert=ca_cert,
-                cert_key=cert_key,
-                cert_cert=cert_cert
-            )
-        except:
-            return []
-
-    with etcd3.client(host=endpoint,
-                      ca_cert=ca_cert,
-                      cert_key=cert_key,
-                      cert_cert=cert_cert,
-                      timeout=TIMEOUT) as etcd:
+    try:
+        if not endpoint:
+            # If we have no endpoint get it from mine
+            try:
+                endpoint = _get_endpoint_up(
+                    nodes=nodes,
+                    ca_cert=ca_cert,
+                    cert_key=cert_key,
+                    cert_cert=cert_cert
+                )
+            except:
+                return []
+
+        etcd = _client(endpoint, ca_cert, cert_key, cert_cert)
         return [
             {
                 'id': member.id,
@@ -211,3 +309,5 @@ def get_etcd_member_list(
                 'client_urls': list(member.client_urls)
             } for member in etcd.members
         ]
+    finally:
+        _close_clients()
@@ -4,9 +4,9 @@ This module relies on the `metalk8s_kubernetes` custom Salt utils module for
 parsing K8s object manifests, and providing direct bindings to the Python
 `kubernetes.client` models and APIs.
 
-Core methods (create_, get_, remove_, and replace_object) are defined in this
-module, while other methods can be found in `metalk8s_kubernetes_utils.py`,
-`metalk8s_drain.py` and `metalk8s_cordon.py`.
+Core methods (create_, get_, remove_, replace_ and apply_object) are defined
+in this module, while other methods can be found in
+`metalk8s_kubernetes_utils.py`, `metalk8s_drain.py` and `metalk8s_cordon.py`.
 """
 
 import json
@@ -75,7 +75,9 @@ def _handle_error(exception, action):
 
 def _object_manipulation_function(action):
     """Generate an execution function based on a CRUD method to use."""
-    assert action in ('create', 'retrieve', 'replace', 'delete', 'update'), (
+    assert action in (
+        'create', 'retrieve', 'replace', 'delete', 'update', 'apply'
+    ), (
         'Method "{}" is not supported'.format(action)
     )
 
@@ -139,7 +141,7 @@ def _object_manipulation_function(action):
         manifest = __salt__.metalk8s.format_slots(manifest)
 
         # Adding label containing metalk8s version (retrieved from saltenv)
-        if action in ['create', 'replace']:
+        if action in ['create', 'replace', 'apply']:
             match = re.search(r'^metalk8s-(?P<version>.+)$', saltenv)
             manifest.setdefault('metadata', {}).setdefault('labels', {})[
                 'metalk8s.scality.com/version'
@@ -160,7 +162,11 @@ def _object_manipulation_function(action):
             # (, "namespace")(and a patch for "update"), so we can not
             # create a Python kubernetes objects as some required field may
             # not be in the manifest
-            force_custom_object=action in ['retrieve', 'delete', 'update']
+            # For "apply" the manifest is sent as-is and validated by the API
+            # server, so there is no need to build the full object either
+            force_custom_object=action in [
+                'retrieve', 'delete', 'update', 'apply'
+            ]
         )
 
         call_kwargs = {}
@@ -183,6 +189,12 @@ def _object_manipulation_function(action):
                 call_kwargs['body']['metadata'].pop('name')
                 # Namespace may be empty so add a default to not failing
                 call_kwargs['body']['metadata'].pop('namespace', None)
+        elif action == 'apply':
+            # Server-side apply, the API server computes the merge itself
+            # so we do not need to retrieve the object beforehand
+            call_kwargs['body'] = json.dumps(manifest)
+            call_kwargs['field_manager'] = 'salt'
+            call_kwargs['force'] = True
         elif action != 'retrieve':
             call_kwargs['body'] = obj
 
@@ -226,7 +238,7 @@ def _object_manipulation_function(action):
     A manifest should be passed in standard Kubernetes format as a dictionary,
     or through a filepath.""".format(verb=action.capitalize())
 
-    if action in ['create', 'replace']:
+    if action in ['create', 'replace', 'apply']:
         method.__doc__ = """{base_doc}
 
     CLI Examples:
@@ -304,6 +316,7 @@ delete_object = _object_manipulation_function('delete')
 replace_object = _object_manipulation_function('replace')
 get_object = _object_manipulation_function('retrieve')
 update_object = _object_manipulation_function('update')
+apply_object = _object_manipulation_function('apply')
 
 
 # Check if a specific object exists
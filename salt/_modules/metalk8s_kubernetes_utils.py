@@ -162,18 +162,27 @@ def read_and_render_yaml_file(source, template, context=None, saltenv='base'):
         return salt.utils.yaml.safe_load(contents)
 
 
-def get_service_endpoints(service, namespace, kubeconfig):
+def get_service_endpoints(service, namespace, kubeconfig, informer=None):
+    """Retrieve the first address and the ports of a service.
+
+    If an Endpoints `informer` is given (see
+    `metalk8s_kubernetes.get_informer`), the Endpoints object is read from its
+    cache instead of the API server.
+    """
     error_tpl = \
         'Unable to get kubernetes endpoints for {} in namespace {}:\n{!s}'
 
     try:
-        endpoint = __salt__['metalk8s_kubernetes.get_object'](
-            name=service,
-            kind='Endpoints',
-            apiVersion='v1',
-            namespace=namespace,
-            kubeconfig=kubeconfig,
-        )
+        if informer is not None:
+            endpoint = informer.get(service, namespace=namespace)
+        else:
+            endpoint = __salt__['metalk8s_kubernetes.get_object'](
+                name=service,
+                kind='Endpoints',
+                apiVersion='v1',
+                namespace=namespace,
+                kubeconfig=kubeconfig,
+            )
     except CommandExecutionError as exc:
         raise CommandExecutionError(
             error_tpl.format(service, namespace, exc)
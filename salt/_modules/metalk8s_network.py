@@ -1,6 +1,5 @@
 '''Metalk8s network related utilities.'''
 
-import itertools
 import logging
 
 from salt._compat import ipaddress
@@ -20,6 +19,85 @@ def __virtual__():
     return __virtualname__
 
 
+class _NetworkFacts(object):
+    """Network facts of the host, shared by all calls of a same job.
+
+    Service IPs are computed once per network range and address number, and
+    the host interfaces are listed at most once, instead of once per template
+    asking for an IP or an MTU.
+    """
+
+    def __init__(self):
+        self._service_ips = {}
+        self._addresses = None
+        self._mtus = {}
+
+    def service_ip(self, cidr, n):
+        """Return the nth usable host of the `cidr` range, None if none."""
+        key = (cidr, n)
+        if key not in self._service_ips:
+            network = ipaddress.IPv4Network(cidr)
+            # NOTE: The usable hosts are all the IP addresses that belong to
+            # the network, except the network address itself and the network
+            # broadcast address, so the nth one is an offset from the first.
+            if n + 2 < network.num_addresses:
+                self._service_ips[key] = str(network.network_address + 1 + n)
+            else:
+                self._service_ips[key] = None
+        return self._service_ips[key]
+
+    @property
+    def addresses(self):
+        """IPv4 addresses of the host, with the name of their interface."""
+        if self._addresses is None:
+            self._addresses = []
+            for ifname, iface in __salt__['network.interfaces']().items():
+                inets = iface.get('inet', []) + [
+                    secondary for secondary in iface.get('secondary', [])
+                    if secondary.get('type') == 'inet'
+                ]
+                for inet in inets:
+                    self._addresses.append((
+                        ipaddress.ip_address(inet['address']),
+                        inet.get('label', ifname),
+                    ))
+        return self._addresses
+
+    def ip_addrs(self, cidr):
+        """Return the (sorted) non-loopback IPs of the host in `cidr`."""
+        network = ipaddress.ip_network(cidr, strict=False)
+        return [
+            str(address) for address in sorted(set(
+                address for address, _ in self.addresses
+                if not address.is_loopback and address in network
+            ))
+        ]
+
+    def ifaces(self, ip):
+        """Return the names of the interfaces having the `ip` address."""
+        address = ipaddress.ip_address(ip)
+        return [
+            ifname for iface_address, ifname in self.addresses
+            if iface_address == address
+        ]
+
+    def mtu(self, iface):
+        """Return the MTU of the interface `iface`."""
+        if iface not in self._mtus:
+            self._mtus[iface] = int(__salt__['file.read'](
+                '/sys/class/net/{}/mtu'.format(iface)
+            ))
+        return self._mtus[iface]
+
+
+def _get_facts():
+    """Get the network facts for the current job."""
+    facts = __context__.get('metalk8s_network.facts')
+    if facts is None:
+        facts = __context__['metalk8s_network.facts'] = _NetworkFacts()
+    return facts
+
+
 def _pick_nth_service_ip(n):
     '''
     Pick the nth IP address from a network range, based on pillar
@@ -31,21 +109,14 @@ def _pick_nth_service_ip(n):
             'Pillar key "networks:service" must be set.'
         )
 
-    network = ipaddress.IPv4Network(cidr)
-    # NOTE: hosts() method below returns usable hosts in a network.
-    # The usable hosts are all the IP addresses that belong to the network,
-    # except the network address itself and the network broadcast address.
-    ip = next(
-        itertools.islice(network.hosts(), n, None),
-        None
-    )
+    ip = _get_facts().service_ip(cidr, n)
     if ip is None:
         raise CommandExecutionError(
             'Could not obtain an IP in the network range {}'.format(
                 cidr
             )
         )
-    return str(ip)
+    return ip
 
 
 def get_kubernetes_service_ip():
@@ -88,10 +159,11 @@ def get_ip_from_cidrs(cidrs, current_ip=None):
     A current_ip can be given so that if the current_ip is already part of
     one cidr we keep this IP (otherwise we return the first one)
     '''
+    facts = _get_facts()
     first_ip = None
 
     for cidr in cidrs:
-        ip_addrs = __salt__["network.ip_addrs"](cidr=cidr)
+        ip_addrs = facts.ip_addrs(cidr)
         if current_ip and current_ip in ip_addrs:
             # Current IP still valid, return it
             return current_ip
@@ -112,7 +184,8 @@ def get_mtu_from_ip(ip):
     '''
     Return the MTU of the first interface with the specified IP
     '''
-    ifaces = __salt__['network.ifacestartswith'](ip)
+    facts = _get_facts()
+    ifaces = facts.ifaces(ip)
 
     if not ifaces:
         raise CommandExecutionError(
@@ -128,4 +201,4 @@ def get_mtu_from_ip(ip):
             iface, ', '.join(ifaces)
         )
 
-    return int(__salt__['file.read']('/sys/class/net/{}/mtu'.format(iface)))
+    return facts.mtu(iface)
@@ -2,16 +2,34 @@
 Describes our custom way to deal with yum packages
 so that we can support downgrade in metalk8s
 '''
+import bz2
+import glob
+import hashlib
 import logging
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import xml.etree.ElementTree
 
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
 from salt.exceptions import CommandExecutionError
+import salt.cache
+import salt.utils.files
 
 log = logging.getLogger(__name__)
 
 
 __virtualname__ = 'metalk8s_package_manager'
 
+YUM_CACHE_DIR = '/var/cache/yum'
+REPOMD_NAMESPACE = '{http://linux.duke.edu/metadata/repo}'
+REPOQUERY_CACHE_BANK = 'metalk8s/package_manager/repoquery'
+DEPENDENTS_CACHE_BANK = 'metalk8s/package_manager/dependents'
+# Repositories configured by MetalK8s (see `repo:repositories` in
+# `metalk8s/map.jinja`), considered when building the dependents graph
+METALK8S_REPOS = 'metalk8s-*'
+
 
 def __virtual__():
     if __grains__['os_family'] == 'RedHat':
@@ -19,21 +37,229 @@ def __virtual__():
     return False
 
 
-def _list_dependents(
-    name, version, fromrepo=None, allowed_versions=None
-):
-    '''List and filter all packages requiring package `{name}-{version}`.
+def _repomd_paths(fromrepo=None):
+    '''List the cached `repomd.xml` of `fromrepo` repositories.
 
-    Filter based on the `allowed_versions` provided, within the provided
-    `fromrepo` repositories.
+    All the repositories are considered if `fromrepo` is not provided.
     '''
-    log.info(
-        'Listing packages depending on "%s" with version "%s"',
-        str(name),
-        str(version)
+    repos = fromrepo.split(',') if fromrepo else ['*']
+    return sorted(set(
+        path
+        for repo in repos
+        for path in glob.glob(
+            os.path.join(YUM_CACHE_DIR, '*', '*', repo, 'repomd.xml')
+        )
+    ))
+
+
+def _repo_metadata_checksum(fromrepo=None):
+    '''Compute a checksum of the cached metadata of `fromrepo` repositories.
+
+    All the repositories are considered if `fromrepo` is not provided.
+    Return None if no metadata is cached.
+    '''
+    paths = _repomd_paths(fromrepo)
+    if not paths:
+        return None
+
+    hasher = hashlib.sha256()
+    for path in paths:
+        hasher.update(path.encode('utf-8'))
+        with salt.utils.files.fopen(path, 'rb') as fd:
+            hasher.update(fd.read())
+    return hasher.hexdigest()
+
+
+def _primary_db_path(repomd_path):
+    '''Return the path of the cached primary database of a repository.
+
+    Return None if the repository metadata does not reference one, or if it
+    is not cached.
+    '''
+    root = xml.etree.ElementTree.parse(repomd_path).getroot()
+    for data in root.findall(REPOMD_NAMESPACE + 'data'):
+        if data.get('type') == 'primary_db':
+            location = data.find(REPOMD_NAMESPACE + 'location').get('href')
+            path = os.path.join(
+                os.path.dirname(repomd_path), os.path.basename(location)
+            )
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def _read_primary_db(path):
+    '''Read the packages, their provides and requires from a primary database.
+
+    Packages are identified by `<name> <version>-<release>`, and capabilities
+    (provides and requires) are returned as a list of `(name, package)`.
+    '''
+    with tempfile.NamedTemporaryFile(suffix='.sqlite') as database:
+        opener = bz2.open if path.endswith('.bz2') else salt.utils.files.fopen
+        with opener(path, 'rb') as compressed:
+            shutil.copyfileobj(compressed, database)
+        database.flush()
+
+        with closing(sqlite3.connect(database.name)) as connection:
+            packages = {
+                key: '{} {}-{}'.format(name, version, release)
+                for key, name, version, release in connection.execute(
+                    'SELECT pkgKey, name, version, release FROM packages'
+                )
+            }
+            provides = [
+                (capability, packages[key])
+                for capability, key in connection.execute(
+                    'SELECT name, pkgKey FROM provides '
+                    'UNION SELECT name, pkgKey FROM files'
+                )
+            ]
+            requires = [
+                (capability, packages[key])
+                for capability, key in connection.execute(
+                    'SELECT name, pkgKey FROM requires'
+                )
+            ]
+
+    return provides, requires
+
+
+def _build_dependents_graph(primary_dbs):
+    '''Build the reverse dependencies graph of packages.
+
+    Return a dict of `<name> <version>-<release>` to the list of packages
+    requiring it (directly). Requirements are matched on the capabilities
+    names only, regardless of the version constraints.
+    '''
+    providers = {}
+    requirements = []
+    for path in primary_dbs:
+        provides, requires = _read_primary_db(path)
+        for capability, package in provides:
+            providers.setdefault(capability, set()).add(package)
+        requirements.extend(requires)
+
+    graph = {}
+    for capability, requirer in requirements:
+        for provider in providers.get(capability, ()):
+            if provider != requirer:
+                graph.setdefault(provider, set()).add(requirer)
+
+    return {package: sorted(graph[package]) for package in graph}
+
+
+def _get_dependents_graph(fromrepo=None):
+    '''Return the reverse dependencies graph of `fromrepo` repositories.
+
+    Only the MetalK8s repositories are considered if `fromrepo` is not
+    provided, as other repositories (base, updates...) are large and
+    refreshed often.
+    The graph is built once per revision of the repositories metadata, then
+    kept in the minion cache. Repositories without a cached primary database
+    are ignored.
+    Return None if no primary database is cached.
+    '''
+    fromrepo = fromrepo or METALK8S_REPOS
+    try:
+        primary_dbs = [
+            _primary_db_path(path) for path in _repomd_paths(fromrepo)
+        ]
+    except (OSError, xml.etree.ElementTree.ParseError) as exc:
+        log.warning('Unable to read repositories metadata: %s', exc)
+        return None
+
+    if None in primary_dbs:
+        log.debug(
+            'Ignoring repositories without cached primary database in "%s"',
+            fromrepo
+        )
+    primary_dbs = [path for path in primary_dbs if path is not None]
+    if not primary_dbs:
+        return None
+
+    checksum = _repo_metadata_checksum(fromrepo)
+    graphs = __context__.setdefault(
+        'metalk8s_package_manager.dependents_graphs', {}
     )
+    entry = graphs.get(fromrepo)
+
+    if not entry or entry['checksum'] != checksum:
+        cache = salt.cache.factory(__opts__)
+        entry = cache.fetch(DEPENDENTS_CACHE_BANK, fromrepo)
+        if not entry or entry.get('checksum') != checksum:
+            log.info(
+                'Building the dependents graph of "%s" repositories',
+                fromrepo
+            )
+            try:
+                graph = _build_dependents_graph(primary_dbs)
+            except (OSError, sqlite3.Error) as exc:
+                log.warning(
+                    'Unable to read repositories primary databases: %s', exc
+                )
+                return None
+            entry = {'checksum': checksum, 'graph': graph}
+            cache.store(DEPENDENTS_CACHE_BANK, fromrepo, entry)
+        graphs[fromrepo] = entry
+
+    return entry['graph']
 
-    allowed_versions = allowed_versions or {}
+
+def _query_dependents(graph, name, version):
+    '''List packages requiring `{name}-{version}` (recursively) in `graph`.
+
+    Return a list of `[name, version]`.
+    '''
+    prefix = '{} '.format(name)
+    stack = [
+        package for package in graph
+        if package.startswith(prefix) and (
+            package[len(prefix):] == version
+            or package[len(prefix):].startswith('{}-'.format(version))
+        )
+    ]
+    seen = set(stack)
+    dependents = []
+
+    while stack:
+        for requirer in graph.get(stack.pop(), []):
+            if requirer not in seen:
+                seen.add(requirer)
+                stack.append(requirer)
+                dependents.append(requirer.split(' ', 1))
+
+    return sorted(dependents)
+
+
+def _repoquery_whatrequires(name, version, fromrepo=None):
+    '''List all packages requiring package `{name}-{version}`.
+
+    Dependents are looked up in the dependents graph of the `fromrepo`
+    repositories if their metadata is cached, or with `repoquery` otherwise.
+    Note the dependents graph matches requirements on capabilities names,
+    regardless of their version constraints: dependents are then filtered
+    on the `allowed_versions` (see `_list_dependents`).
+    Such results are cached on the minion for the current metadata of the
+    `fromrepo` repositories, as resolving them takes seconds.
+    Return a list of `[name, version]` or None on error.
+    '''
+    graph = _get_dependents_graph(fromrepo)
+    if graph is not None:
+        return _query_dependents(graph, name, version)
+
+    checksum = _repo_metadata_checksum(fromrepo)
+    cache_key = '{}-{}'.format(name, version)
+    cache_entry = {'checksum': checksum, 'fromrepo': fromrepo}
+    cache = None
+
+    if checksum is not None:
+        cache = salt.cache.factory(__opts__)
+        cached = cache.fetch(REPOQUERY_CACHE_BANK, cache_key)
+        if cached and all(
+            cached.get(key) == value for key, value in cache_entry.items()
+        ):
+            log.debug('Using cached packages requiring "%s"', cache_key)
+            return cached['packages']
 
     command = [
         'repoquery', '--whatrequires', '--recursive',
@@ -54,10 +280,41 @@ def _list_dependents(
         )
         return None
 
-    dependents = {}
-    for line in ret['stdout'].splitlines():
-        req_name, req_version = line.strip().split()
+    packages = [
+        line.strip().split()
+        for line in ret['stdout'].splitlines()
+        if line.strip()
+    ]
+
+    if cache is not None:
+        cache_entry['packages'] = packages
+        cache.store(REPOQUERY_CACHE_BANK, cache_key, cache_entry)
 
+    return packages
+
+
+def _list_dependents(
+    name, version, fromrepo=None, allowed_versions=None
+):
+    '''List and filter all packages requiring package `{name}-{version}`.
+
+    Filter based on the `allowed_versions` provided, within the provided
+    `fromrepo` repositories.
+    '''
+    log.info(
+        'Listing packages depending on "%s" with version "%s"',
+        str(name),
+        str(version)
+    )
+
+    allowed_versions = allowed_versions or {}
+
+    packages = _repoquery_whatrequires(name, version, fromrepo=fromrepo)
+    if packages is None:
+        return None
+
+    dependents = {}
+    for req_name, req_version in packages:
         # NOTE: The following test filters out unknown packages and versions
         #       not referenced in `allowed_versions` (there can be only one)
         if req_version == allowed_versions.get(req_name):
@@ -136,19 +393,22 @@ def list_pkg_dependents(
 
     all_pkgs.update(dependents)
 
-    for pkg_name in list(all_pkgs):
-        ret = __salt__['cmd.run_all'](['rpm', '-qa', pkg_name])
+    # Check which packages are installed at once
+    ret = __salt__['cmd.run_all'](
+        ['rpm', '-qa', '--queryformat', '%{NAME}\\n'] + list(all_pkgs)
+    )
 
-        if ret['retcode'] != 0:
-            log.error(
-                'Failed to check if package "%s" is installed: %s',
-                pkg_name,
-                ret['stderr'] or ret['stdout']
-            )
-            return None
+    if ret['retcode'] != 0:
+        log.error(
+            'Failed to check if packages "%s" are installed: %s',
+            '", "'.join(all_pkgs),
+            ret['stderr'] or ret['stdout']
+        )
+        return None
 
-        is_installed = bool(ret['stdout'].strip())
-        if not is_installed and pkg_name != name:
+    installed = set(ret['stdout'].split())
+    for pkg_name in list(all_pkgs):
+        if pkg_name not in installed and pkg_name != name:
             # Any package requiring the target `name` that is not yet installed
             # should not be installed
             del all_pkgs[pkg_name]
@@ -164,16 +424,34 @@ def check_pkg_availability(pkgs_info):
         Value of pillar key `repo:packages` to consider for the requiring
         packages to check (format {"<name>": {"version": "<version>"}, ...})
     '''
+    pkg_names = []
     for name, info in pkgs_info.items():
         pkg_name = name
         if info.get('version'):
             pkg_name += '-' + str(info['version'])
+        pkg_names.append(pkg_name)
+
+    if not pkg_names:
+        return
+
+    def _test_install(names):
+        return __salt__['cmd.run_all'](
+            ['yum', 'install'] + names + [
+                '--setopt', 'tsflags=test',
+                '--setopt', 'skip_missing_names_on_install=False',
+                '--assumeyes',
+                '--disableplugin=versionlock'
+            ]
+        )
+
+    # Check all the packages in a single transaction, only checking them one
+    # by one (to report which one is not available) if it fails
+    batch_ret = _test_install(pkg_names)
+    if batch_ret['retcode'] == 0:
+        return
 
-        ret = __salt__['cmd.run_all']([
-            'yum', 'install', pkg_name,
-            '--setopt', 'tsflags=test', '--assumeyes',
-            '--disableplugin=versionlock'
-        ])
+    for pkg_name in pkg_names:
+        ret = _test_install([pkg_name])
 
         if ret['retcode'] != 0:
             raise CommandExecutionError(
@@ -182,3 +460,10 @@ def check_pkg_availability(pkgs_info):
                     ret['stdout']
                 )
             )
+
+    # Each package is available on its own, but not all together
+    raise CommandExecutionError(
+        'Check availability of packages {} failed: {}'.format(
+            ', '.join(pkg_names), batch_ret['stdout']
+        )
+    )
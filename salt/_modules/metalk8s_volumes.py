@@ -2,6 +2,8 @@
 '''Metalk8s volumes module.'''
 
 import abc
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
 import errno
 import fcntl
@@ -12,6 +14,7 @@ import re
 import operator
 import os
 import six
+import threading
 import time
 
 import logging
@@ -22,6 +25,10 @@ from salt.exceptions import CommandExecutionError
 log = logging.getLogger(__name__)
 
 
+# Maximum number of physical devices prepared at once by `prepare_many`.
+PREPARE_WORKERS = 8
+
+
 __virtualname__ = 'metalk8s_volumes'
 
 
@@ -95,6 +102,55 @@ def prepare(name):
     _get_volume(name).prepare()
 
 
+def prepare_many(names, workers=PREPARE_WORKERS):
+    """Create and prepare the given volumes concurrently.
+
+    Volumes backed by the same physical device (e.g. partitions of a same
+    disk, or sparse files stored on this disk) are handled one after the
+    other, while volumes on different devices are handled in parallel (at
+    most `workers` devices at once).
+
+    Args:
+        names (list): volume names
+        workers (int): maximum number of devices to prepare concurrently
+
+    Returns:
+        dict: for each volume, whether its backing storage was `created`
+              and/or `prepared`, and if it `succeeded` (with an error
+              `comment` otherwise)
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '<NODE_NAME>' metalk8s_volumes.prepare_many '[vol-1, vol-2]'
+    """
+    results = {}
+    devices = collections.OrderedDict()
+    for name in names:
+        try:
+            volume = _get_volume(name)
+            device = volume.physical_device
+        except Exception as exn:
+            results[name] = _prepare_result(comment=str(exn))
+        else:
+            devices.setdefault(device, []).append((name, volume))
+
+    def _prepare_device(volumes):
+        return [(name, _prepare_volume(volume)) for name, volume in volumes]
+
+    if devices:
+        with ThreadPoolExecutor(
+            max_workers=min(workers, len(devices))
+        ) as executor:
+            for device_results in executor.map(
+                _prepare_device, devices.values()
+            ):
+                results.update(device_results)
+
+    return results
+
+
 def is_cleaned_up(name):
     """Check if the backing storage device for the given volume is cleaned up.
 
@@ -224,6 +280,14 @@ class Volume():
     def uuid(self):
         return self.get('metadata.uid').lower()
 
+    @property
+    def physical_device(self):
+        """Identifier of the underlying physical device.
+
+        Volumes sharing a physical device are never prepared concurrently.
+        """
+        return self.path
+
     @property
     def persistent_path(self):
         """Return a persistent path to the backing device."""
@@ -241,7 +305,9 @@ class Volume():
         """
         # Check that the backing device is not already formatted.
         # Bail out if it is: we don't want data loss because of a typo…
-        device_info = _get_from_blkid(self.path)
+        # Never trust a cached result here, the device may have been formatted
+        # since then.
+        device_info = _get_from_blkid(self.path, refresh=True)
         if device_info.fstype:
             raise Exception(
                 'backing device `{}` already formatted'.format(self.path)
@@ -300,6 +366,17 @@ class SparseLoopDevice(Volume):
                 self.path, exn
             ))
 
+    @property
+    def physical_device(self):
+        # All the sparse files are stored on the disk holding their directory.
+        directory = os.path.dirname(self.path)
+        try:
+            dev = os.stat(directory).st_dev
+        except OSError:
+            return directory
+        sys_path = '/sys/dev/block/{}:{}'.format(os.major(dev), os.minor(dev))
+        return _disk_name(os.path.basename(os.path.realpath(sys_path)))
+
     def prepare(self, force=False):
         # We format a "normal" file, not a block device: we need force=True.
         super(SparseLoopDevice, self).prepare(force=True)
@@ -357,6 +434,10 @@ class RawBlockDevice(Volume):
     def path(self):
         return self.get('spec.rawBlockDevice.devicePath')
 
+    @property
+    def physical_device(self):
+        return _disk_name(_device_name(self.path))
+
     def prepare(self, force=False):
         # We format an entire device, not just a partition: we need force=True.
         super(RawBlockDevice, self).prepare(force=True)
@@ -368,6 +449,13 @@ class RawBlockDevice(Volume):
     def clean_up(self):
         return  # Nothing to do
 
+    @staticmethod
+    def _get_partition(device_name):
+        part_re = r'(?:(?:h|s|v|xv)d[a-z]|nvme\d+n\d+p)(?P<partition>\d+)$'
+        match = re.search(part_re, device_name)
+        return match.groupdict()['partition'] if match else None
+
+
 class RawBlockDeviceBlock(RawBlockDevice):
     def __init__(self, volume):
         super(RawBlockDeviceBlock, self).__init__(volume)
@@ -430,18 +518,7 @@ class RawBlockDeviceBlock(RawBlockDevice):
 
         If the backing storage device is not an LVM volume, return None.
         """
-        name = _device_name(self.path)
-        for symlink in glob.glob('/dev/disk/by-id/dm-uuid-LVM-*'):
-            realpath = os.path.realpath(symlink)
-            if os.path.basename(realpath) == name:
-                return symlink
-        return None
-
-    @staticmethod
-    def _get_partition(device_name):
-        part_re = r'(?:(?:h|s|v|xv)d[a-z]|nvme\d+n\d+p)(?P<partition>\d+)$'
-        match = re.search(part_re, device_name)
-        return match.groupdict()['partition'] if match else None
+        return _get_inventory().lvm_path(_device_name(self.path))
 
 
 class DeviceType:
@@ -473,12 +550,117 @@ def _get_volume(name):
         raise ValueError('unsupported Volume type for Volume {}'.format(name))
 
 
+class _DeviceInventory(object):
+    """Inventory of the block devices, shared by all calls of a same job.
+
+    Device names, LVM volumes and blkid results are looked up at most once
+    per device, instead of once per volume and per query.
+    The inventory is dropped after running any command (which may format or
+    partition a device) and when udev updates the `/dev/disk` symlinks.
+    """
+    LINK_DIRS = (
+        '/dev/disk/by-id', '/dev/disk/by-uuid', '/dev/disk/by-partuuid',
+    )
+
+    def __init__(self):
+        self.stamp = self.get_stamp()
+        self._names = {}
+        self._lvm_paths = None
+        self._blkid = {}
+
+    @classmethod
+    def get_stamp(cls):
+        """Modification times of the udev symlinks directories."""
+        stamp = []
+        for directory in cls.LINK_DIRS:
+            try:
+                stamp.append(os.stat(directory).st_mtime)
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def device_name(self, path):
+        """Return the device name from the path, raise on error."""
+        if path not in self._names:
+            res = device_name(path)
+            if not res['success']:
+                raise CommandExecutionError(message=res['result'])
+            self._names[path] = res['result']
+        return self._names[path]
+
+    def lvm_path(self, name):
+        """Return the persistent path of the LVM volume `name`, if any."""
+        if self._lvm_paths is None:
+            # Only publish the mapping once complete, the inventory is shared
+            # by the threads of `prepare_many`
+            lvm_paths = {}
+            for symlink in glob.glob('/dev/disk/by-id/dm-uuid-LVM-*'):
+                realpath = os.path.basename(os.path.realpath(symlink))
+                lvm_paths.setdefault(realpath, symlink)
+            self._lvm_paths = lvm_paths
+        return self._lvm_paths.get(name)
+
+    def blkid(self, path, refresh=False):
+        if refresh or path not in self._blkid:
+            self._blkid[path] = _probe_blkid(path)
+        return self._blkid[path]
+
+
+# The inventory is used from the threads of `prepare_many`.
+_INVENTORY_LOCK = threading.Lock()
+
+
+def _get_inventory():
+    """Get the device inventory for the current job, refreshed if needed."""
+    with _INVENTORY_LOCK:
+        inventory = __context__.get('metalk8s_volumes.inventory')
+        if inventory is None or inventory.stamp != inventory.get_stamp():
+            inventory = __context__['metalk8s_volumes.inventory'] = \
+                _DeviceInventory()
+        return inventory
+
+
+def _invalidate_inventory():
+    with _INVENTORY_LOCK:
+        __context__.pop('metalk8s_volumes.inventory', None)
+
+
 def _device_name(path):
     """Return the device name from the path, raise on error."""
-    res = device_name(path)
-    if res['success']:
-        return res['result']
-    raise CommandExecutionError(message=res['result'])
+    return _get_inventory().device_name(path)
+
+
+def _disk_name(name):
+    """Return the name of the disk holding the device `name`."""
+    partition = RawBlockDevice._get_partition(name)
+    if partition is None:
+        return name
+    # Drop partition number, and the `p` separator for NVMe devices.
+    return re.sub(r'(?<=\d)p$', '', name[:-len(partition)])
+
+
+def _prepare_result(created=False, prepared=False, comment=''):
+    return {
+        'succeeded': not comment,
+        'created': created,
+        'prepared': prepared,
+        'comment': comment,
+    }
+
+
+def _prepare_volume(volume):
+    """Create and prepare a volume, if needed (used by `prepare_many`)."""
+    created = prepared = False
+    try:
+        if not volume.exists:
+            volume.create()
+            created = True
+        if not volume.is_prepared:
+            volume.prepare()
+            prepared = True
+    except Exception as exn:  # pylint: disable=broad-except
+        return _prepare_result(created, prepared, str(exn) or repr(exn))
+    return _prepare_result(created, prepared)
 
 
 def _run_cmd(cmd):
@@ -492,7 +674,11 @@ def _run_cmd(cmd):
     Returns:
         dict: the command result (stderr, stdout, retcode, …)
     """
-    ret = __salt__['cmd.run_all'](cmd)
+    try:
+        ret = __salt__['cmd.run_all'](cmd)
+    finally:
+        # Devices may have been formatted or partitioned.
+        _invalidate_inventory()
     if ret.get('retcode', 0) != 0:
         raise CommandExecutionError(
             'error while trying to run `{0}`: {1}' .format(cmd, ret['stderr'])
@@ -559,7 +745,11 @@ def _open_fd(*args, **kwargs):
 #     returns "devtmpfs       devtmpfs   1932084     0   1932084   0% /dev"
 #
 # So yeah, let's not rely on this…
-def _get_from_blkid(path):
+def _get_from_blkid(path, refresh=False):
+    return _get_inventory().blkid(path, refresh=refresh)
+
+
+def _probe_blkid(path):
     flags = __utils__['metalk8s_volumes.get_superblock_flags']('UUID', 'TYPE')
     kwargs = {
         'use_superblocks': True, 'superblocks_flags': flags,
@@ -1,4 +1,23 @@
-"""Store data about bootstrap services ip/port in pillar"""
+"""Store data about bootstrap services ip/port in pillar
+
+Endpoints are read from watch-driven caches shared by all pillar compilations
+in the process (see `metalk8s_kubernetes.get_informer`), one per service (so
+that other Endpoints, e.g. the frequently updated leader election ones, are
+not watched), rather than retrieved from the API server for every minion.
+Their staleness is bounded by the `max_staleness` option (in seconds), and
+the services to expose can be selected per namespace:
+
+.. code-block:: yaml
+
+    ext_pillar:
+      - metalk8s_endpoints:
+          kubeconfig: /etc/kubernetes/admin.conf
+          services:
+            kube-system:
+              - salt-master
+              - repositories
+          max_staleness: 30
+"""
 
 import logging
 import os.path
@@ -9,18 +28,37 @@ log = logging.getLogger(__name__)
 
 __virtualname__ = 'metalk8s_endpoints'
 
+SERVICES = {
+    "kube-system": ['salt-master', 'repositories'],
+}
+MAX_STALENESS = 60
+
 
 def __virtual__():
-    if 'metalk8s_kubernetes.get_object' not in __salt__:
+    if 'metalk8s_kubernetes.get_service_endpoints' not in __salt__:
         return False, 'Missing metalk8s_kubernetes module'
+    if 'metalk8s_kubernetes.get_informer' not in __utils__:
+        return False, 'Missing metalk8s_kubernetes utils module'
     else:
         return __virtualname__
 
 
-def ext_pillar(minion_id, pillar, kubeconfig):
-    services = {
-        "kube-system": ['salt-master', 'repositories'],
-    }
+def _endpoints_informer(service, namespace, kubeconfig, max_staleness):
+    return __utils__['metalk8s_kubernetes.get_informer'](
+        kind='Endpoints',
+        apiVersion='v1',
+        kubeconfig=kubeconfig,
+        field_selector='metadata.namespace={},metadata.name={}'.format(
+            namespace, service
+        ),
+        max_staleness=max_staleness,
+    )
+
+
+def ext_pillar(minion_id, pillar, kubeconfig, services=None,
+               max_staleness=MAX_STALENESS):
+    if services is None:
+        services = SERVICES
 
     if not os.path.isfile(kubeconfig):
         error_tplt = '{}: kubeconfig not found at {}'
@@ -31,12 +69,16 @@ def ext_pillar(minion_id, pillar, kubeconfig):
     else:
         endpoints = {}
 
-        for namespace, services in services.items():
-            for service in services:
+        # Lookups only hit the API server when a cache is (re)filled
+        for namespace, names in services.items():
+            for service in names:
                 try:
                     service_endpoints = \
                         __salt__['metalk8s_kubernetes.get_service_endpoints'](
-                            service, namespace, kubeconfig
+                            service, namespace, kubeconfig,
+                            informer=_endpoints_informer(
+                                service, namespace, kubeconfig, max_staleness
+                            ),
                         )
                 except CommandExecutionError as exc:
                     service_endpoints = \
@@ -1,3 +1,17 @@
+"""Store data about MetalK8s Nodes and their Volumes in pillar.
+
+Objects are read from watch-driven caches shared by all pillar compilations
+in the process (see `metalk8s_kubernetes.get_informer`), rather than listed
+from the API server for every minion.
+Their staleness is bounded by the `max_staleness` option (in seconds):
+
+.. code-block:: yaml
+
+    ext_pillar:
+      - metalk8s_nodes:
+          kubeconfig: /etc/kubernetes/admin.conf
+          max_staleness: 30
+"""
 import os.path
 import logging
 
@@ -6,6 +20,7 @@ from salt.exceptions import CommandExecutionError
 
 VERSION_LABEL = 'metalk8s.scality.com/version'
 ROLE_LABEL_PREFIX = 'node-role.kubernetes.io/'
+MAX_STALENESS = 60
 
 
 log = logging.getLogger(__name__)
@@ -14,12 +29,22 @@ __virtualname__ = 'metalk8s_nodes'
 
 
 def __virtual__():
-    if 'metalk8s_kubernetes.get_object' not in __salt__:
-        return False, 'Missing metalk8s_kubernetes module'
+    if 'metalk8s_kubernetes.get_informer' not in __utils__:
+        return False, 'Missing metalk8s_kubernetes utils module'
     else:
         return __virtualname__
 
 
+def _informer(kind, apiVersion, kubeconfig=None,
+              max_staleness=MAX_STALENESS):
+    return __utils__['metalk8s_kubernetes.get_informer'](
+        kind=kind,
+        apiVersion=apiVersion,
+        kubeconfig=kubeconfig,
+        max_staleness=max_staleness,
+    )
+
+
 def node_info(node, ca_minion):
     result = {
         'roles': [],
@@ -45,18 +70,22 @@ def node_info(node, ca_minion):
     return result
 
 
-def get_cluster_version(kubeconfig=None):
+def get_cluster_version(kubeconfig=None, max_staleness=MAX_STALENESS):
     try:
-        namespace = __salt__['metalk8s_kubernetes.get_object'](
-            name="kube-system",
+        namespace = _informer(
             kind="Namespace",
             apiVersion="v1",
-            kubeconfig=kubeconfig
-        )
+            kubeconfig=kubeconfig,
+            max_staleness=max_staleness,
+        ).get("kube-system")
     except CommandExecutionError as exc:
         return __utils__['pillar_utils.errors_to_dict'](
             'Unable to read namespace information {}'.format(exc)
         )
+    if namespace is None:
+        return __utils__['pillar_utils.errors_to_dict'](
+            'Unable to read namespace information: kube-system not found'
+        )
     annotations = namespace['metadata']['annotations']
     annotation_key = 'metalk8s.scality.com/cluster-version'
     if not annotations or annotation_key not in annotations:
@@ -73,13 +102,14 @@ def iso_timestamp_converter(timestamp):
     return timestamp.isoformat()
 
 
-def get_storage_classes(kubeconfig=None):
+def get_storage_classes(kubeconfig=None, max_staleness=MAX_STALENESS):
     storage_classes = {}
-    storageclass_list = __salt__['metalk8s_kubernetes.list_objects'](
+    storageclass_list = _informer(
         kind='StorageClass',
         apiVersion='storage.k8s.io/v1',
-        kubeconfig=kubeconfig
-    )
+        kubeconfig=kubeconfig,
+        max_staleness=max_staleness,
+    ).list()
     for storageclass in storageclass_list:
         # Need to convert the datetime object in storageclass to ISO format in
         # order to make them serializable.
@@ -94,30 +124,29 @@ def get_storage_classes(kubeconfig=None):
     return storage_classes
 
 
-def list_volumes(minion_id, kubeconfig=None):
+def list_volumes(minion_id, kubeconfig=None, max_staleness=MAX_STALENESS):
     try:
-        storage_classes = get_storage_classes(kubeconfig=kubeconfig)
+        storage_classes = get_storage_classes(
+            kubeconfig=kubeconfig, max_staleness=max_staleness
+        )
     except CommandExecutionError as exc:
         return __utils__['pillar_utils.errors_to_dict']([
             'Unable to retrieve list of storage class: {}'.format(exc)
         ])
 
     try:
-        volumes = __salt__['metalk8s_kubernetes.list_objects'](
+        local_volumes = _informer(
             kind='Volume',
             apiVersion='storage.metalk8s.scality.com/v1alpha1',
-            kubeconfig=kubeconfig
-        )
+            kubeconfig=kubeconfig,
+            max_staleness=max_staleness,
+        ).by_index('spec:nodeName', minion_id)
     except CommandExecutionError as exc:
         return __utils__['pillar_utils.errors_to_dict']([
             'Unable to retrieve list of Volumes: {}'.format(exc)
         ])
 
     results = {}
-    local_volumes = (
-        volume for volume in volumes
-        if volume['spec']['nodeName'] == minion_id
-    )
     for volume in local_volumes:
         name = volume['metadata']['name']
         storageclass = storage_classes.get(
@@ -131,7 +160,7 @@ def list_volumes(minion_id, kubeconfig=None):
     return results
 
 
-def ext_pillar(minion_id, pillar, kubeconfig):
+def ext_pillar(minion_id, pillar, kubeconfig, max_staleness=MAX_STALENESS):
     if not os.path.isfile(kubeconfig):
         error_tplt = '{}: kubeconfig not found at {}'
         pillar_nodes = __utils__['pillar_utils.errors_to_dict']([
@@ -147,11 +176,12 @@ def ext_pillar(minion_id, pillar, kubeconfig):
                 ca_minion = pillar['metalk8s']['ca'].get('minion', None)
 
         try:
-            node_list = __salt__['metalk8s_kubernetes.list_objects'](
+            node_list = _informer(
                 kind='Node',
                 apiVersion='v1',
-                kubeconfig=kubeconfig
-            )
+                kubeconfig=kubeconfig,
+                max_staleness=max_staleness,
+            ).list()
         except CommandExecutionError as exc:
             log.exception(
                 "Failed to retrieve nodes for ext_pillar", exc_info=exc
@@ -166,8 +196,12 @@ def ext_pillar(minion_id, pillar, kubeconfig):
                 for node in node_list
             )
 
-        cluster_version = get_cluster_version(kubeconfig=kubeconfig)
-        volume_information = list_volumes(minion_id, kubeconfig=kubeconfig)
+        cluster_version = get_cluster_version(
+            kubeconfig=kubeconfig, max_staleness=max_staleness
+        )
+        volume_information = list_volumes(
+            minion_id, kubeconfig=kubeconfig, max_staleness=max_staleness
+        )
 
     result = {
         'metalk8s': {
@@ -1,10 +1,32 @@
+"""Store data about Solutions in pillar.
+
+Listing available Solutions requires a remote execution on the Bootstrap
+minion, its result is thus cached on the master (shared by all pillar
+compilations) for `cache_ttl` seconds, as long as the configured archives
+do not change:
+
+.. code-block:: yaml
+
+    ext_pillar:
+      - metalk8s_solutions:
+          cache_ttl: 300
+
+The cache is flushed when (un)mounting Solutions archives through the
+`metalk8s.orchestrate.solutions.import-components` orchestrate.
+"""
 import logging
+import time
+
+import salt.cache
 from salt.exceptions import CommandExecutionError
 
 log = logging.getLogger(__name__)
 
 __virtualname__ = "metalk8s_solutions"
 
+CACHE_BANK = 'metalk8s/solutions'
+CACHE_TTL = 300
+
 
 def __virtual__():
     if 'metalk8s_solutions.read_config' not in __salt__:
@@ -12,7 +34,46 @@ def __virtual__():
     return __virtualname__
 
 
-def _load_solutions(bootstrap_id):
+def _list_available(bootstrap_id, config, cache_ttl=CACHE_TTL):
+    """List available Solutions from the Bootstrap minion, or the cache.
+
+    Cached results are keyed on the Bootstrap minion ID and the configured
+    archives, since these are the ones mounted on this minion.
+    """
+    cache = salt.cache.factory(__opts__)
+    cache_key = {
+        'bootstrap_id': bootstrap_id,
+        'archives': sorted(config.get('archives') or []),
+    }
+
+    if '_errors' not in config:
+        cached = cache.fetch(CACHE_BANK, 'available')
+        if cached and cached.get('key') == cache_key \
+                and time.time() - cached['timestamp'] < cache_ttl:
+            log.debug('Using cached list of available Solutions')
+            return cached['available']
+
+    available_ret = __salt__['saltutil.cmd'](
+        tgt=bootstrap_id,
+        fun='metalk8s_solutions.list_available',
+    )[bootstrap_id]
+    if available_ret['retcode'] != 0:
+        raise Exception('[{}] {}'.format(
+            available_ret['retcode'],
+            available_ret['ret']
+        ))
+
+    if '_errors' not in config:
+        cache.store(CACHE_BANK, 'available', {
+            'key': cache_key,
+            'timestamp': time.time(),
+            'available': available_ret['ret'],
+        })
+
+    return available_ret['ret']
+
+
+def _load_solutions(bootstrap_id, cache_ttl=CACHE_TTL):
     """Load Solutions from ConfigMap and config file."""
     result = {
         'available': {},
@@ -29,17 +90,9 @@ def _load_solutions(bootstrap_id):
 
     errors = []
     try:
-        available_ret = __salt__['saltutil.cmd'](
-            tgt=bootstrap_id,
-            fun='metalk8s_solutions.list_available',
-        )[bootstrap_id]
-        if available_ret['retcode'] != 0:
-            raise Exception('[{}] {}'.format(
-                available_ret['retcode'],
-                available_ret['ret']
-            ))
-
-        result['available'] = available_ret['ret']
+        result['available'] = _list_available(
+            bootstrap_id, result['config'], cache_ttl=cache_ttl
+        )
     except Exception as exc:
         errors.append(
             "Error when listing available Solutions: {}".format(exc)
@@ -78,7 +131,7 @@ def _load_solutions(bootstrap_id):
     return result
 
 
-def ext_pillar(minion_id, pillar):
+def ext_pillar(minion_id, pillar, cache_ttl=CACHE_TTL):
     # NOTE: this ext_pillar relies on the `metalk8s_nodes` ext_pillar to find
     # the Bootstrap minion ID, for the remote execution of
     # `metalk8s_solutions.list_available`.
@@ -104,4 +157,8 @@ def ext_pillar(minion_id, pillar):
         error_dict = __utils__['pillar_utils.errors_to_dict'](errors)
         return {"metalk8s": {"solutions": error_dict}}
 
-    return {"metalk8s": {'solutions': _load_solutions(bootstrap_id)}}
+    return {
+        "metalk8s": {
+            'solutions': _load_solutions(bootstrap_id, cache_ttl=cache_ttl),
+        },
+    }
@@ -19,16 +19,39 @@ The supported options are:
   salt-master configuration
 - `absent`, a boolean to toggle which state function variant (`object_present`
   or `object_absent`) to use (defaults to False)
+- `batch`, a boolean to render a single `objects_present` state applying all
+  objects with server-side apply, concurrently and in dependency order,
+  instead of one `object_present` state per object (defaults to False,
+  cannot be used with `absent`)
+- `workers`, the maximum number of objects applied concurrently in `batch`
+  mode (defaults to the `objects_present` default)
+- `lazy`, a boolean to keep the objects out of the rendered states (defaults
+  to False): each object is stored, as compact JSON, in a manifest store
+  shared with the state functions for the current run (see
+  `MANIFEST_STORE_KEY`), and states only refer to it, so that the (possibly
+  huge) objects are not copied along with the states data, and only decoded
+  when applied
 """
-import yaml
+import hashlib
+import json
 
+import yaml
 from salt.exceptions import SaltRenderError
 from salt.ext import six
+import salt.utils.data
 from salt.utils.yaml import SaltYamlSafeLoader
 from salt.utils.odict import OrderedDict
 
 __virtualname__ = 'metalk8s_kubernetes'
 
+# Key of the manifest store in `__context__`, which is shared by renderers
+# and states during a run (same key in the `metalk8s_kubernetes` states)
+MANIFEST_STORE_KEY = 'metalk8s_kubernetes.manifests'
+
+
+# Loader used to compose YAML nodes (i.e. to parse) in `lazy` mode
+ComposeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 def __virtual__():
     return __virtualname__
@@ -54,7 +77,36 @@ def _step_name(manifest, absent=False):
     )
 
 
-def _step(manifest, kubeconfig=None, context=None, absent=False):
+def _load_all_lazy(source):
+    """Load YAML documents one at a time, parsing them with libyaml.
+
+    Parsing is the costly part, so nodes are composed by the C loader (if
+    available), then built by `SaltYamlSafeLoader`, to get the exact same
+    objects as in the default mode.
+    """
+    constructor = SaltYamlSafeLoader('')
+    for node in yaml.compose_all(source, Loader=ComposeLoader):
+        yield constructor.construct_document(node)
+
+
+def _store_manifest(manifest):
+    """Store a manifest in the manifest store, and return its reference.
+
+    Manifests are stored as JSON strings, which are far smaller than the
+    corresponding Python objects, and referenced by their digest.
+    """
+    try:
+        content = json.dumps(manifest, separators=(',', ':'))
+    except (TypeError, ValueError) as exc:
+        raise SaltRenderError(
+            'Cannot store {}: {}'.format(_step_name(manifest), exc)
+        )
+    ref = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    __context__.setdefault(MANIFEST_STORE_KEY, {})[ref] = content
+    return ref
+
+
+def _step(manifest, kubeconfig=None, context=None, absent=False, lazy=False):
     """Render a single Kubernetes object into a state 'step'."""
     step_name = _step_name(manifest, absent)
     state_func = 'metalk8s_kubernetes.object_{}'.format(
@@ -64,26 +116,72 @@ def _step(manifest, kubeconfig=None, context=None, absent=False):
         {'name': step_name},
         {'kubeconfig': kubeconfig},
         {'context': context},
-        {'manifest': manifest},
     ]
+    if lazy:
+        state_args.append({'manifest_ref': _store_manifest(manifest)})
+    else:
+        state_args.append({'manifest': manifest})
 
     return step_name, {state_func: state_args}
 
 
+def _batch_step(manifests, sls, kubeconfig=None, context=None, workers=None,
+                lazy=False):
+    """Render all Kubernetes objects into a single batch state 'step'."""
+    objects = []
+    for manifest in manifests:
+        # Validate all manifests at render time, as done in non-batch mode
+        _step_name(manifest)
+        objects.append(_store_manifest(manifest) if lazy else manifest)
+
+    step_name = "Apply {} objects from '{}'".format(len(objects), sls)
+    state_args = [
+        {'name': step_name},
+        {'kubeconfig': kubeconfig},
+        {'context': context},
+        {'manifest_refs' if lazy else 'manifests': objects},
+    ]
+    if workers is not None:
+        state_args.append({'workers': workers})
+
+    return step_name, {'metalk8s_kubernetes.objects_present': state_args}
+
+
 def render(source, saltenv='', sls='', argline='', **kwargs):
     args = six.moves.urllib.parse.parse_qs(argline)
 
     kubeconfig = args.get('kubeconfig', [None])[0]
     context = args.get('context', [None])[0]
     absent = args.get('absent', [False])[0]
+    batch = salt.utils.data.is_true(args.get('batch', [False])[0])
+    workers = args.get('workers', [None])[0]
+    lazy = salt.utils.data.is_true(args.get('lazy', [False])[0])
+
+    if batch and absent:
+        raise SaltRenderError('Cannot use `batch` with `absent`.')
+
+    if lazy:
+        # Objects are parsed one at a time, from the source as is (be it a
+        # string or a file handle)
+        data = _load_all_lazy(source)
+    else:
+        if not isinstance(source, six.string_types):
+            # Assume it is a file handle
+            source = source.read()
 
-    if not isinstance(source, six.string_types):
-        # Assume it is a file handle
-        source = source.read()
+        data = yaml.load_all(source, Loader=SaltYamlSafeLoader)
 
-    data = yaml.load_all(source, Loader=SaltYamlSafeLoader)
+    if batch:
+        return OrderedDict([_batch_step(
+            (manifest for manifest in data if manifest), sls,
+            kubeconfig=kubeconfig, context=context, workers=workers,
+            lazy=lazy,
+        )])
 
     return OrderedDict(
-        _step(manifest, kubeconfig=kubeconfig, context=context, absent=absent)
+        _step(
+            manifest, kubeconfig=kubeconfig, context=context, absent=absent,
+            lazy=lazy,
+        )
         for manifest in data if manifest
     )
@@ -3,6 +3,7 @@ import logging
 import time
 
 import salt.client
+import salt.utils.event
 import salt.utils.extmods
 
 log = logging.getLogger(__name__)
@@ -18,94 +19,246 @@ def sync_auth(saltenv='base', extmod_whitelist=None, extmod_blacklist=None):
     )[0]
 
 
-def wait_minions(tgt='*', retry=10):
-    client = salt.client.get_local_client(__opts__['conf_file'])
+def _publish(client, tgt, fun, arg=(), tgt_type='glob'):
+    '''
+    Publish a job without waiting for its returns, which are read from the
+    event bus.
+
+    Return the job ID and the list of minions expected to return, or `None`
+    if nothing could be published.
+    '''
+    try:
+        pub = client.run_job(tgt, fun, arg=arg, tgt_type=tgt_type)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.exception('Unable to run "%s" on "%s": "%s"', fun, tgt, exc)
+        return None
+
+    if not pub or not pub.get('minions'):
+        return None
+
+    return pub['jid'], pub['minions']
+
+
+def _job_return(tag, data):
+    '''
+    Return the job ID and the minion ID of a job return event, or `None` if
+    the event is not a job return.
+    '''
+    # Tag is "salt/job/<jid>/ret/<minion_id>"
+    parts = tag.split('/', 4)
+    if len(parts) != 5 or parts[:2] != ['salt', 'job'] \
+            or parts[3] != 'ret' or not isinstance(data, dict):
+        return None
 
-    minions = None
+    return parts[2], parts[4]
 
-    def condition_reached(minions):
-        if minions and all(status for status in minions.values()):
-            return True
 
-        # Either `minions` is empty, or not all succeeded
-        return False
+def _minion_start(tag):
+    '''
+    Return the minion ID of a minion start event, or `None` if the event is
+    not a minion start.
+    '''
+    # Tag is "salt/minion/<minion_id>/start"
+    parts = tag.split('/')
+    if len(parts) != 4 or parts[:2] != ['salt', 'minion'] \
+            or parts[3] != 'start':
+        return None
+
+    return parts[2]
 
-    for attempts in range(1, retry):
-        try:
-            minions = client.cmd(tgt, 'test.ping', timeout=2)
-        except Exception as exc:  # pylint: disable=broad-except
-            log.exception('Unable to run "test.ping" on "%s": "%s"', tgt, exc)
-            minions = None
 
-        if condition_reached(minions):
+def _get_events(event, wait):
+    '''
+    Return the events received in the next `wait` seconds (until the first
+    one), along with all the pending ones.
+    '''
+    events = []
+    # NOTE: A `wait` of 0 means waiting forever.
+    ret = event.get_event(
+        wait=max(wait, 0.1), tag='salt/', full=True, auto_reconnect=True
+    )
+    while ret is not None:
+        events.append(ret)
+        ret = event.get_event(
+            tag='salt/', full=True, no_block=True, auto_reconnect=True
+        )
+    return events
+
+
+def _wait_responding(client, event, tgt, tgt_type, timeout, interval):
+    '''
+    Wait for the minions matching `tgt` to respond to `test.ping`.
+
+    Minions are pinged again (only the ones which did not respond yet) when
+    they send a start event, and every `interval` seconds otherwise.
+
+    Return the set of expected minions (`None` if no minion could be
+    targeted) and the set of responding ones.
+    '''
+    deadline = time.time() + timeout
+    next_ping = 0
+    expected = None
+    responding = set()
+    jids = set()
+
+    while expected is None or responding < expected:
+        now = time.time()
+        if now >= deadline:
             break
 
-        log.info(
-            "[Attempt %d/%d] Waiting for minions to respond: %s",
-            attempts,
-            retry,
-            ', '.join(
-                minion
-                for minion, status in (minions or {}).items()
-                if not status
-            )
+        if now >= next_ping:
+            if expected is None:
+                pub = _publish(client, tgt, 'test.ping', tgt_type=tgt_type)
+                if pub:
+                    expected = set(pub[1])
+            else:
+                log.info(
+                    "Waiting for minions to respond: %d/%d ready",
+                    len(responding), len(expected)
+                )
+                pub = _publish(
+                    client, sorted(expected - responding), 'test.ping',
+                    tgt_type='list'
+                )
+            if pub:
+                jids.add(pub[0])
+            next_ping = now + interval
+
+        for ret in _get_events(event, min(next_ping, deadline) - now):
+            job_return = _job_return(ret['tag'], ret['data'])
+            started = _minion_start(ret['tag'])
+            if job_return:
+                jid, minion = job_return
+                if jid in jids and ret['data'].get('return') is True:
+                    responding.add(minion)
+            elif started and expected and started not in responding:
+                log.debug('Minion "%s" started', started)
+                next_ping = 0
+
+    return expected, responding
+
+
+def _wait_no_running_state(client, event, minions, timeout, interval):
+    '''
+    Wait for the `minions` to have no running state.
+
+    A minion is checked again (with `saltutil.is_running`) as soon as one of
+    its running states returns, and every `interval` seconds otherwise.
+
+    Return the running states of the minions, `None` for the ones which did
+    not tell.
+    '''
+    deadline = time.time() + timeout
+    next_check = 0
+    running = dict.fromkeys(minions)
+    to_check = set()
+    jids = set()
+    # Minions to check again when a running state job returns, by JID
+    watched = {}
+
+    def _pending():
+        return set(
+            minion for minion, states in running.items() if states != []
         )
 
-    if not condition_reached(minions):
-        error_message = (
-            'Minion{plural} failed to respond after {retry} retries: {minions}'
-        ).format(
-            plural='s' if len(minions) > 1 else '',
-            retry=retry,
-            minions=', '.join(
-                minion
-                for minion, status in (minions or {}).items()
-                if not status
+    while _pending():
+        now = time.time()
+        if now >= deadline:
+            break
+
+        if now >= next_check:
+            if jids:
+                log.info(
+                    "Waiting for running jobs to complete: %d/%d minions "
+                    "done", len(running) - len(_pending()), len(running)
+                )
+            to_check |= _pending()
+            next_check = now + interval
+
+        if to_check:
+            pub = _publish(
+                client, sorted(to_check), 'saltutil.is_running',
+                arg=['state.*'], tgt_type='list'
             )
-        )
-        log.error(error_message)
-        return {
-            'result': False,
-            'error': error_message
-        }
+            if pub:
+                jids.add(pub[0])
+            to_check = set()
+
+        for ret in _get_events(event, min(next_check, deadline) - now):
+            job_return = _job_return(ret['tag'], ret['data'])
+            if not job_return or job_return[1] not in running:
+                continue
 
-    # Waiting for running states to complete
-    state_running = client.cmd(tgt, 'saltutil.is_running', arg=['state.*'])
-    attempts = 1
-
-    # If we got only empty result then no state running
-    while attempts <= retry and any(state_running.values()):
-        log.info(
-            "[Attempt %d/%d] Waiting for running jobs to complete: %s",
-            attempts,
-            retry,
-            ' - '.join(
-                'State on minion "{minion}": {states}'.format(
-                    minion=minion,
-                    states=', '.join(
-                        "PID={state[pid]} JID={state[jid]}".format(state=state)
-                        for state in running_states
+            jid, minion = job_return
+            if jid in jids:
+                states = ret['data'].get('return')
+                running[minion] = states if isinstance(states, list) \
+                    else None
+                for state in running[minion] or []:
+                    log.debug(
+                        'State on minion "%s": PID=%s JID=%s',
+                        minion, state.get('pid'), state.get('jid')
                     )
-                )
-                for minion, running_states in state_running.items()
-                if running_states
+                    watched.setdefault(state.get('jid'), set()).add(minion)
+            elif minion in watched.get(jid, ()):
+                watched[jid].discard(minion)
+                to_check.add(minion)
+
+    return running
+
+
+def wait_minions(tgt='*', retry=10, tgt_type='glob', interval=5):
+    '''
+    Wait for the minions matching `tgt` to respond, then to have no state
+    running.
+
+    Readiness is tracked from the master event bus (minion start and job
+    return events), so this returns as soon as all the minions are ready.
+    Minions which are not ready yet are probed again every `interval` seconds,
+    each step failing after `retry` probes.
+    '''
+    client = salt.client.get_local_client(__opts__['conf_file'])
+    timeout = retry * interval
+
+    with salt.utils.event.get_master_event(
+            __opts__, __opts__['sock_dir'], listen=True) as event:
+        expected, minions = _wait_responding(
+            client, event, tgt, tgt_type, timeout, interval
+        )
+
+        if not expected or minions < expected:
+            lagging = sorted((expected or set()) - minions)
+            error_message = (
+                'Minion{plural} failed to respond after {retry} retries: '
+                '{minions}'
+            ).format(
+                plural='s' if len(lagging) > 1 else '',
+                retry=retry,
+                minions=', '.join(lagging)
             )
+            log.error(error_message)
+            return {
+                'result': False,
+                'error': error_message
+            }
+
+        # Waiting for running states to complete
+        state_running = _wait_no_running_state(
+            client, event, minions, timeout, interval
         )
-        time.sleep(5)
-        state_running = client.cmd(tgt, 'saltutil.is_running', arg=['state.*'])
-        attempts += 1
 
-    if any(state_running.values()):
+    lagging = sorted(
+        minion for minion, running_states in state_running.items()
+        if running_states != []
+    )
+    if lagging:
         error_message = (
             'Minion{plural} still have running state after {retry} retries: '
             '{minions}'
         ).format(
-            plural='s' if len(state_running) > 1 else '',
+            plural='s' if len(lagging) > 1 else '',
             retry=retry,
-            minions=', '.join(
-                minion for minion, running_state in state_running.items()
-                if running_state
-            )
+            minions=', '.join(lagging)
         )
         log.error(error_message)
         return {
@@ -118,7 +271,7 @@ def wait_minions(tgt='*', retry=10):
         'comment':
             'All minions matching "{}" responded and finished startup '
             'state: {}'.format(
-                tgt, ', '.join(minions)
+                tgt, ', '.join(sorted(minions))
             )
     }
 
@@ -1,14 +1,29 @@
 """Management of Kubernetes objects as Salt states.
 
-This module defines three state functions: `object_present`, `object_absent`
-and `object_updated`.
+This module defines four state functions: `object_present`, `object_absent`,
+`object_updated` and `objects_present`.
 Those will then simply delegate all the logic to the `metalk8s_kubernetes`
 execution module, only managing simple dicts in this state module.
 """
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
 import time
 
+from salt.exceptions import CommandExecutionError
 from salt.utils import yaml
 
+log = logging.getLogger(__name__)
+
+BATCH_WORKERS = 10
+
+# Kinds other objects may depend on, applied before anything else
+BATCH_FIRST_KINDS = ('Namespace', 'CustomResourceDefinition')
+
+# Key of the manifest store in `__context__`, filled by the
+# `metalk8s_kubernetes` renderer in `lazy` mode
+MANIFEST_STORE_KEY = 'metalk8s_kubernetes.manifests'
+
 __virtualname__ = 'metalk8s_kubernetes'
 
 
@@ -18,12 +33,29 @@ def __virtual__():
     return __virtualname__
 
 
-def object_absent(name, manifest=None, wait=None, **kwargs):
+def _load_manifest(manifest_ref):
+    """Load a manifest from the manifest store."""
+    try:
+        content = __context__[MANIFEST_STORE_KEY][manifest_ref]
+    except KeyError:
+        raise CommandExecutionError(
+            'Unknown manifest reference "{}", it must be rendered by the '
+            '`metalk8s_kubernetes` renderer in the same run'.format(
+                manifest_ref
+            )
+        )
+    return json.loads(content)
+
+
+def object_absent(name, manifest=None, wait=None, manifest_ref=None,
+                  **kwargs):
     """Ensure that the object is absent.
 
     Arguments:
         name (str): Path to a manifest yaml file or just a name
         manifest (dict): Manifest content
+        manifest_ref (str): Reference of the manifest in the manifest store
+                            (instead of `manifest`)
         wait (bool): A boolean to enable waiting for object deletion
         wait (int): Number of retry to wait for object deletion (default: 5)
         wait (dict): Dict with number of retry to wait and time to sleep
@@ -46,6 +78,14 @@ def object_absent(name, manifest=None, wait=None, **kwargs):
         wait.setdefault('attempts', 5)
         wait.setdefault('sleep', 5)
 
+    if manifest_ref is not None:
+        try:
+            manifest = _load_manifest(manifest_ref)
+        except CommandExecutionError as exc:
+            ret['comment'] = str(exc)
+            ret['result'] = False
+            return ret
+
     # Only pass `name` if we have no manifest
     name_arg = None if manifest else name
 
@@ -102,16 +142,26 @@ def object_absent(name, manifest=None, wait=None, **kwargs):
     return ret
 
 
-def object_present(name, manifest=None, **kwargs):
+def object_present(name, manifest=None, manifest_ref=None, **kwargs):
     """Ensure that the object is present.
 
     Arguments:
         name (str): Path to a manifest yaml file
                     or just a name if manifest provided
         manifest (dict): Manifest content
+        manifest_ref (str): Reference of the manifest in the manifest store
+                            (instead of `manifest`)
     """
     ret = {'name': name, 'changes': {}, 'result': True, 'comment': ''}
 
+    if manifest_ref is not None:
+        try:
+            manifest = _load_manifest(manifest_ref)
+        except CommandExecutionError as exc:
+            ret['comment'] = str(exc)
+            ret['result'] = False
+            return ret
+
     # Only pass `name` if we have no manifest
     name_arg = None if manifest else name
 
@@ -153,6 +203,245 @@ def object_present(name, manifest=None, **kwargs):
     return ret
 
 
+def _object_name(manifest):
+    metadata = manifest.get('metadata') or {}
+    name = metadata.get('name')
+    if metadata.get('namespace'):
+        name = '{}/{}'.format(metadata['namespace'], name)
+
+    return "{}/{} '{}'".format(
+        manifest.get('apiVersion'), manifest.get('kind'), name
+    )
+
+
+def _batch_waves(manifests):
+    """Split `manifests` in successive groups respecting their dependencies.
+
+    Namespaces and CustomResourceDefinitions come first, then standard
+    objects and finally custom objects (which may rely on a definition from
+    the first group). Original ordering is kept inside each group.
+    """
+    waves = ([], [], [])
+    for manifest in manifests:
+        if manifest.get('kind') in BATCH_FIRST_KINDS:
+            waves[0].append(manifest)
+            continue
+        try:
+            kind_info = __utils__['metalk8s_kubernetes.get_kind_info'](
+                manifest
+            )
+        except ValueError:
+            # Let the apply report the error for this object
+            waves[1].append(manifest)
+        else:
+            waves[2 if kind_info.custom else 1].append(manifest)
+
+    return [wave for wave in waves if wave]
+
+
+def _resource_version(obj):
+    metadata = (obj or {}).get('metadata') or {}
+    return metadata.get('resource_version') or metadata.get('resourceVersion')
+
+
+def _list_key(manifest):
+    metadata = manifest.get('metadata') or {}
+    return (
+        manifest.get('apiVersion'),
+        manifest.get('kind'),
+        metadata.get('namespace') or 'default',
+    )
+
+
+def _current_versions(manifests, **kwargs):
+    """Retrieve the resource versions of the existing objects.
+
+    Objects are listed once per kind and namespace instead of being retrieved
+    one by one. Returns a dict mapping each listed group (see `_list_key`) to
+    the resource versions of its objects, indexed by name.
+    """
+    versions = {}
+    for api_version, kind, namespace in set(map(_list_key, manifests)):
+        try:
+            objects = __salt__['metalk8s_kubernetes.list_objects'](
+                kind=kind, apiVersion=api_version, namespace=namespace,
+                **kwargs
+            )
+        except CommandExecutionError:
+            # Let the apply report the error, if any, for these objects
+            continue
+
+        versions[(api_version, kind, namespace)] = {
+            obj['metadata']['name']: _resource_version(obj)
+            for obj in objects
+        }
+
+    return versions
+
+
+def _apply_one(manifest, versions, **kwargs):
+    """Apply an object, and compute its changes from its resource version.
+
+    The API server only bumps the resource version of an object if the apply
+    actually changed it.
+    """
+    try:
+        old_version = versions[_list_key(manifest)].get(
+            manifest['metadata']['name']
+        )
+    except KeyError:
+        # Listing failed, fallback on retrieving the object
+        old_version = _resource_version(
+            __salt__['metalk8s_kubernetes.get_object'](
+                manifest=manifest, saltenv=__env__, **kwargs
+            )
+        )
+
+    new = __salt__['metalk8s_kubernetes.apply_object'](
+        manifest=manifest, saltenv=__env__, **kwargs
+    )
+
+    if old_version is None:
+        return {'old': 'absent', 'new': 'present'}
+    new_version = _resource_version(new)
+    if new_version == old_version:
+        return {}
+    return {'resourceVersion': {'old': old_version, 'new': new_version}}
+
+
+def _wait_established(manifests, attempts=10, sleep=1, **kwargs):
+    """Wait for created or updated CustomResourceDefinitions to be served.
+
+    Returns the manifests of the definitions still not established once all
+    the attempts are exhausted.
+    """
+    pending = list(manifests)
+    while pending and attempts > 0:
+        for manifest in list(pending):
+            try:
+                obj = __salt__['metalk8s_kubernetes.get_object'](
+                    manifest=manifest, saltenv=__env__, **kwargs
+                )
+            except CommandExecutionError as exc:
+                log.debug(
+                    'Unable to retrieve %s, retrying: %s',
+                    _object_name(manifest), exc
+                )
+                continue
+            conditions = ((obj or {}).get('status') or {}).get(
+                'conditions'
+            ) or []
+            if any(condition.get('type') == 'Established' and
+                   condition.get('status') == 'True'
+                   for condition in conditions):
+                pending.remove(manifest)
+        if pending:
+            attempts -= 1
+            time.sleep(sleep)
+
+    return pending
+
+
+def objects_present(name, manifests=None, workers=None, manifest_refs=None,
+                    **kwargs):
+    """Ensure that a batch of objects is present, using server-side apply.
+
+    Objects are applied in dependency order (see `_batch_waves`), objects from
+    the same group being applied concurrently. If an object fails, the
+    remaining objects of its group are still applied but the following groups
+    are skipped.
+
+    Existing objects are listed once per kind and namespace before applying
+    each group, changes being detected from the resource version returned by
+    the apply.
+
+    Objects are applied with the `salt` field manager, forcing conflicts:
+    unlike `object_present` (which replaces the whole object), fields
+    removed from a manifest are only pruned if they were previously applied
+    by this field manager. Hence, this state must not be used for objects
+    previously deployed with `object_present`.
+
+    Arguments:
+        name (str): Name of the batch
+        manifests (list): Manifests content
+        workers (int): Maximum number of objects applied concurrently
+                       (default: 10)
+        manifest_refs (list): References of the manifests in the manifest
+                              store (instead of `manifests`)
+    """
+    ret = {'name': name, 'changes': {}, 'result': True, 'comment': ''}
+
+    if manifest_refs is not None:
+        try:
+            manifests = [_load_manifest(ref) for ref in manifest_refs]
+        except CommandExecutionError as exc:
+            ret['comment'] = str(exc)
+            ret['result'] = False
+            return ret
+
+    manifests = [manifest for manifest in manifests or [] if manifest]
+
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = '{} objects are going to be applied'.format(
+            len(manifests)
+        )
+        return ret
+
+    workers = int(workers or BATCH_WORKERS)
+    errors = []
+    applied = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for wave in _batch_waves(manifests):
+            versions = _current_versions(wave, **kwargs)
+            futures = [
+                (manifest, executor.submit(
+                    _apply_one, manifest, versions, **kwargs
+                ))
+                for manifest in wave
+            ]
+            changed_crds = []
+            for manifest, future in futures:
+                try:
+                    changes = future.result()
+                except CommandExecutionError as exc:
+                    errors.append('{}: {}'.format(
+                        _object_name(manifest), exc
+                    ))
+                    continue
+
+                applied += 1
+                if changes:
+                    ret['changes'][_object_name(manifest)] = changes
+                    if manifest.get('kind') == 'CustomResourceDefinition':
+                        changed_crds.append(manifest)
+
+            if errors:
+                break
+
+            # Custom objects cannot be applied before their definition (or
+            # their new version) is actually served by the API server
+            errors.extend(
+                '{}: not established'.format(_object_name(manifest))
+                for manifest in _wait_established(changed_crds, **kwargs)
+            )
+            if errors:
+                break
+
+    if errors:
+        ret['result'] = False
+        ret['comment'] = 'Failed to apply {} object(s):\n{}'.format(
+            len(errors), '\n'.join(errors)
+        )
+    else:
+        ret['comment'] = '{} objects were applied ({} changed)'.format(
+            applied, len(ret['changes'])
+        )
+
+    return ret
+
+
 def object_updated(name, manifest=None, **kwargs):
     """Update an existing object.
 
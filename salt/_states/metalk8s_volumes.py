@@ -85,6 +85,69 @@ def prepared(name):
     return ret
 
 
+def prepared_many(name, volumes, workers=None):
+    """Ensure the given volumes exist and are prepared, concurrently.
+
+    Volumes on different physical devices are created and formatted in
+    parallel (see `metalk8s_volumes.prepare_many`).
+
+    Args:
+        name (str): State name
+        volumes (list): Volume names
+        workers (int): maximum number of devices to prepare concurrently
+
+    Returns:
+        dict: state return value
+    """
+    ret = {'name': name, 'changes': {}, 'result': False, 'comment': ''}
+    # Idempotence.
+    pending = []
+    for volume in volumes:
+        try:
+            done = (
+                __salt__['metalk8s_volumes.exists'](volume) and
+                __salt__['metalk8s_volumes.is_prepared'](volume)
+            )
+        except Exception:  # pylint: disable=broad-except
+            # Errors are reported by `prepare_many`.
+            done = False
+        if not done:
+            pending.append(volume)
+    if not pending:
+        ret['result'] = True
+        ret['comment'] = 'Volumes {} already prepared.'.format(
+            ', '.join(volumes)
+        )
+        return ret
+    # Dry-run.
+    if __opts__['test']:
+        ret['changes'] = {volume: 'Prepared' for volume in pending}
+        ret['result'] = None
+        ret['comment'] = 'Volumes {} are going to be prepared.'.format(
+            ', '.join(pending)
+        )
+        return ret
+    # Let's go for real.
+    kwargs = {'workers': workers} if workers else {}
+    results = __salt__['metalk8s_volumes.prepare_many'](pending, **kwargs)
+    errors = []
+    for volume in pending:
+        result = results[volume]
+        if result['prepared']:
+            ret['changes'][volume] = 'Prepared'
+        elif result['created']:
+            ret['changes'][volume] = 'Present'
+        if not result['succeeded']:
+            errors.append('Failed to prepare volume {}: {}.'.format(
+                volume, result['comment']
+            ))
+    ret['result'] = not errors
+    ret['comment'] = '\n'.join(errors) or 'Volumes {} prepared.'.format(
+        ', '.join(pending)
+    )
+    return ret
+
+
 def removed(name):
     """Remove and cleanup the given volume.
 
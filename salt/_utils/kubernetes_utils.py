@@ -1,20 +1,32 @@
 """Utility methods for manipulation of Kubernetes objects in Python.
 """
+import copy
 import datetime
-from functools import partial
+from functools import lru_cache, partial
 import inspect
 import keyword
+import logging
 import operator
+import os
 from pprint import pformat
 import re
+import sys
+import threading
+import time
+import types
 
+from salt.exceptions import CommandExecutionError
 from salt.ext import six
+from salt.utils.data import traverse_dict_and_list
 from salt.utils.dictdiffer import recursive_diff
 
 try:
     import kubernetes.config
     import kubernetes.client as k8s_client
     import kubernetes.client.api as k8s_apis
+    from kubernetes.client.rest import ApiException
+    import kubernetes.watch
+    from urllib3.exceptions import HTTPError
 
     # Workaround for https://github.com/kubernetes-client/python/issues/376
     def set_conditions(self, conditions):
@@ -39,6 +51,8 @@ else:
     )
 
 
+log = logging.getLogger(__name__)
+
 __virtualname__ = 'metalk8s_kubernetes'
 
 
@@ -49,6 +63,22 @@ def __virtual__():
     return __virtualname__
 
 
+def _shared_state(key, factory):
+    """Retrieve (or create using `factory`) a process-wide singleton.
+
+    Salt executes custom modules again for every new loader (e.g. for each
+    pillar compilation on the master), so module globals cannot be used to
+    share state between calls in the same process.
+    """
+    holder = sys.modules.setdefault(
+        '_metalk8s_kubernetes_state',
+        types.ModuleType('_metalk8s_kubernetes_state')
+    )
+    if key not in holder.__dict__:
+        holder.__dict__.setdefault(key, factory())
+    return holder.__dict__[key]
+
+
 # Roughly equivalent to an Enum, for Python 2
 class ObjectScope(object):
     NAMESPACE = 'namespaced'
@@ -74,6 +104,117 @@ class ObjectScope(object):
         return 'ObjectScope({})'.format(self.value)
 
 
+class _ClientCache(object):
+    """Process-wide cache of configured `kubernetes.client.ApiClient`.
+
+    Building a client from a kubeconfig re-parses the file and creates a
+    brand new `urllib3` pool, which means a new TLS handshake for every
+    request. Clients are thus shared by all `ApiClient` wrappers (i.e. all
+    `KindInfo` and `CRKindInfo`), keyed on the kubeconfig path, its
+    modification time and the context.
+
+    An entry is dropped (and its connections closed) when the kubeconfig
+    changes on disk, when it was not used for `idle_timeout` seconds, or when
+    explicitly invalidated.
+    """
+    IDLE_TIMEOUT = 300
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # Mapping (path, mtime, context) -> [client, last_used]
+        self._entries = {}
+
+    @staticmethod
+    def _key(config_file, context):
+        path = os.path.abspath(os.path.expanduser(
+            config_file or
+            kubernetes.config.kube_config.KUBE_CONFIG_DEFAULT_LOCATION
+        ))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        return (path, mtime, context)
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.rest_client.pool_manager.clear()
+        except AttributeError:
+            pass
+
+    def get(self, config_file=None, context=None):
+        key = self._key(config_file, context)
+        now = time.time()
+
+        with self._lock:
+            for other_key in list(self._entries):
+                client, last_used = self._entries[other_key]
+                # Same kubeconfig and context, but modified on disk
+                changed = (
+                    (other_key[0], other_key[2]) == (key[0], key[2]) and
+                    other_key[1] != key[1]
+                )
+                if changed or now - last_used > self.idle_timeout:
+                    self._close(client)
+                    del self._entries[other_key]
+
+            entry = self._entries.get(key)
+            if entry is None:
+                client = kubernetes.config.new_client_from_config(
+                    config_file, context, False
+                )
+                entry = self._entries[key] = [client, now]
+            else:
+                entry[1] = now
+
+            return entry[0]
+
+    def invalidate(self, config_file=None):
+        """Drop cached clients, for `config_file` only if provided."""
+        path = None
+        if config_file is not None:
+            path = self._key(config_file, None)[0]
+
+        with self._lock:
+            for key in list(self._entries):
+                if path is None or key[0] == path:
+                    self._close(self._entries.pop(key)[0])
+
+
+_CLIENT_CACHE = _shared_state('client_cache', _ClientCache)
+
+
+def invalidate_client_cache(config_file=None):
+    """Drop the cached API clients built from `config_file` (or all of them).
+
+    Must be called whenever a kubeconfig is rewritten in place without its
+    modification time changing, e.g. after a credentials rotation.
+    """
+    _CLIENT_CACHE.invalidate(config_file)
+
+
+class _ServerSideApplyClient(object):
+    """Proxy over a `kubernetes.client.ApiClient` for server-side apply.
+
+    The generated `patch_*` methods always pick the first content type they
+    declare, i.e. a JSON patch. This proxy forces the server-side apply content
+    type instead, the body then has to be passed already serialized (JSON
+    being valid YAML).
+    """
+    CONTENT_TYPE = 'application/apply-patch+yaml'
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def select_header_content_type(self, content_types):
+        return self.CONTENT_TYPE
+
+
 class ApiClient(object):
     CRUD_METHODS = {
         'create': 'create',
@@ -82,6 +223,7 @@ class ApiClient(object):
         'delete': 'delete',
         'replace': 'replace',
         'list': 'list',
+        'apply': 'patch',
     }
 
     def __init__(self, api_cls, name,
@@ -105,6 +247,7 @@ class ApiClient(object):
         self._name = name
         self._all_namespaces_name = all_namespaces_name
         self._api = None
+        self._apply_api = None
         self._client = None
 
         # Attach the API CRUD methods at construction, so we can fail at
@@ -126,6 +269,7 @@ class ApiClient(object):
     update = property(lambda self: self._method('update'))
     delete = property(lambda self: self._method('delete'))
     replace = property(lambda self: self._method('replace'))
+    apply = property(lambda self: self._method('apply'))
 
     @property
     def list(self):
@@ -140,9 +284,18 @@ class ApiClient(object):
         return _list
 
     def configure(self, config_file=None, context=None, persist_config=False):
-        self._client = kubernetes.config.new_client_from_config(
-            config_file, context, persist_config
-        )
+        if persist_config:
+            # Loading may write back to the kubeconfig, do not share it
+            client = kubernetes.config.new_client_from_config(
+                config_file, context, persist_config
+            )
+        else:
+            client = _CLIENT_CACHE.get(config_file, context)
+
+        if client is not self._client:
+            self._client = client
+            self._api = None
+            self._apply_api = None
 
     @property
     def api(self):
@@ -153,13 +306,25 @@ class ApiClient(object):
             self._api = self.api_cls(api_client=self._client)
         return self._api
 
+    @property
+    def apply_api(self):
+        if self._apply_api is None:
+            assert self._client is not None, (
+                'Cannot use API without configuring the client first'
+            )
+            self._apply_api = self.api_cls(
+                api_client=_ServerSideApplyClient(self._client)
+            )
+        return self._apply_api
+
     def _method_name(self, verb):
         return '{}_{}'.format(verb, self.name)
 
     def _method(self, method):
         # Inject the API instance as the first argument, since those methods
         # are not classmethods, yet stored unbound
-        return partial(self._api_methods[method], self.api)
+        api = self.apply_api if method == 'apply' else self.api
+        return partial(self._api_methods[method], api)
 
 
 class KindInfo(object):
@@ -190,6 +355,7 @@ class KindInfo(object):
     model = property(operator.attrgetter('_model'))
     client = property(operator.attrgetter('_client'))
     scope = property(operator.attrgetter('_scope'))
+    custom = False
 
 
 if HAS_LIBS:
@@ -488,6 +654,7 @@ class CRKindInfo(object):
     kind = property(operator.attrgetter('_kind'))
     scope = property(operator.attrgetter('_scope'))
     client = property(operator.attrgetter('_client'))
+    custom = True
 
     @property
     def key(self):
@@ -537,6 +704,10 @@ class _DictWrapper(object):
     """
     def __init__(self, fields):
         self._fields = fields
+        # Reverse index of snake case attribute names, built on first miss
+        self._index = None
+        # Wrappers of the sub-dicts, so their own index is kept
+        self._children = {}
 
     @classmethod
     def from_value(cls, value):
@@ -557,17 +728,38 @@ class _DictWrapper(object):
             return super(_DictWrapper, self).__getattribute__(name)
         except AttributeError:
             if name in self._fields:
-                return self.from_value(self._fields[name])
-            for key in self._fields:
-                if _convert_attribute_name(key) == name:
-                    return self.from_value(self._fields[key])
+                return self._child(name)
+            key = self._lookup(name)
+            if key is not None:
+                return self._child(key)
             raise AttributeError(
                 "Custom object has no attribute '{}'".format(name)
             )
 
+    def _child(self, key):
+        value = self._fields[key]
+        if not isinstance(value, dict):
+            return self.from_value(value)
+        # The value may have been replaced from outside (see `to_dict`)
+        child = self._children.get(key)
+        if child is None or child._fields is not value:
+            child = self._children[key] = self.from_value(value)
+        return child
+
+    def _lookup(self, name):
+        # The wrapped dict may be modified from outside (see `to_dict`), so
+        # rebuild the index whenever it does not lead to an existing key
+        key = (self._index or {}).get(name)
+        if key is None or key not in self._fields:
+            self._index = {
+                _convert_attribute_name(field): field for field in self._fields
+            }
+            key = self._index.get(name)
+        return key
+
     def __setattr__(self, name, value):
         # First check for class values then retrieve from dict
-        if name in ['_fields']:
+        if name in ['_fields', '_index', '_children']:
             super(_DictWrapper, self).__setattr__(name, value)
         else:
             self._fields[name] = value
@@ -614,6 +806,291 @@ class CustomObject(object):
             setattr(self._attr_dict, name, value)
 
 
+class Informer(object):
+    """Watch-driven, in-memory cache of all the objects of a given kind.
+
+    The cache is filled with a single LIST, then kept up-to-date from a
+    background WATCH restarted from the last known `resourceVersion` (or
+    re-listed if this version expired).
+
+    Objects are stored in the same format as returned by
+    `metalk8s_kubernetes.list_objects`, and copies are returned so callers can
+    freely modify them.
+
+    If the cache was not confirmed up-to-date for more than `max_staleness`
+    seconds (e.g. the API server cannot be reached), reading from it triggers
+    a synchronous re-list, raising a `CommandExecutionError` if this fails.
+    """
+    MAX_STALENESS = 60
+    RETRY_INTERVAL = 5
+
+    def __init__(self, kind_info, config_file=None, context=None,
+                 field_selector=None, max_staleness=MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self._kind_info = kind_info
+        self._field_selector = field_selector
+        self._config_file = config_file
+        self._context = context
+        self._lock = threading.RLock()
+        self._objects = {}
+        self._indexes = {}
+        self._resource_version = None
+        self._synced_at = None
+        self._thread = None
+        self._watcher = None
+        self._stopped = threading.Event()
+        # Number of `get_informer` callers not released yet
+        self._users = 0
+
+    def _list_call(self):
+        """Return the raw list method and its kwargs for this kind.
+
+        Raw methods are used (rather than `ApiClient.list`) so the `Watch`
+        can find the model to deserialize events into from their docstring.
+        The API client is retrieved from the shared cache on each call, so a
+        rewritten kubeconfig is taken into account by the next (re)list.
+        """
+        client = self._kind_info.client
+        kwargs = {}
+        if self._field_selector:
+            kwargs['field_selector'] = self._field_selector
+
+        api = client.api_cls(
+            api_client=_CLIENT_CACHE.get(self._config_file, self._context)
+        )
+
+        if isinstance(client, CustomApiClient):
+            # Lists objects from all namespaces for namespaced resources
+            kwargs.update({
+                'group': client.group,
+                'version': client.version,
+                'plural': client.plural,
+            })
+            return api.list_cluster_custom_object, kwargs
+
+        if self._kind_info.scope == 'namespaced':
+            method_name = client._all_namespaces_name
+        else:
+            method_name = client._method_name('list')
+        return getattr(api, method_name), kwargs
+
+    def _check_credentials(self, exc):
+        """Drop the cached API client if its credentials were rejected.
+
+        E.g. after a rotation of the certificates of a kubeconfig rewritten
+        in place.
+        """
+        if getattr(exc, 'status', None) in (401, 403):
+            _CLIENT_CACHE.invalidate(
+                self._config_file or
+                kubernetes.config.kube_config.KUBE_CONFIG_DEFAULT_LOCATION
+            )
+
+    @staticmethod
+    def _to_dict(obj):
+        return obj if isinstance(obj, dict) else obj.to_dict()
+
+    @staticmethod
+    def _key(obj):
+        metadata = obj['metadata']
+        return (metadata.get('namespace'), metadata['name'])
+
+    @staticmethod
+    def _index_value(obj, path):
+        return traverse_dict_and_list(obj, path, delimiter=':')
+
+    def _set(self, obj):
+        key = self._key(obj)
+        self._remove(key)
+        self._objects[key] = obj
+        for path, index in self._indexes.items():
+            index.setdefault(self._index_value(obj, path), set()).add(key)
+
+    def _remove(self, key):
+        obj = self._objects.pop(key, None)
+        if obj is None:
+            return
+        for path, index in self._indexes.items():
+            index.get(self._index_value(obj, path), set()).discard(key)
+
+    def _relist(self):
+        func, kwargs = self._list_call()
+        try:
+            result = func(**kwargs)
+        except (ApiException, HTTPError) as exc:
+            self._check_credentials(exc)
+            raise CommandExecutionError(
+                'Failed to list resources "{}": {!s}'.format(
+                    self._kind_info.client.name, exc
+                )
+            )
+
+        if isinstance(result, dict):
+            items = result['items']
+            resource_version = result['metadata']['resourceVersion']
+        else:
+            items = result.items
+            resource_version = result.metadata.resource_version
+
+        with self._lock:
+            self._objects = {}
+            for path in self._indexes:
+                self._indexes[path] = {}
+            for item in items:
+                self._set(self._to_dict(item))
+            self._resource_version = resource_version
+            self._synced_at = time.time()
+
+    def _handle_event(self, event):
+        obj = self._to_dict(event['object'])
+        with self._lock:
+            if event['type'] == 'DELETED':
+                self._remove(self._key(obj))
+            else:
+                self._set(obj)
+            self._synced_at = time.time()
+
+    def _watch(self):
+        timeout = max(1, int(self.max_staleness // 2))
+        while not self._stopped.is_set():
+            try:
+                if self._resource_version is None:
+                    self._relist()
+                func, kwargs = self._list_call()
+                watcher = self._watcher = kubernetes.watch.Watch()
+                for event in watcher.stream(
+                        func,
+                        resource_version=self._resource_version,
+                        timeout_seconds=timeout,
+                        _request_timeout=timeout + 10,
+                        **kwargs):
+                    self._handle_event(event)
+                with self._lock:
+                    # The watch ended without error, the cache is up-to-date
+                    if watcher.resource_version is not None:
+                        self._resource_version = watcher.resource_version
+                    self._synced_at = time.time()
+            except ApiException as exc:
+                self._check_credentials(exc)
+                if exc.status != 410:
+                    log.warning(
+                        'Watch of "%s" failed: %s',
+                        self._kind_info.client.name, exc
+                    )
+                    self._stopped.wait(self.RETRY_INTERVAL)
+                # Expired (410 GONE) or unknown version, need a re-list
+                self._resource_version = None
+            except Exception as exc:  # pylint: disable=broad-except
+                log.warning(
+                    'Watch of "%s" failed: %s',
+                    self._kind_info.client.name, exc
+                )
+                self._resource_version = None
+                self._stopped.wait(self.RETRY_INTERVAL)
+
+    def stop(self):
+        """Stop the background watch, the cache is then only re-listed."""
+        self._stopped.set()
+        watcher = self._watcher
+        if watcher is not None:
+            watcher.stop()
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if not self._stopped.is_set() and (
+                    self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(
+                    target=self._watch,
+                    name='informer-{}'.format(self._kind_info.client.name),
+                )
+                self._thread.daemon = True
+                if self._synced_at is None:
+                    self._relist()
+                self._thread.start()
+
+            if self._synced_at is None or \
+                    time.time() - self._synced_at > self.max_staleness:
+                self._relist()
+
+    def list(self):
+        """Return all cached objects."""
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(list(self._objects.values()))
+
+    def get(self, name, namespace=None):
+        """Return a cached object, or `None` if it does not exist."""
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._objects.get((namespace, name)))
+
+    def by_index(self, path, value):
+        """Return cached objects for which the value at `path` is `value`.
+
+        `path` is a colon-delimited path in the object (e.g. `spec:nodeName`),
+        the corresponding index is built on first use and then maintained.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if path not in self._indexes:
+                index = self._indexes[path] = {}
+                for key, obj in self._objects.items():
+                    index.setdefault(
+                        self._index_value(obj, path), set()
+                    ).add(key)
+            return copy.deepcopy([
+                self._objects[key]
+                for key in self._indexes[path].get(value, ())
+            ])
+
+
+_INFORMERS = _shared_state('informers', dict)
+_INFORMERS_LOCK = _shared_state('informers_lock', threading.Lock)
+
+
+def get_informer(kind, apiVersion, kubeconfig=None, context=None,
+                 field_selector=None, max_staleness=Informer.MAX_STALENESS):
+    """Retrieve the process-wide `Informer` for a kind of objects.
+
+    Informers are shared by all callers in the process, keyed on the kind,
+    the field selector and the kubeconfig/context used. The staleness bound
+    of an existing informer is lowered to `max_staleness` if needed.
+    """
+    kind_info = get_kind_info({'kind': kind, 'apiVersion': apiVersion})
+    key = (apiVersion, kind, field_selector, kubeconfig, context)
+
+    with _INFORMERS_LOCK:
+        informer = _INFORMERS.get(key)
+        if informer is None:
+            informer = _INFORMERS[key] = Informer(
+                kind_info, config_file=kubeconfig, context=context,
+                field_selector=field_selector, max_staleness=max_staleness,
+            )
+        else:
+            informer.max_staleness = min(informer.max_staleness,
+                                         max_staleness)
+        informer._users += 1
+
+    return informer
+
+
+def release_informer(informer):
+    """Release an `Informer` retrieved with `get_informer`.
+
+    Once all its callers released it, the informer is stopped and forgotten.
+    Long-lived informers (e.g. for pillars) do not need to be released.
+    """
+    with _INFORMERS_LOCK:
+        informer._users -= 1
+        if informer._users > 0:
+            return
+        for key, value in list(_INFORMERS.items()):
+            if value is informer:
+                del _INFORMERS[key]
+
+    informer.stop()
+
+
 def get_kind_info(manifest):
     try:
         api_version = manifest['apiVersion']
@@ -666,40 +1143,79 @@ def _build_standard_object(model, manifest):
     This method assumes `model` to be a member of `kubernetes.client.models`,
     so that it can use its `attribute_map` and `openapi_types` attributes.
     """
-    # `model.attribute_map` contain all attribute correspondance between
-    # snake case and YAML style (camel case) so we need to reverse it
-    # e.g.: {
-    #   'status': 'status', 'kind': 'kind', 'spec': 'spec',
-    #   'api_version': 'apiVersion', 'metadata': 'metadata'
-    # }
-    reverse_attr_map = {
-        value: key for key, value in model.attribute_map.items()
+    return _ModelConverter.get(model).build(manifest)
+
+
+class _ModelConverter(object):
+    """Pre-compiled schema of a `kubernetes.client` model.
+
+    `model.attribute_map` contains all attribute correspondance between snake
+    case and YAML style (camel case) so we need to reverse it, e.g.:
+    {
+      'status': 'status', 'kind': 'kind', 'spec': 'spec',
+      'api_version': 'apiVersion', 'metadata': 'metadata'
     }
+    This is computed once per model, along with the type of each attribute.
+    """
+    _CACHE = {}
+    _CONFIGURATION = None
+
+    def __init__(self, model):
+        self.model = model
+        # Mapping source key -> (attribute name, type string), attributes can
+        # also be provided using their snake case name
+        self.fields = {
+            key: (key, type_str)
+            for key, type_str in model.openapi_types.items()
+        }
+        self.fields.update(
+            (src_key, (key, model.openapi_types.get(key)))
+            for key, src_key in model.attribute_map.items()
+        )
+        # Models default to instantiating a new `Configuration` (used only
+        # for client-side validation), which dominates their construction
+        # cost - share a single one when the model supports it
+        self.extra_kwargs = {}
+        if 'local_vars_configuration' in model.__init__.__code__.co_varnames:
+            self.extra_kwargs['local_vars_configuration'] = \
+                self.configuration()
 
-    kwargs = {}
-    for src_key, src_value in manifest.items():
-        key = reverse_attr_map.get(src_key, src_key)
-        type_str = model.openapi_types.get(key)
+    @classmethod
+    def configuration(cls):
+        if cls._CONFIGURATION is None:
+            cls._CONFIGURATION = k8s_client.Configuration()
+        return cls._CONFIGURATION
 
-        if type_str is None:
-            raise ValueError(
-                'Unsupported attribute {} for "{}" object.'.format(
-                    src_key, model.__name__
+    @classmethod
+    def get(cls, model):
+        converter = cls._CACHE.get(model)
+        if converter is None:
+            converter = cls._CACHE[model] = cls(model)
+        return converter
+
+    def build(self, manifest):
+        kwargs = dict(self.extra_kwargs)
+        for src_key, src_value in manifest.items():
+            key, type_str = self.fields.get(src_key, (src_key, None))
+
+            if type_str is None:
+                raise ValueError(
+                    'Unsupported attribute {} for "{}" object.'.format(
+                        src_key, self.model.__name__
+                    )
                 )
-            )
 
-        try:
-            value = _cast_value(src_value, type_str)
-        except TypeError as exc:
-            raise ValueError(
-                'Invalid value for attribute {} of a "{}" object: {}.'.format(
-                    src_key, model.__name__, str(exc)
+            try:
+                value = _cast_value(src_value, type_str)
+            except TypeError as exc:
+                raise ValueError(
+                    'Invalid value for attribute {} of a "{}" object: {}.'
+                    .format(src_key, self.model.__name__, str(exc))
                 )
-            )
 
-        kwargs[key] = value
+            kwargs[key] = value
 
-    return model(**kwargs)
+        return self.model(**kwargs)
 
 
 DICT_PATTERN = re.compile(r'^dict\(str,\s?(?P<value_type>\S+)\)$')
@@ -716,65 +1232,104 @@ def _cast_value(value, type_string):
     if value is None:
         return value
 
-    if type_string == 'str':
-        if not isinstance(value, six.string_types):
-            raise _type_error(value, expected='a string')
-        return value
+    caster = _CASTERS.get(type_string)
+    if caster is None:
+        caster = _CASTERS[type_string] = _compile_caster(type_string)
+    return caster(value)
 
-    if type_string == 'bool':
-        if not isinstance(value, bool):
-            raise _type_error(value, expected='a boolean')
-        return value
 
-    if type_string == 'int':
-        if not isinstance(value, six.integer_types):
-            raise _type_error(value, expected='an integer')
-        return value
+def _cast_str(value):
+    if not isinstance(value, six.string_types):
+        raise _type_error(value, expected='a string')
+    return value
 
-    if type_string == 'float':
-        if not isinstance(value, six.integer_types + (float,)):
-            raise _type_error(value, expected='a float')
-        return float(value)
 
-    if type_string == 'object':
-        # NOTE: this corresponds to fields accepting different types, such as
-        # either string or integer (e.g. for ports or thresholds). As such, we
-        # don't attempt validation. Note however that some cases may require
-        # casting into specific objects, which we don't handle yet.
-        return value
+def _cast_bool(value):
+    if not isinstance(value, bool):
+        raise _type_error(value, expected='a boolean')
+    return value
 
-    if type_string == 'datetime':
-        # YAML only supports dates as strings, though we don't know in advance
-        # what format would be used in source manifests (most likely, there
-        # wouldn't be any date). We thus pick the Swagger `date-time` string
-        # format (see swagger.io/docs/specification/data-models/data-types/).
-        try:
-            return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
-        except (TypeError, ValueError):
-            raise _type_error(value, expected='a date-time string')
 
+def _cast_int(value):
+    if not isinstance(value, six.integer_types):
+        raise _type_error(value, expected='an integer')
+    return value
+
+
+def _cast_float(value):
+    if not isinstance(value, six.integer_types + (float,)):
+        raise _type_error(value, expected='a float')
+    return float(value)
+
+
+def _cast_object(value):
+    # NOTE: this corresponds to fields accepting different types, such as
+    # either string or integer (e.g. for ports or thresholds). As such, we
+    # don't attempt validation. Note however that some cases may require
+    # casting into specific objects, which we don't handle yet.
+    return value
+
+
+def _cast_datetime(value):
+    # YAML only supports dates as strings, though we don't know in advance
+    # what format would be used in source manifests (most likely, there
+    # wouldn't be any date). We thus pick the Swagger `date-time` string
+    # format (see swagger.io/docs/specification/data-models/data-types/).
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        raise _type_error(value, expected='a date-time string')
+
+
+# Casters for each type string, compiled on first use (see `_compile_caster`)
+_CASTERS = {
+    'str': _cast_str,
+    'bool': _cast_bool,
+    'int': _cast_int,
+    'float': _cast_float,
+    'object': _cast_object,
+    'datetime': _cast_datetime,
+}
+
+
+def _compile_caster(type_string):
+    """Build the caster for a container or model type string.
+
+    Type strings are parsed only once, and models resolved from
+    `kubernetes.client.models` only once.
+    """
     dict_match = DICT_PATTERN.match(type_string)
     if dict_match is not None:
-        if not isinstance(value, dict):
-            raise _type_error(value, expected='a dictionary')
+        value_type_str = dict_match.group('value_type')
 
-        if not all(isinstance(key, six.string_types) for key in value.keys()):
-            raise _type_error(value,
-                              expected='a dictionary with string keys only')
+        def _cast_dict(value):
+            if not isinstance(value, dict):
+                raise _type_error(value, expected='a dictionary')
 
-        value_type_str = dict_match.group('value_type')
-        return {
-            key: _cast_value(val, value_type_str)
-            for key, val in value.items()
-        }
+            if not all(isinstance(key, six.string_types)
+                       for key in value.keys()):
+                raise _type_error(
+                    value, expected='a dictionary with string keys only'
+                )
+
+            return {
+                key: _cast_value(val, value_type_str)
+                for key, val in value.items()
+            }
+
+        return _cast_dict
 
     list_match = LIST_PATTERN.match(type_string)
     if list_match is not None:
-        if not isinstance(value, list):
-            raise _type_error(value, expected='a list')
-
         value_type_str = list_match.group('value_type')
-        return [_cast_value(val, value_type_str) for val in value]
+
+        def _cast_list(value):
+            if not isinstance(value, list):
+                raise _type_error(value, expected='a list')
+
+            return [_cast_value(val, value_type_str) for val in value]
+
+        return _cast_list
 
     try:
         model = getattr(k8s_client.models, type_string)
@@ -784,13 +1339,18 @@ def _cast_value(value, type_string):
             'Unknown type string provided: {}.'.format(type_string)
         )
 
-    if not isinstance(value, dict):
-        raise _type_error(
-            value,
-            expected='a dict to cast as a "{}"'.format(model.__name__)
-        )
+    converter = _ModelConverter.get(model)
+
+    def _cast_model(value):
+        if not isinstance(value, dict):
+            raise _type_error(
+                value,
+                expected='a dict to cast as a "{}"'.format(model.__name__)
+            )
+
+        return converter.build(value)
 
-    return _build_standard_object(model, value)
+    return _cast_model
 
 
 def _type_error(value, expected):
@@ -853,6 +1413,14 @@ def _cast_dict_keys(data, key_cast):
     return data
 
 
+ATTRIBUTE_NAME_PATTERNS = [
+    re.compile(r'([a-z])([A-Z0-9])'),
+    re.compile(r'([A-Z0-9])([A-Z0-9][a-z])'),
+]
+
+
+# Manifests use a small set of distinct keys, so translations are memoized
+@lru_cache(maxsize=4096)
 def _convert_attribute_name(key):
     """Translation of attribute names from K8s YAML style to Python snake case.
 
@@ -885,8 +1453,8 @@ def _convert_attribute_name(key):
     if key.startswith('$'):
         # Only two supported values, '$ref' and '$schema'
         return key[1:]
-    for pattern in ['([a-z])([A-Z0-9])', '([A-Z0-9])([A-Z0-9][a-z])']:
-        key = re.sub(pattern, r'\1_\2', key)
+    for pattern in ATTRIBUTE_NAME_PATTERNS:
+        key = pattern.sub(r'\1_\2', key)
     return key.lower()
 
 
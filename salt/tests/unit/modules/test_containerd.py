@@ -41,3 +41,48 @@ class ContainerdTestCase(TestCase, mixins.LoaderModuleMockMixin):
             mock_cmd.assert_called_once_with(
                 'ctr --debug -n k8s.io image import "{}"'.format(path)
             )
+
+    @parameterized.expand([
+        # No image index yet
+        (None, 0, 'unpacking k8s.gcr.io/my-image:3.1 (sha256:3efe4ff64c93123e'
+                  '1217b0ad6d23b4c87a1fc2109afeff55d2f27d70c55d8f73)...done',
+         None),
+        (set(), 0, 'unpacking k8s.gcr.io/my-image:3.1 (sha256:3efe4ff64c93123e'
+                   '1217b0ad6d23b4c87a1fc2109afeff55d2f27d70c55d8f73)...done',
+         {'k8s.gcr.io/my-image:3.1',
+          'k8s.gcr.io/my-image@sha256:3efe4ff64c93123e1217b0ad6d23b4c87a1fc210'
+          '9afeff55d2f27d70c55d8f73'}),
+        ({'k8s.gcr.io/pause:3.1'}, 0,
+         'unpacking localhost:5000/my-image (sha256:3efe4ff64c93123e1217b0ad6d'
+         '23b4c87a1fc2109afeff55d2f27d70c55d8f73)...done\n'
+         'unpacking my-image@sha256:3efe4ff64c93123e1217b0ad6d23b4c87a1fc2109a'
+         'feff55d2f27d70c55d8f73 (sha256:3efe4ff64c93123e1217b0ad6d23b4c87a1fc'
+         '2109afeff55d2f27d70c55d8f73)...done',
+         {'k8s.gcr.io/pause:3.1', 'localhost:5000/my-image',
+          'localhost:5000/my-image@sha256:3efe4ff64c93123e1217b0ad6d23b4c87a1'
+          'fc2109afeff55d2f27d70c55d8f73',
+          'my-image@sha256:3efe4ff64c93123e1217b0ad6d23b4c87a1fc2109afeff55d2'
+          'f27d70c55d8f73'}),
+        # Import failed
+        ({'k8s.gcr.io/pause:3.1'}, 1, '', {'k8s.gcr.io/pause:3.1'}),
+        # Unexpected output, the index is dropped
+        ({'k8s.gcr.io/pause:3.1'}, 0, 'Something else', None),
+        # Unexpected output, the index is already dropped
+        (None, 0, 'Something else', None),
+    ])
+    def test_load_cri_image_index(self, index, retcode, stdout, result):
+        """
+        Tests the update of the CRI image index by `load_cri_image` function
+        """
+        context = {}
+        if index is not None:
+            context['cri.image_index'] = index
+        mock_cmd = MagicMock(
+            return_value=utils.cmd_output(retcode=retcode, stdout=stdout)
+        )
+        with patch.dict(containerd.__salt__, {'cmd.run_all': mock_cmd}), \
+                patch.dict(containerd.__context__, context):
+            containerd.load_cri_image('/tmp/my-image.tar')
+            self.assertEqual(
+                containerd.__context__.get('cri.image_index'), result
+            )
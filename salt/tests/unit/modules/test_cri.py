@@ -101,8 +101,31 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
         """
         Tests the return of `available` function
         """
-        with patch("cri.list_images", MagicMock(return_value=images_list)):
+        list_images_mock = MagicMock(return_value=images_list)
+        with patch("cri.list_images", list_images_mock):
             self.assertEqual(cri.available(name), result)
+            self.assertEqual(cri.available(name), result)
+            # Images are listed once per job (unless listing failed)
+            self.assertEqual(
+                list_images_mock.call_count, 1 if images_list is not None else 2
+            )
+
+    @parameterized.expand([
+        (0, True),
+        (1, False),
+    ])
+    def test_available_after_pull(self, retcode, result):
+        """
+        Tests the return of `available` function after `pull_image`
+        """
+        list_images_mock = MagicMock(return_value=IMAGES_LIST)
+        mock_cmd = MagicMock(return_value=utils.cmd_output(retcode=retcode))
+        with patch("cri.list_images", list_images_mock), \
+                patch.dict(cri.__salt__, {'cmd.run_all': mock_cmd}):
+            self.assertFalse(cri.available("my-image:1.0"))
+            cri.pull_image("my-image:1.0")
+            self.assertEqual(cri.available("my-image:1.0"), result)
+            list_images_mock.assert_called_once_with()
 
     @parameterized.expand([
         (0, "Image is up to date for sha256:2bd222736f60f13a760bcfcc0728e4bd0812169d9d3068c01319c72102c9972a", {'digests': {'sha256': '2bd222736f60f13a760bcfcc0728e4bd0812169d9d3068c01319c72102c9972a'}}),
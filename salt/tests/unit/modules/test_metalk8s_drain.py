@@ -125,6 +125,44 @@ class Metalk8sDrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
             check_captured_logs(captured, log_lines)
 
+    @parameterized.expand([
+        ("no selector", None, {'app': 'a'}, False),
+        ("empty selector", {}, {'app': 'a'}, False),
+        ("empty match", {'match_labels': None}, {'app': 'a'}, False),
+        ("labels match", {'match_labels': {'app': 'a'}}, {'app': 'a'}, True),
+        ("labels mismatch", {'match_labels': {'app': 'a'}}, {'app': 'b'},
+         False),
+        ("in match", {'match_expressions': [
+            {'key': 'app', 'operator': 'In', 'values': ['a', 'b']}
+        ]}, {'app': 'b'}, True),
+        ("in mismatch", {'match_expressions': [
+            {'key': 'app', 'operator': 'In', 'values': ['a', 'b']}
+        ]}, {'app': 'c'}, False),
+        ("notin match", {'match_expressions': [
+            {'key': 'app', 'operator': 'NotIn', 'values': ['a']}
+        ]}, {}, True),
+        ("notin mismatch", {'match_expressions': [
+            {'key': 'app', 'operator': 'NotIn', 'values': ['a']}
+        ]}, {'app': 'a'}, False),
+        ("exists match", {'match_expressions': [
+            {'key': 'app', 'operator': 'Exists'}
+        ]}, {'app': 'a'}, True),
+        ("exists mismatch", {'match_expressions': [
+            {'key': 'app', 'operator': 'Exists'}
+        ]}, {}, False),
+        ("doesnotexist match", {'match_expressions': [
+            {'key': 'app', 'operator': 'DoesNotExist'}
+        ]}, {}, True),
+        ("doesnotexist mismatch", {'match_expressions': [
+            {'key': 'app', 'operator': 'DoesNotExist'}
+        ]}, {'app': 'a'}, False),
+    ])
+    def test_selector_matches(self, _, selector, labels, result):
+        """Tests for label selectors matching (used for disruption budgets)."""
+        self.assertEqual(
+            metalk8s_drain._selector_matches(selector, labels), result
+        )
+
     @parameterized.expand([
         ("cordon successful", False),
         ("cordon failure", True),
@@ -188,6 +226,8 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 ('v1', 'Pod'): 'pods',
                 ('apps/v1', 'ReplicaSet'): 'replicasets',
                 ('apps/v1', 'DaemonSet'): 'daemonsets',
+                ('policy/v1beta1', 'PodDisruptionBudget'):
+                    'poddisruptionbudgets',
                 ('__tests__', 'EvictionMock'): 'evictionmocks',
             },
         )
@@ -214,11 +254,35 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
         self.evict_pod_mock = MagicMock(side_effect=evict_pod_side_effect)
 
+        def get_informer_side_effect(kind, apiVersion, field_selector=None,
+                                     **_):
+            informer = MagicMock()
+            informer.list.side_effect = lambda: self.api_mock.list_objects(
+                kind=kind,
+                apiVersion=apiVersion,
+                all_namespaces=True,
+                field_selector=field_selector,
+            )
+            return informer
+
+        self.get_informer_mock = MagicMock(
+            side_effect=get_informer_side_effect
+        )
+        self.release_informer_mock = MagicMock()
+
         return {
             '__salt__': {
+                'metalk8s_kubernetes.get_kubeconfig': MagicMock(
+                    return_value=('/my/kube/config', 'my-context'),
+                ),
                 'metalk8s_kubernetes.get_object': self.api_mock.get_object,
                 'metalk8s_kubernetes.list_objects': self.api_mock.list_objects,
             },
+            '__utils__': {
+                'metalk8s_kubernetes.get_informer': self.get_informer_mock,
+                'metalk8s_kubernetes.release_informer':
+                    self.release_informer_mock,
+            },
             'evict_pod': self.evict_pod_mock,
         }
 
@@ -237,6 +301,11 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
             result = drainer.run_drain()
 
         self.assertEqual(result, "Eviction complete.")
+        # Informers are only used during the drain
+        self.assertEqual(
+            self.release_informer_mock.call_count,
+            self.get_informer_mock.call_count,
+        )
         check_captured_logs(captured, log_lines)
         self.assertEqual(self.evict_pod_mock.call_count, len(pods_to_evict))
         self.assertEqual(
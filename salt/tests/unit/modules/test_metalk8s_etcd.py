@@ -2,6 +2,7 @@ from importlib import reload
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
+import grpc
 from parameterized import parameterized
 from salt.exceptions import CommandExecutionError
 
@@ -82,24 +83,28 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     return cp_ips
             return None
 
-        def _etcd_status():
+        # Members are probed concurrently, status depends on the host
+        hosts = sorted(cp_ips.values())
+
+        def _etcd_client(host, **_):
+            client = MagicMock()
             result = status
             if isinstance(status, list):
-                result = status.pop(0)
-            if result:
-                return True
-            else:
-                raise Exception("Unhealthy member")
+                result = status[hosts.index(host)]
+            if not result:
+                client.status.side_effect = Exception("Unhealthy member")
+            status_mocks.append(client.status)
+            return client
 
+        status_mocks = []
         patch_dict = {
             "saltutil.runner": MagicMock(side_effect=_saltutil_runner_mock),
             "metalk8s.minions_by_role": MagicMock(return_value=etcd_minions)
         }
-        etcd3_mock = MagicMock()
-        status_mock = etcd3_mock.return_value.__enter__.return_value.status
-        status_mock.side_effect = _etcd_status
+        etcd3_mock = MagicMock(side_effect=_etcd_client)
         with patch.dict(metalk8s_etcd.__salt__, patch_dict), \
                 patch("etcd3.client", etcd3_mock), \
+                patch("grpc.channel_ready_future", MagicMock()), \
                 patch("etcd3.exceptions.ConnectionFailedError", Exception):
             if raises:
                 self.assertRaisesRegex(
@@ -113,7 +118,117 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     metalk8s_etcd._get_endpoint_up("ca", "key", "cert"),
                     result
                 )
-                status_mock.assert_called()
+                for status_mock in status_mocks:
+                    status_mock.assert_called_once_with()
+                etcd3_mock.assert_any_call(
+                    host=result, ca_cert="ca", cert_key="key",
+                    cert_cert="cert", timeout=metalk8s_etcd.TIMEOUT
+                )
+
+    def test_get_endpoint_up_cached(self):
+        """
+        Tests that `_get_endpoint_up` reuses the last answering endpoint
+        until it expires
+        """
+        runner_mock = MagicMock(return_value={'minion1': '10.11.12.13'})
+        patch_dict = {
+            "saltutil.runner": runner_mock,
+            "metalk8s.minions_by_role": MagicMock(return_value=['minion1'])
+        }
+        etcd3_mock = MagicMock()
+        time_mock = MagicMock(return_value=1000)
+        with patch.dict(metalk8s_etcd.__salt__, patch_dict), \
+                patch("etcd3.client", etcd3_mock), \
+                patch("grpc.channel_ready_future", MagicMock()), \
+                patch("time.time", time_mock):
+            for _ in range(2):
+                self.assertEqual(
+                    metalk8s_etcd._get_endpoint_up("ca", "key", "cert"),
+                    '10.11.12.13'
+                )
+            runner_mock.assert_called_once()
+            # Client is shared between calls
+            etcd3_mock.assert_called_once()
+            etcd3_mock.return_value.status.assert_called_once_with()
+
+            time_mock.return_value += metalk8s_etcd.ENDPOINT_TTL
+            self.assertEqual(
+                metalk8s_etcd._get_endpoint_up("ca", "key", "cert"),
+                '10.11.12.13'
+            )
+            self.assertEqual(runner_mock.call_count, 2)
+            self.assertEqual(etcd3_mock.return_value.status.call_count, 2)
+
+    def test_get_endpoint_up_unexpected_error(self):
+        """
+        Tests that `_get_endpoint_up` raises unexpected errors, discarding
+        the failing client
+        """
+        patch_dict = {
+            "saltutil.runner": MagicMock(
+                return_value={'minion1': '10.11.12.13'}
+            ),
+            "metalk8s.minions_by_role": MagicMock(return_value=['minion1'])
+        }
+        etcd3_mock = MagicMock()
+        etcd3_mock.return_value.status.side_effect = ValueError("Oops")
+        etcd3_mock.return_value.close.side_effect = Exception("Closed")
+        with patch.dict(metalk8s_etcd.__salt__, patch_dict), \
+                patch("etcd3.client", etcd3_mock), \
+                patch("grpc.channel_ready_future", MagicMock()):
+            self.assertRaisesRegex(
+                ValueError,
+                "Oops",
+                metalk8s_etcd._get_endpoint_up,
+                "ca", "key", "cert"
+            )
+            etcd3_mock.return_value.close.assert_called_once_with()
+            self.assertEqual(
+                metalk8s_etcd.__context__['metalk8s_etcd.clients'], {}
+            )
+
+    def test_get_endpoint_up_connect_timeout(self):
+        """
+        Tests that `_get_endpoint_up` skips members it cannot connect to
+        within `PROBE_TIMEOUT`, without retrieving their status
+        """
+        patch_dict = {
+            "saltutil.runner": MagicMock(return_value={
+                'minion1': '10.11.12.13', 'minion2': '10.11.12.14'
+            }),
+            "metalk8s.minions_by_role": MagicMock(
+                return_value=['minion1', 'minion2']
+            )
+        }
+        clients = {}
+        futures = {}
+
+        def _etcd_client(host, **_):
+            clients[host] = MagicMock(channel=host)
+            return clients[host]
+
+        def _channel_ready_future(channel):
+            futures[channel] = MagicMock()
+            if channel == '10.11.12.13':
+                futures[channel].result.side_effect = \
+                    grpc.FutureTimeoutError()
+            return futures[channel]
+
+        ready_mock = MagicMock(side_effect=_channel_ready_future)
+        with patch.dict(metalk8s_etcd.__salt__, patch_dict), \
+                patch("etcd3.client", MagicMock(side_effect=_etcd_client)), \
+                patch("grpc.channel_ready_future", ready_mock):
+            self.assertEqual(
+                metalk8s_etcd._get_endpoint_up("ca", "key", "cert"),
+                '10.11.12.14'
+            )
+            for future in futures.values():
+                future.result.assert_called_once_with(
+                    timeout=metalk8s_etcd.PROBE_TIMEOUT
+                )
+            clients['10.11.12.13'].status.assert_not_called()
+            clients['10.11.12.13'].close.assert_called_once_with()
+            clients['10.11.12.14'].status.assert_called_once_with()
 
     @parameterized.expand([
         (),
@@ -124,7 +239,7 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
         Tests the return of `add_etcd_node` function
         """
         etcd3_mock = MagicMock()
-        add_member = etcd3_mock.return_value.__enter__.return_value.add_member
+        add_member = etcd3_mock.return_value.add_member
         add_member.return_value = "my new node"
         with patch("etcd3.client", etcd3_mock), \
                 patch("metalk8s_etcd._get_endpoint_up",
@@ -137,6 +252,8 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 "my new node"
             )
             add_member.assert_called_once_with("10.11.12.14")
+            etcd3_mock.return_value.close.assert_called_once_with()
+            self.assertNotIn('metalk8s_etcd.clients', metalk8s_etcd.__context__)
 
     @parameterized.expand([
         (["https://10.11.12.13:2380"], MEMBERS_LIST, True),
@@ -156,7 +273,7 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
         Tests the return of `urls_exist_in_cluster` function
         """
         etcd3_mock = MagicMock()
-        etcd3_mock.return_value.__enter__.return_value.members = members
+        etcd3_mock.return_value.members = members
         with patch("etcd3.client", etcd3_mock), \
                 patch("metalk8s_etcd._get_endpoint_up",
                       MagicMock(return_value=endpoint)):
@@ -167,6 +284,7 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 ),
                 result
             )
+            etcd3_mock.return_value.close.assert_called_once_with()
 
     @parameterized.expand([
         ({'minion1': 'https://10.11.12.13:2380'}, None, MEMBERS_LIST, True, "cluster is healthy", False),
@@ -186,25 +304,28 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     return cp_ips
             return None
 
-        def _etcd_status():
+        # Members are probed concurrently, status depends on the host
+        def _etcd_client(host, port=None, **_):
+            client = MagicMock(members=members)
             result = status
-            if isinstance(status, list):
-                result = status.pop(0)
-            if result:
-                return True
-            else:
-                raise Exception("Unhealthy member")
+            if isinstance(status, list) and port:
+                result = status[
+                    [m.client_urls[0] for m in members].index(
+                        'https://{}:{}'.format(host, port)
+                    )
+                ]
+            if not result:
+                client.status.side_effect = Exception("Unhealthy member")
+            return client
 
-        etcd3_mock = MagicMock()
-        etcd3_mock.return_value.__enter__.return_value.members = members
-        etcd3_mock.return_value.__enter__.return_value.status.side_effect = \
-            _etcd_status
+        etcd3_mock = MagicMock(side_effect=_etcd_client)
 
         patch_dict = {
             "saltutil.runner": MagicMock(side_effect=_saltutil_runner_mock)
         }
         with patch.dict(metalk8s_etcd.__salt__, patch_dict), \
                 patch("etcd3.client", etcd3_mock), \
+                patch("grpc.channel_ready_future", MagicMock()), \
                 patch("metalk8s_etcd._get_endpoint_up",
                       MagicMock(return_value=endpoint)):
             minion_id = "minion1" if cp_ips else None
@@ -228,6 +349,8 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 host=cp_ips[minion_id] if minion_id else endpoint,
                 ca_cert="ca", cert_key="key", cert_cert="cert", timeout=30
             )
+            # Clients are closed once the operation is done
+            self.assertNotIn('metalk8s_etcd.clients', metalk8s_etcd.__context__)
 
     @parameterized.expand([
         (MEMBERS_LIST, MEMBERS_LIST_DICT),
@@ -246,7 +369,7 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
             return endpoint
 
         etcd3_mock = MagicMock()
-        etcd3_mock.return_value.__enter__.return_value.members = members
+        etcd3_mock.return_value.members = members
 
         with patch("etcd3.client", etcd3_mock), \
                 patch("metalk8s_etcd._get_endpoint_up",
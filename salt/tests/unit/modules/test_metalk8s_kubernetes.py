@@ -1,4 +1,5 @@
 from importlib import reload
+import json
 import os.path
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
@@ -362,6 +363,78 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                         replace_mock.call_args[1]
                     )
 
+    @utils.parameterized_from_cases(
+        YAML_TESTS_CASES['apply_object'] + YAML_TESTS_CASES['common_tests']
+    )
+    def test_apply_object(self, result, raises=False, api_status_code=None,
+                          info_scope="cluster", manifest_file_content=None,
+                          called_with=None, **kwargs):
+        """
+        Tests the return of `apply_object` function
+        """
+        def _apply_mock(body, **_):
+            if api_status_code is not None:
+                raise ApiException(
+                    status=api_status_code,
+                    reason='An error has occurred'
+                )
+
+            # body == serialized manifest
+            res = MagicMock()
+            res.to_dict.return_value = json.loads(body)
+            return res
+
+        get_kind_info_mock = MagicMock()
+        if not info_scope:
+            get_kind_info_mock.side_effect = ValueError(
+                'An error has occurred'
+            )
+        get_kind_info_mock.return_value.scope = info_scope
+
+        apply_mock = get_kind_info_mock.return_value.client.apply
+        apply_mock.side_effect = _apply_mock
+
+        manifest_read_mock = MagicMock()
+        # None = IOError
+        # False = YAMLError
+        if manifest_file_content is None:
+            manifest_read_mock.side_effect = IOError(
+                'An error has occurred'
+            )
+        elif manifest_file_content is False:
+            manifest_read_mock.side_effect = yaml.YAMLError(
+                'An error has occurred'
+            )
+        else:
+            manifest_read_mock.return_value = manifest_file_content
+
+        utils_dict = {
+            'metalk8s_kubernetes.get_kind_info': get_kind_info_mock
+        }
+        salt_dict = {
+            'metalk8s_kubernetes.read_and_render_yaml_file': manifest_read_mock
+        }
+        with patch.dict(metalk8s_kubernetes.__utils__, utils_dict), \
+                patch.dict(metalk8s_kubernetes.__salt__, salt_dict):
+            if raises:
+                self.assertRaisesRegex(
+                    Exception,
+                    result,
+                    metalk8s_kubernetes.apply_object,
+                    **kwargs
+                )
+            else:
+                self.assertEqual(
+                    metalk8s_kubernetes.apply_object(**kwargs),
+                    result
+                )
+                apply_mock.assert_called_once()
+                if called_with:
+                    self.assertDictContainsSubset(
+                        called_with,
+                        apply_mock.call_args[1]
+                    )
+
     @utils.parameterized_from_cases(
         YAML_TESTS_CASES['get_object'] + YAML_TESTS_CASES['common_tests']
     )
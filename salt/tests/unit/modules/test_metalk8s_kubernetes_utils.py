@@ -211,7 +211,8 @@ class Metalk8sKubernetesUtilsTestCase(TestCase, mixins.LoaderModuleMockMixin):
         param.explicit(kwargs=test_case)
         for test_case in YAML_TESTS_CASES["get_service_endpoints"]
     )
-    def test_get_service_endpoints(self, obj, result, raises=False):
+    def test_get_service_endpoints(self, obj, result, raises=False,
+                                   from_informer=False):
         """
         Tests the return of `get_service_endpoints` function
         """
@@ -224,6 +225,11 @@ class Metalk8sKubernetesUtilsTestCase(TestCase, mixins.LoaderModuleMockMixin):
         else:
             get_object_mock.return_value = obj
 
+        kwargs = {}
+        if from_informer:
+            kwargs['informer'] = MagicMock()
+            kwargs['informer'].get = get_object_mock
+
         salt_dict = {
             'metalk8s_kubernetes.get_object': get_object_mock
         }
@@ -236,7 +242,8 @@ class Metalk8sKubernetesUtilsTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     metalk8s_kubernetes_utils.get_service_endpoints,
                     "my_service",
                     namespace="my_namespace",
-                    kubeconfig="my-kubeconf"
+                    kubeconfig="my-kubeconf",
+                    **kwargs
                 )
             else:
                 self.assertEqual(
@@ -244,6 +251,12 @@ class Metalk8sKubernetesUtilsTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     metalk8s_kubernetes_utils.get_service_endpoints(
                         "my_service",
                         namespace="my_namespace",
-                        kubeconfig="my-kubeconf"
+                        kubeconfig="my-kubeconf",
+                        **kwargs
                     )
                 )
+
+        if from_informer:
+            get_object_mock.assert_called_once_with(
+                "my_service", namespace="my_namespace"
+            )
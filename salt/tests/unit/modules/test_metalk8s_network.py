@@ -68,6 +68,10 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
         (
             '10.0.0.0/31',
             'Could not obtain an IP in the network range 10.0.0.0/31'
+        ),
+        (
+            '10.0.0.0/29',
+            'Could not obtain an IP in the network range 10.0.0.0/29'
         )
     ])
     def test_get_cluster_dns_ip_raise(self, service_ip, error_msg):
@@ -114,16 +118,20 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
         (['10.200.0.0/16'], ['10.200.0.1', '10.200.0.42'], '10.200.0.1'),
         # 1 CIDR, 2 IP, current_ip set to the second one, take the second one
         (['10.200.0.0/16'], ['10.200.0.1', '10.200.0.42'], '10.200.0.42', '10.200.0.42'),
+        # 1 CIDR, 2 IP (unordered), take the lowest one
+        (['10.200.0.0/16'], ['10.200.0.42', '10.200.0.1'], '10.200.0.1'),
         # 1 CIDR, no IP, errors
         (['10.200.0.0/16'], [], 'Unable to find an IP on this host in one of this cidr: 10.200.0.0/16', None, True),
+        # 1 CIDR, only loopback IP, errors
+        (['127.0.0.0/8'], [], 'Unable to find an IP on this host in one of this cidr: 127.0.0.0/8', None, True),
         # 2 CIDR, multiple IPs, take the first one of first CIDR
-        (['10.200.0.0/16', '10.100.0.0/16'], {'10.200.0.0/16': ['10.200.0.1', '10.200.0.42'], '10.100.0.0/16': ['10.100.0.12', '10.100.0.52']}, '10.200.0.1'),
+        (['10.200.0.0/16', '10.100.0.0/16'], ['10.100.0.12', '10.100.0.52', '10.200.0.1', '10.200.0.42'], '10.200.0.1'),
         # 2 CIDR, multiple IPs, with current_ip present
-        (['10.200.0.0/16', '10.100.0.0/16'], {'10.200.0.0/16': ['10.200.0.1', '10.200.0.42'], '10.100.0.0/16': ['10.100.0.12', '10.100.0.52']}, '10.100.0.52', '10.100.0.52'),
+        (['10.200.0.0/16', '10.100.0.0/16'], ['10.100.0.12', '10.100.0.52', '10.200.0.1', '10.200.0.42'], '10.100.0.52', '10.100.0.52'),
         # 2 CIDR, multiple IPs, with current_ip absent
-        (['10.200.0.0/16', '10.100.0.0/16'], {'10.200.0.0/16': ['10.200.0.1', '10.200.0.42'], '10.100.0.0/16': ['10.100.0.12', '10.100.0.52']}, '10.200.0.1', '10.100.0.87'),
+        (['10.200.0.0/16', '10.100.0.0/16'], ['10.100.0.12', '10.100.0.52', '10.200.0.1', '10.200.0.42'], '10.200.0.1', '10.100.0.87'),
         # 2 CIDR, first CIDR no IP
-        (['10.200.0.0/16', '10.100.0.0/16'], {'10.100.0.0/16': ['10.100.0.12', '10.100.0.52']}, '10.100.0.12'),
+        (['10.200.0.0/16', '10.100.0.0/16'], ['10.100.0.12', '10.100.0.52'], '10.100.0.12'),
         # 2 CIDR, no IP, with current_ip, errors
         (['10.200.0.0/16', '10.100.0.0/16'], [], 'Unable to find an IP on this host in one of this cidr: 10.200.0.0/16, 10.100.0.0/16', '10.200.0.1', True),
     ])
@@ -132,13 +140,15 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
         """
         Tests the return of `get_ip_from_cidrs` function
         """
-        def _get_ip_addrs(cidr):
-            if isinstance(ip_addrs, dict):
-                return ip_addrs.get(cidr)
-            return ip_addrs
-
+        interfaces = {
+            'lo': {'inet': [{'address': '127.0.0.1', 'label': 'lo'}]},
+            'eth0': {
+                'inet': [{'address': ip, 'label': 'eth0'} for ip in ip_addrs],
+                'inet6': [{'address': 'fe80::1'}],
+            },
+        }
         salt_dict = {
-            'network.ip_addrs': MagicMock(side_effect=_get_ip_addrs)
+            'network.interfaces': MagicMock(return_value=interfaces)
         }
 
         with patch.dict(metalk8s_network.__salt__, salt_dict):
@@ -162,10 +172,13 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
         (['eth0'], '1500', 1500),
         # Mutliple ifaces (first one taken)
         (['eth1', 'eth0'], {'eth0': '1500', 'eth1': '1442'}, 1442),
+        # IP as secondary address
+        (['eth0'], '1500', 1500, False, True),
         # No iface, error
         ([], None, 'Unable to get interface for "10.200.0.42"', True)
     ])
-    def test_get_mtu_from_ip(self, ifaces, read_mtu, result, raises=False):
+    def test_get_mtu_from_ip(self, ifaces, read_mtu, result, raises=False,
+                             secondary=False):
         """
         Tests the return of `get_mtu_from_ip` function
         """
@@ -176,8 +189,23 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 return read_mtu.get(iface, "")
             return read_mtu
 
+        address = {'address': '10.200.0.42'}
+        if secondary:
+            address['type'] = 'inet'
+        interfaces = {
+            'eth2': {'inet': [{'address': '10.200.0.4', 'label': 'eth2'}]},
+        }
+        for iface in ifaces:
+            interfaces[iface] = {
+                'inet': [{'address': '10.100.0.1', 'label': iface}],
+            }
+            if secondary:
+                interfaces[iface]['secondary'] = [address]
+            else:
+                interfaces[iface]['inet'].append(address)
+
         salt_dict = {
-            'network.ifacestartswith': MagicMock(return_value=ifaces),
+            'network.interfaces': MagicMock(return_value=interfaces),
             'file.read': MagicMock(side_effect=_read_mtu_file)
         }
 
@@ -194,3 +222,41 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     result,
                     metalk8s_network.get_mtu_from_ip('10.200.0.42')
                 )
+
+    def test_network_facts_memoized(self):
+        """
+        Tests that network facts are only computed once per job
+        """
+        interfaces = {
+            'eth0': {'inet': [{'address': '10.200.0.42', 'label': 'eth0'}]},
+        }
+        salt_dict = {
+            'network.interfaces': MagicMock(return_value=interfaces),
+            'file.read': MagicMock(return_value='1500')
+        }
+
+        with patch.dict(metalk8s_network.__salt__, salt_dict):
+            for _ in range(2):
+                self.assertEqual(
+                    metalk8s_network.get_kubernetes_service_ip(), '10.0.0.1'
+                )
+                self.assertEqual(
+                    metalk8s_network.get_ip_from_cidrs(['10.200.0.0/16']),
+                    '10.200.0.42'
+                )
+                self.assertEqual(
+                    metalk8s_network.get_mtu_from_ip('10.200.0.42'), 1500
+                )
+
+            # Another service network is not mixed up with the first one
+            with patch.dict(
+                    metalk8s_network.__pillar__,
+                    {'networks': {'service': '10.96.0.0/12'}}):
+                self.assertEqual(
+                    metalk8s_network.get_kubernetes_service_ip(), '10.96.0.1'
+                )
+
+            salt_dict['network.interfaces'].assert_called_once_with()
+            salt_dict['file.read'].assert_called_once_with(
+                '/sys/class/net/eth0/mtu'
+            )
@@ -1,7 +1,10 @@
+import bz2
 from importlib import reload
 import os.path
+import sqlite3
+import tempfile
 from unittest import TestCase
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, mock_open, patch
 
 from parameterized import param, parameterized
 from salt.exceptions import CommandExecutionError
@@ -21,6 +24,63 @@ with open(YAML_TESTS_FILE) as fd:
     YAML_TESTS_CASES = yaml.safe_load(fd)
 
 
+REPOMD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo">
+  <data type="primary">
+    <location href="repodata/primary.xml.gz"/>
+  </data>
+  <data type="primary_db">
+    <location href="repodata/{}"/>
+  </data>
+</repomd>
+"""
+
+
+def _write_repo(root, name, packages, primary_db='primary.sqlite.bz2'):
+    """Write the cached metadata of a yum repository in `root`.
+
+    `packages` is a list of `(name, version, release, provides, requires)`.
+    """
+    repo_dir = os.path.join(root, 'x86_64', '7', name)
+    os.makedirs(repo_dir)
+    with open(os.path.join(repo_dir, 'repomd.xml'), 'w') as fd:
+        fd.write(REPOMD_TEMPLATE.format(primary_db))
+
+    database = os.path.join(repo_dir, primary_db.replace('.bz2', ''))
+    connection = sqlite3.connect(database)
+    connection.executescript("""
+        CREATE TABLE packages (
+            pkgKey INTEGER PRIMARY KEY, name TEXT, version TEXT, release TEXT
+        );
+        CREATE TABLE provides (name TEXT, pkgKey INTEGER);
+        CREATE TABLE files (name TEXT, pkgKey INTEGER);
+        CREATE TABLE requires (name TEXT, pkgKey INTEGER);
+    """)
+    for key, (pkg, version, release, provides, requires) in \
+            enumerate(packages):
+        connection.execute(
+            'INSERT INTO packages VALUES (?, ?, ?, ?)',
+            (key, pkg, version, release)
+        )
+        for capability in [pkg] + provides:
+            table = 'files' if capability.startswith('/') else 'provides'
+            connection.execute(
+                'INSERT INTO {} VALUES (?, ?)'.format(table), (capability, key)
+            )
+        for capability in requires:
+            connection.execute(
+                'INSERT INTO requires VALUES (?, ?)', (capability, key)
+            )
+    connection.commit()
+    connection.close()
+
+    if primary_db.endswith('.bz2'):
+        with open(database, 'rb') as src, \
+                bz2.open(database + '.bz2', 'wb') as dst:
+            dst.write(src.read())
+        os.remove(database)
+
+
 class Metalk8sPackageManagerYumTestCase(TestCase, mixins.LoaderModuleMockMixin):
     """
     TestCase for `metalk8s_package_manager_yum` module
@@ -74,7 +134,11 @@ class Metalk8sPackageManagerYumTestCase(TestCase, mixins.LoaderModuleMockMixin):
         )
 
         with patch.dict(metalk8s_package_manager_yum.__salt__,
-                        {'cmd.run_all': repoquery_cmd_mock}):
+                        {'cmd.run_all': repoquery_cmd_mock}), \
+                patch("metalk8s_package_manager_yum._get_dependents_graph",
+                      MagicMock(return_value=None)), \
+                patch("metalk8s_package_manager_yum._repo_metadata_checksum",
+                      MagicMock(return_value=None)):
             self.assertEqual(
                 metalk8s_package_manager_yum._list_dependents(
                     "my_package",
@@ -103,18 +167,20 @@ class Metalk8sPackageManagerYumTestCase(TestCase, mixins.LoaderModuleMockMixin):
         """
         def _rpm_qa_cmd(command):
             out_kwargs = {}
-            if command[0] == 'rpm' and command[1] == '-qa':
+            if command[:4] == ['rpm', '-qa', '--queryformat', '%{NAME}\\n']:
                 # rpm_qa_outputs == None means nothings installed so
-                # `rpm -qa <package>` return "" and retcode 0
+                # `rpm -qa <packages>` return "" and retcode 0
                 if rpm_qa_outputs is not None:
-                    if isinstance(rpm_qa_outputs, dict):
-                        if rpm_qa_outputs.get(command[2]) is None:
-                            out_kwargs['retcode'] = 1
-                            out_kwargs['stderr'] = 'An error has occured'
-                        else:
-                            out_kwargs['stdout'] = rpm_qa_outputs[command[2]]
+                    names = command[4:]
+                    if any(rpm_qa_outputs.get(name) is None
+                           for name in names):
+                        out_kwargs['retcode'] = 1
+                        out_kwargs['stderr'] = 'An error has occured'
                     else:
-                        out_kwargs['stdout'] = rpm_qa_outputs
+                        out_kwargs['stdout'] = ''.join(
+                            '{}\n'.format(name) for name in names
+                            if rpm_qa_outputs[name]
+                        )
                 return utils.cmd_output(**out_kwargs)
             return None
 
@@ -138,27 +204,33 @@ class Metalk8sPackageManagerYumTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["check_pkg_availability"])
     def test_check_pkg_availability(self, pkgs_info, raise_msg=None,
-                                    yum_install_retcode=0):
+                                    yum_install_retcode=0, yum_calls=None):
         """
         Tests the return of `check_pkg_availability` function
         """
         def _yum_install_cmd(command):
             out_kwargs = {'stdout': 'Everything looks good'}
+            # Package names are between `yum install` and the options
+            names = command[2:command.index('--setopt')]
             if isinstance(yum_install_retcode, int):
                 out_kwargs['retcode'] = yum_install_retcode
-            elif isinstance(yum_install_retcode, list):
-                out_kwargs['retcode'] = yum_install_retcode.pop()
             elif isinstance(yum_install_retcode, dict):
-                # `command[2]` == package name
-                out_kwargs['retcode'] = yum_install_retcode.get(command[2], 0)
+                out_kwargs['retcode'] = max(
+                    yum_install_retcode.get(name, 0) for name in names
+                )
+                if len(names) > 1:
+                    out_kwargs['retcode'] |= yum_install_retcode.get(
+                        'all', 0
+                    )
 
             if out_kwargs.get('retcode'):
                 out_kwargs['stdout'] = 'Oh ! No ! An ErRoR'
 
             return utils.cmd_output(**out_kwargs)
 
+        yum_install_mock = MagicMock(side_effect=_yum_install_cmd)
         salt_dict = {
-            'cmd.run_all': MagicMock(side_effect=_yum_install_cmd)
+            'cmd.run_all': yum_install_mock
         }
 
         with patch.dict(metalk8s_package_manager_yum.__salt__, salt_dict):
@@ -174,3 +246,260 @@ class Metalk8sPackageManagerYumTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 metalk8s_package_manager_yum.check_pkg_availability(
                     pkgs_info
                 )
+        if yum_calls is not None:
+            self.assertEqual(yum_install_mock.call_count, yum_calls)
+
+    @parameterized.expand([
+        param([], None),
+        param(['/var/cache/yum/x86_64/7/my-repo/repomd.xml'], 'my-repo'),
+        param(['/var/cache/yum/x86_64/7/my-repo/repomd.xml'], None),
+        param([
+            '/var/cache/yum/x86_64/7/my-repo/repomd.xml',
+            '/var/cache/yum/x86_64/7/other-repo/repomd.xml',
+        ], 'my-repo,other-repo'),
+    ])
+    def test_repo_metadata_checksum(self, paths, fromrepo):
+        """
+        Tests the return of `_repo_metadata_checksum` function
+        """
+        def _glob(pattern):
+            return [
+                path for path in paths
+                if path.split('/')[-2] == pattern.split('/')[-2]
+                or pattern.split('/')[-2] == '*'
+            ]
+
+        with patch("glob.glob", MagicMock(side_effect=_glob)), \
+                patch("salt.utils.files.fopen",
+                      mock_open(read_data=b'<repomd/>')):
+            checksum = metalk8s_package_manager_yum._repo_metadata_checksum(
+                fromrepo
+            )
+
+        if paths:
+            self.assertRegex(checksum, r'^[0-9a-f]{64}$')
+        else:
+            self.assertIsNone(checksum)
+
+    @parameterized.expand([
+        # No metadata cached, no result cache
+        param(None, None, True, None),
+        # Nothing in cache
+        param('abcd', None, True, [['kubelet', '1.15.11-0']]),
+        # Up-to-date cache
+        param('abcd', {
+            'checksum': 'abcd', 'fromrepo': 'my-repo',
+            'packages': [['kubectl', '1.15.11-0']],
+        }, False, None),
+        # Outdated cache
+        param('abcd', {
+            'checksum': 'efgh', 'fromrepo': 'my-repo',
+            'packages': [['kubectl', '1.15.11-0']],
+        }, True, [['kubelet', '1.15.11-0']]),
+    ])
+    def test_repoquery_whatrequires_cache(self, checksum, cached,
+                                          run_repoquery, stored):
+        """
+        Tests the cache of `_repoquery_whatrequires` function
+        """
+        repoquery_cmd_mock = MagicMock(
+            return_value=utils.cmd_output(stdout='kubelet 1.15.11-0\n')
+        )
+        cache_mock = MagicMock()
+        cache_mock.fetch.return_value = cached
+
+        with patch.dict(metalk8s_package_manager_yum.__salt__,
+                        {'cmd.run_all': repoquery_cmd_mock}), \
+                patch("metalk8s_package_manager_yum._get_dependents_graph",
+                      MagicMock(return_value=None)), \
+                patch("metalk8s_package_manager_yum._repo_metadata_checksum",
+                      MagicMock(return_value=checksum)), \
+                patch("salt.cache.factory",
+                      MagicMock(return_value=cache_mock)), \
+                patch.object(metalk8s_package_manager_yum, "__opts__", {},
+                             create=True):
+            result = metalk8s_package_manager_yum._repoquery_whatrequires(
+                'kubernetes-cni', '0.7.5-0', fromrepo='my-repo'
+            )
+
+        if run_repoquery:
+            repoquery_cmd_mock.assert_called_once()
+            self.assertEqual(result, [['kubelet', '1.15.11-0']])
+        else:
+            repoquery_cmd_mock.assert_not_called()
+            self.assertEqual(result, cached['packages'])
+
+        if stored is None:
+            cache_mock.store.assert_not_called()
+        else:
+            cache_mock.store.assert_called_once_with(
+                metalk8s_package_manager_yum.REPOQUERY_CACHE_BANK,
+                'kubernetes-cni-0.7.5-0',
+                {'checksum': checksum, 'fromrepo': 'my-repo',
+                 'packages': stored}
+            )
+
+    @parameterized.expand([
+        param('kubernetes-cni', '0.7.5', [
+            ['kubeadm', '1.15.11-0'], ['kubelet', '1.15.11-0'],
+        ]),
+        param('kubernetes-cni', '0.7.5-0', [
+            ['kubeadm', '1.15.11-0'], ['kubelet', '1.15.11-0'],
+        ]),
+        param('kubernetes-cni', '0.7', []),
+        param('kubelet', '1.15.11-0', [['kubeadm', '1.15.11-0']]),
+        param('kubeadm', '1.15.11-0', []),
+        param('containerd', '1.2.13-2', [['cri-tools', '1.14.0-0']],
+              fromrepo='other-repo'),
+        param('containerd', '1.2.13-2', [['cri-tools', '1.14.0-0']],
+              fromrepo='my-repo,other-repo'),
+        param('containerd', '1.2.13-2', [['cri-tools', '1.14.0-0']]),
+        param('containerd', '1.2.13-2', [], fromrepo='my-repo'),
+        param('containerd', '1.2.13-2', [
+            ['cri-tools', '1.14.0-0'], ['podman', '1.6.4-10'],
+        ], fromrepo='*'),
+        param('unknown', '1.0', []),
+    ])
+    def test_dependents_graph(self, name, version, result, fromrepo=None):
+        """
+        Tests `_repoquery_whatrequires` function using the dependents graph
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            _write_repo(cache_dir, 'my-repo', [
+                ('kubernetes-cni', '0.7.5', '0', [], []),
+                ('kubelet', '1.15.11', '0', ['/usr/bin/kubelet'],
+                 ['kubernetes-cni']),
+                ('kubeadm', '1.15.11', '0', [], ['/usr/bin/kubelet']),
+            ])
+            _write_repo(cache_dir, 'other-repo', [
+                ('containerd', '1.2.13', '2', ['containerd-runtime'], []),
+                ('cri-tools', '1.14.0', '0', [], ['containerd-runtime']),
+            ], primary_db='primary.sqlite')
+            _write_repo(cache_dir, 'base', [
+                ('podman', '1.6.4', '10', [], ['containerd-runtime']),
+            ])
+
+            repoquery_cmd_mock = MagicMock()
+            cache_mock = MagicMock()
+            cache_mock.fetch.return_value = None
+
+            with patch.object(metalk8s_package_manager_yum, "YUM_CACHE_DIR",
+                              cache_dir), \
+                    patch.object(metalk8s_package_manager_yum,
+                                 "METALK8S_REPOS", '*-repo'), \
+                    patch.dict(metalk8s_package_manager_yum.__salt__,
+                               {'cmd.run_all': repoquery_cmd_mock}), \
+                    patch("salt.cache.factory",
+                          MagicMock(return_value=cache_mock)):
+                for _ in range(2):
+                    self.assertEqual(
+                        metalk8s_package_manager_yum._repoquery_whatrequires(
+                            name, version, fromrepo=fromrepo
+                        ),
+                        result
+                    )
+
+            repoquery_cmd_mock.assert_not_called()
+            # Only built once, then kept in context
+            cache_mock.store.assert_called_once()
+            self.assertEqual(
+                cache_mock.store.call_args[0][:2],
+                (metalk8s_package_manager_yum.DEPENDENTS_CACHE_BANK,
+                 fromrepo or '*-repo')
+            )
+
+    @parameterized.expand([
+        # Up-to-date graph in the minion cache
+        param('abcd', [], [['kubelet', '1.15.11-0']]),
+        # Outdated graph in the minion cache
+        param('efgh', [], []),
+        # Primary database of a repository not cached
+        param('abcd', ['other-repo'], [['kubelet', '1.15.11-0']]),
+        # No primary database cached
+        param('abcd', ['my-repo', 'other-repo'], None),
+    ])
+    def test_dependents_graph_cache(self, checksum, missing, result):
+        """
+        Tests the cache of `_get_dependents_graph` function
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for repo in ['my-repo', 'other-repo']:
+                _write_repo(cache_dir, repo, [
+                    ('kubernetes-cni', '0.7.5', '0', [], []),
+                ])
+            for repo in missing:
+                os.remove(os.path.join(
+                    cache_dir, 'x86_64', '7', repo, 'primary.sqlite.bz2'
+                ))
+
+            cache_mock = MagicMock()
+            cache_mock.fetch.return_value = {
+                'checksum': checksum,
+                'graph': {'kubernetes-cni 0.7.5-0': ['kubelet 1.15.11-0']},
+            }
+
+            with patch.object(metalk8s_package_manager_yum, "YUM_CACHE_DIR",
+                              cache_dir), \
+                    patch.object(metalk8s_package_manager_yum,
+                                 "METALK8S_REPOS", '*-repo'), \
+                    patch.object(metalk8s_package_manager_yum,
+                                 "_repo_metadata_checksum",
+                                 MagicMock(return_value='abcd')), \
+                    patch("salt.cache.factory",
+                          MagicMock(return_value=cache_mock)):
+                graph = metalk8s_package_manager_yum._get_dependents_graph()
+
+            if result is None:
+                self.assertIsNone(graph)
+                cache_mock.fetch.assert_not_called()
+            else:
+                self.assertEqual(
+                    metalk8s_package_manager_yum._query_dependents(
+                        graph, 'kubernetes-cni', '0.7.5'
+                    ),
+                    result
+                )
+                if checksum == 'abcd':
+                    cache_mock.store.assert_not_called()
+                else:
+                    cache_mock.store.assert_called_once_with(
+                        metalk8s_package_manager_yum.DEPENDENTS_CACHE_BANK,
+                        '*-repo', {'checksum': 'abcd', 'graph': {}}
+                    )
+
+    @parameterized.expand([
+        param('repomd.xml', b'<repomd',
+              'Unable to read repositories metadata'),
+        param('primary.sqlite.bz2', b'not a database',
+              'Unable to read repositories primary databases'),
+    ])
+    def test_dependents_graph_error(self, filename, content, message):
+        """
+        Tests `_get_dependents_graph` function with invalid metadata
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            _write_repo(cache_dir, 'my-repo', [
+                ('kubernetes-cni', '0.7.5', '0', [], []),
+            ])
+            with open(os.path.join(
+                cache_dir, 'x86_64', '7', 'my-repo', filename
+            ), 'wb') as fd:
+                fd.write(content)
+
+            cache_mock = MagicMock()
+            cache_mock.fetch.return_value = None
+
+            with patch.object(metalk8s_package_manager_yum, "YUM_CACHE_DIR",
+                              cache_dir), \
+                    patch.object(metalk8s_package_manager_yum,
+                                 "METALK8S_REPOS", 'my-repo'), \
+                    patch("salt.cache.factory",
+                          MagicMock(return_value=cache_mock)), \
+                    self.assertLogs(metalk8s_package_manager_yum.log,
+                                    'WARNING') as logs:
+                self.assertIsNone(
+                    metalk8s_package_manager_yum._get_dependents_graph()
+                )
+
+            self.assertIn(message, logs.output[0])
+            cache_mock.store.assert_not_called()
@@ -221,6 +221,87 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 # This function does not return anything
                 metalk8s_volumes.prepare(name)
 
+    def test_prepare_many(self):
+        """
+        Tests the return of `prepare_many` function
+        """
+        pillar_dict = {
+            'metalk8s': {
+                'volumes': YAML_TESTS_CASES['_volumes_details']
+            }
+        }
+
+        get_blkid_mock = MagicMock()
+        probe_mock = get_blkid_mock.return_value.__enter__.return_value.probe
+        probe_mock.return_value.uuid = None
+        probe_mock.return_value.fstype = None
+        probe_mock.return_value.has_partition = False
+
+        utils_dict = {
+            'metalk8s_volumes.get_superblock_flags': MagicMock(),
+            'metalk8s_volumes.get_blkid_probe': get_blkid_mock
+        }
+
+        commands = []
+
+        def _run_all(cmd):
+            commands.append(cmd)
+            if '/dev/sda2' in cmd:
+                return utils.cmd_output(retcode=1, stderr='Disk is broken')
+            return utils.cmd_output()
+
+        salt_dict = {
+            'cmd.run_all': MagicMock(side_effect=_run_all),
+            'file.is_blkdev': MagicMock(return_value=True)
+        }
+
+        with patch.dict(metalk8s_volumes.__pillar__, pillar_dict), \
+                patch.dict(metalk8s_volumes.__salt__, salt_dict), \
+                patch.dict(metalk8s_volumes.__utils__, utils_dict), \
+                patch("metalk8s_volumes.device_name", device_name_mock), \
+                patch("glob.glob", MagicMock(return_value=[])), \
+                patch("os.path.isfile", MagicMock(return_value=False)), \
+                patch("os.open", MagicMock()), \
+                patch("os.ftruncate", MagicMock()):
+            result = metalk8s_volumes.prepare_many([
+                'my-raw-block-device-volume',
+                'my-sparse-volume',
+                'my-xfs-volume',
+                'my-raw-block-device-block-partition-volume',
+                'unknown-volume',
+            ])
+
+        self.assertEqual(result, {
+            'my-raw-block-device-volume': {
+                'succeeded': True, 'created': False, 'prepared': True,
+                'comment': '',
+            },
+            'my-sparse-volume': {
+                'succeeded': True, 'created': True, 'prepared': True,
+                'comment': '',
+            },
+            'my-xfs-volume': {
+                'succeeded': False, 'created': False, 'prepared': False,
+                'comment': 'error while trying to run `mkfs.xfs -f -m '
+                           'uuid=7474cda7-0dbe-40fc-9842-3cb0404a725a '
+                           '-m 0 /dev/sda2`: Disk is broken',
+            },
+            'my-raw-block-device-block-partition-volume': {
+                'succeeded': True, 'created': False, 'prepared': True,
+                'comment': '',
+            },
+            'unknown-volume': {
+                'succeeded': False, 'created': False, 'prepared': False,
+                'comment': 'volume unknown-volume not found in pillar',
+            },
+        })
+        # Partitions of `/dev/sda` are formatted one after the other
+        sda_commands = [cmd for cmd in commands if '/dev/sda' in cmd]
+        self.assertEqual(len(sda_commands), 3)
+        self.assertIn('/dev/sda1', sda_commands[0])
+        self.assertIn('/dev/sda2', sda_commands[1])
+        self.assertIn('/dev/sda', sda_commands[2])
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["is_cleaned_up"])
     def test_is_cleaned_up(self, name, result, raises=False,
                            exists=False, pillar_volumes=None):
@@ -344,6 +425,111 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     metalk8s_volumes.device_info(name)
                 )
 
+    def test_device_inventory(self):
+        """
+        Tests that devices are inspected once per job, until a command is run
+        or udev symlinks change
+        """
+        pillar_dict = {
+            'metalk8s': {
+                'volumes': YAML_TESTS_CASES['_volumes_details']
+            }
+        }
+
+        get_blkid_mock = MagicMock()
+        probe_mock = get_blkid_mock.return_value.__enter__.return_value.probe
+        probe_mock.return_value.uuid = None
+        probe_mock.return_value.fstype = None
+        probe_mock.return_value.has_partition = False
+
+        utils_dict = {
+            'metalk8s_volumes.get_superblock_flags': MagicMock(),
+            'metalk8s_volumes.get_blkid_probe': get_blkid_mock
+        }
+        salt_dict = {
+            'cmd.run_all': MagicMock(return_value=utils.cmd_output()),
+            'file.is_blkdev': MagicMock(return_value=True)
+        }
+
+        device_name_mock_ = MagicMock(side_effect=device_name_mock)
+        glob_mock = MagicMock(return_value=["/dev/dm-1", "/dev/dm-2"])
+        stat_mock = MagicMock(return_value=MagicMock(st_mtime=1))
+
+        with patch.dict(metalk8s_volumes.__pillar__, pillar_dict), \
+                patch.dict(metalk8s_volumes.__salt__, salt_dict), \
+                patch.dict(metalk8s_volumes.__utils__, utils_dict), \
+                patch("metalk8s_volumes.device_name", device_name_mock_), \
+                patch("glob.glob", glob_mock), \
+                patch("os.stat", stat_mock):
+            for name in ['my-raw-block-device-block-disk-volume',
+                         'my-raw-block-device-block-partition-volume',
+                         'my-raw-block-device-block-lvm-volume']:
+                metalk8s_volumes.is_prepared(name)
+                metalk8s_volumes.exists(name)
+            for _ in range(2):
+                self.assertFalse(
+                    metalk8s_volumes.is_prepared('my-sparse-volume')
+                )
+            glob_mock.assert_called_once()
+            # One call per device path, and per partition for Disk/Partition
+            self.assertEqual(device_name_mock_.call_count, 5)
+            probe_mock.assert_called_once()
+
+            # Formatting a device drops the inventory
+            metalk8s_volumes.prepare('my-sparse-volume')
+            metalk8s_volumes.is_prepared('my-sparse-volume')
+            self.assertEqual(probe_mock.call_count, 3)
+
+            # So does any change from udev
+            stat_mock.return_value.st_mtime = 2
+            metalk8s_volumes.is_prepared('my-sparse-volume')
+            self.assertEqual(probe_mock.call_count, 4)
+
+
+class RawBlockDeviceTestCase(TestCase):
+    @parameterized.expand([
+        ('disk', 'sda', 'sda'),
+        ('partition', 'sda1', 'sda'),
+        ('nvme', 'nvme0n1', 'nvme0n1'),
+        ('nvme-part', 'nvme0n1p3', 'nvme0n1'),
+        ('lvm', 'dm-0', 'dm-0'),
+    ])
+    def test_physical_device(self, _, name, expected):
+        volume = metalk8s_volumes.RawBlockDevice({
+            'spec': {'rawBlockDevice': {'devicePath': '/dev/' + name}}
+        })
+        with patch("metalk8s_volumes._device_name",
+                   MagicMock(side_effect=os.path.basename)):
+            self.assertEqual(volume.physical_device, expected)
+
+
+class SparseLoopDeviceTestCase(TestCase):
+    @parameterized.expand([
+        ('disk', '/sys/devices/virtual/block/vda', 'vda'),
+        ('partition', '/sys/devices/virtual/block/sda/sda1', 'sda'),
+        ('lvm', '/sys/devices/virtual/block/dm-0', 'dm-0'),
+    ])
+    def test_physical_device(self, _, sys_path, expected):
+        volume = metalk8s_volumes.SparseLoopDevice({
+            'metadata': {'uid': 'a-uid'}
+        })
+        stat_mock = MagicMock(return_value=MagicMock(st_dev=os.makedev(8, 1)))
+        realpath_mock = MagicMock(return_value=sys_path)
+        with patch("os.stat", stat_mock), \
+                patch("os.path.realpath", realpath_mock):
+            self.assertEqual(volume.physical_device, expected)
+        stat_mock.assert_called_once_with('/var/lib/metalk8s/storage/sparse')
+        realpath_mock.assert_called_once_with('/sys/dev/block/8:1')
+
+    def test_physical_device_missing_directory(self):
+        volume = metalk8s_volumes.SparseLoopDevice({
+            'metadata': {'uid': 'a-uid'}
+        })
+        with patch("os.stat", MagicMock(side_effect=OSError)):
+            self.assertEqual(
+                volume.physical_device, '/var/lib/metalk8s/storage/sparse'
+            )
+
 
 class RawBlockDeviceBlockTestCase(TestCase):
     @parameterized.expand([